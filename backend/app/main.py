@@ -1,13 +1,36 @@
+from contextlib import asynccontextmanager
+import os
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .database import engine, Base
+from .database import engine, Base, SessionLocal
 from .routers import master_data, orders, schools, dashboard, admin
+from .utils.email_utils import OutboxWorker
+from .utils.import_jobs import fail_interrupted_import_jobs
 # from . import seed # Will implement seed trigger later or via script
 
 # Create tables
 Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="Tailor Tally API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Master data imports run inside the server process, so a restart ends them
+    db = SessionLocal()
+    try:
+        fail_interrupted_import_jobs(db)
+    finally:
+        db.close()
+    # Sends the emails queued by order writes; EMAIL_OUTBOX_WORKER=0 leaves them queued
+    outbox_worker = None
+    if os.environ.get("EMAIL_OUTBOX_WORKER", "1") != "0":
+        outbox_worker = OutboxWorker(SessionLocal)
+        outbox_worker.start()
+    yield
+    if outbox_worker:
+        outbox_worker.stop()
+    # Closing the pooled connections checkpoints the SQLite WAL back into the database file
+    engine.dispose()
+
+app = FastAPI(title="Tailor Tally API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -15,6 +38,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count"], # Order list pagination
 )
 
 @app.get("/")
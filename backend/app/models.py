@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, DateTime, func
+from sqlalchemy import Boolean, Column, Date, DDL, ForeignKey, Index, Integer, String, Float, DateTime, event, func
 from sqlalchemy.orm import relationship
 from .database import Base
 from datetime import datetime
@@ -11,13 +11,16 @@ class Product(Base):
     category = Column(String, default="General") # e.g., "School Uniform", "Mens Wear"
     is_active = Column(Boolean, default=True)
 
-    sizes = relationship("Size", back_populates="product", cascade="all, delete-orphan")
+    sizes = relationship(
+        "Size", back_populates="product", cascade="all, delete-orphan",
+        order_by="(Size.order_index, Size.id)"
+    )
 
 class Size(Base):
     __tablename__ = "sizes"
 
     id = Column(Integer, primary_key=True, index=True)
-    product_id = Column(Integer, ForeignKey("products.id"))
+    product_id = Column(Integer, ForeignKey("products.id"), index=True)
     label = Column(String) # e.g., "38", "S", "L"
     order_index = Column(Integer, default=0) # For sorting sizes
     is_active = Column(Boolean, default=True)
@@ -27,6 +30,10 @@ class Size(Base):
 
 class MaterialRule(Base):
     __tablename__ = "material_rules"
+    __table_args__ = (
+        # Rule lookup for an order line: size, then fabric width
+        Index("ix_material_rules_size_id_fabric_width_inches", "size_id", "fabric_width_inches"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     size_id = Column(Integer, ForeignKey("sizes.id"))
@@ -47,6 +54,8 @@ class Tailor(Base):
     name = Column(String, unique=True, index=True)
     phone = Column(String, nullable=True)
     email = Column(String, nullable=True)
+    # One digest email a day listing the new orders instead of one email per order
+    email_digest = Column(Boolean, default=False, server_default="0", nullable=False)
     is_active = Column(Boolean, default=True)
 
     orders = relationship("Order", back_populates="tailor")
@@ -62,15 +71,21 @@ class School(Base):
 
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        # The order list filters by status or tailor and pages on (created_at, id)
+        Index("ix_orders_status_created_at", "status", "created_at"),
+        Index("ix_orders_tailor_id_created_at", "tailor_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     tailor_id = Column(Integer, ForeignKey("tailors.id"))
     # school_id = Column(Integer, ForeignKey("schools.id"), nullable=True) # REMOVED
     status = Column(String, default="Pending") # Pending, In Progress, Completed
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     notes = Column(String, nullable=True)
     slip_no = Column(String, nullable=True)
     given_cloth = Column(Float, nullable=True)
+    delivered_qty = Column(Integer, default=0, server_default="0", nullable=False) # Rollup of order_lines.delivered_qty
 
     tailor = relationship("Tailor", back_populates="orders")
     # school = relationship("School", back_populates="orders") # REMOVED
@@ -78,12 +93,16 @@ class Order(Base):
 
 class OrderLine(Base):
     __tablename__ = "order_lines"
+    __table_args__ = (
+        # Repricing matches open lines by pricing key
+        Index("ix_order_lines_size_id_fabric_width_inches", "size_id", "fabric_width_inches"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id"))
-    product_id = Column(Integer, ForeignKey("products.id"))
+    order_id = Column(Integer, ForeignKey("orders.id"), index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), index=True)
     size_id = Column(Integer, ForeignKey("sizes.id"))
-    school_id = Column(Integer, ForeignKey("schools.id"), nullable=True) # MOVED HERE
+    school_id = Column(Integer, ForeignKey("schools.id"), nullable=True, index=True) # MOVED HERE
     
     # Snapshot of the rule used at time of ordering
     fabric_width_inches = Column(Integer, nullable=True)
@@ -95,6 +114,7 @@ class OrderLine(Base):
     
     group_id = Column(String, nullable=True) # To group lines in UI
     given_cloth = Column(Float, nullable=True) # Given cloth for this line (or group)
+    delivered_qty = Column(Integer, default=0, server_default="0", nullable=False) # Sum of deliveries, kept in step by the delivery endpoints
 
     order = relationship("Order", back_populates="order_lines")
     product = relationship("Product")
@@ -106,7 +126,7 @@ class Delivery(Base):
     __tablename__ = "deliveries"
 
     id = Column(Integer, primary_key=True, index=True)
-    order_line_id = Column(Integer, ForeignKey("order_lines.id"))
+    order_line_id = Column(Integer, ForeignKey("order_lines.id"), index=True)
     quantity_delivered = Column(Integer)
     date_delivered = Column(DateTime, default=datetime.utcnow)
 
@@ -117,3 +137,160 @@ class Settings(Base):
 
     key = Column(String, primary_key=True, index=True)
     value = Column(String)
+
+class DashboardRollup(Base):
+    """
+    Running totals behind /dashboard/stats, kept in step by the order, line and delivery
+    write paths (see utils/dashboard_utils.py). ref_id is 0 for global metrics, otherwise
+    the product or tailor the value belongs to.
+    """
+    __tablename__ = "dashboard_rollups"
+
+    metric = Column(String, primary_key=True)
+    ref_id = Column(Integer, primary_key=True, default=0)
+    value = Column(Float, default=0, server_default="0", nullable=False)
+
+class DashboardDaily(Base):
+    """
+    Per-day totals behind the windowed dashboard, one row per (day, tailor, school, product);
+    0 stands for none. Ordered figures count on the order's created_at day, delivered ones on
+    the delivery's date. Order counts use school 0 and product 0, as orders have neither.
+    """
+    __tablename__ = "dashboard_daily"
+
+    day = Column(Date, primary_key=True)
+    tailor_id = Column(Integer, primary_key=True, default=0)
+    school_id = Column(Integer, primary_key=True, default=0)
+    product_id = Column(Integer, primary_key=True, default=0)
+    quantity_ordered = Column(Integer, default=0, server_default="0", nullable=False)
+    material_issued = Column(Float, default=0, server_default="0", nullable=False)
+    pieces_delivered = Column(Integer, default=0, server_default="0", nullable=False)
+    material_work_done = Column(Float, default=0, server_default="0", nullable=False)
+    orders_created = Column(Integer, default=0, server_default="0", nullable=False)
+    orders_active = Column(Integer, default=0, server_default="0", nullable=False)
+
+class EmailOutbox(Base):
+    """
+    Emails waiting to be sent, written in the same transaction as the change they report
+    and delivered by the outbox worker (see utils/email_utils.py). Subject and body are
+    rendered at send time; they keep what was sent.
+    """
+    __tablename__ = "email_outbox"
+    __table_args__ = (
+        # The worker's "due" lookup
+        Index("ix_email_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False) # "order", or "order_digest" (sent with the tailor's other due digest rows)
+    recipient = Column(String, nullable=False)
+    # Not foreign keys: a queued email outlives a deleted order (and is then dropped)
+    order_id = Column(Integer, nullable=True)
+    tailor_id = Column(Integer, nullable=True)
+    status = Column(String, default="pending", server_default="pending", nullable=False) # pending, sent, failed
+    attempts = Column(Integer, default=0, server_default="0", nullable=False)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    last_error = Column(String, nullable=True)
+    subject = Column(String, nullable=True)
+    body = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+class IdempotencyKey(Base):
+    """
+    Responses of writes sent with an Idempotency-Key header, so a retried or double-clicked
+    request gets the original response instead of running again (see utils/idempotency_utils.py).
+    """
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String, primary_key=True)
+    request_hash = Column(String, nullable=False)
+    status_code = Column(Integer, nullable=False)
+    response_body = Column(String, nullable=False)
+    # Keys expire after IDEMPOTENCY_KEY_TTL_HOURS
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+class ImportJob(Base):
+    """
+    State of a master data import job (see utils/import_jobs.py), so any server worker
+    can report or cancel it. Stats and errors are JSON text.
+    """
+    __tablename__ = "import_jobs"
+
+    id = Column(String, primary_key=True)
+    filename = Column(String, nullable=False)
+    status = Column(String, default="queued", nullable=False) # queued, running, completed, failed, cancelled
+    rows_processed = Column(Integer, default=0, server_default="0", nullable=False)
+    stats = Column(String, default="{}", nullable=False)
+    errors = Column(String, default="[]", nullable=False)
+    error = Column(String, nullable=True)
+    # Set by a cancel request; the job checks it after each batch
+    cancel_requested = Column(Boolean, default=False, server_default="0", nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # Bumped by the running import after each batch; an unfinished job that stops being
+    # updated lost its worker (see JOB_STALE_SECONDS)
+    updated_at = Column(DateTime, nullable=True)
+    # Finished jobs are deleted after JOB_TTL_SECONDS
+    finished_at = Column(DateTime, nullable=True)
+
+class MasterDataPreview(Base):
+    """
+    Changesets computed by dry-run master data uploads, waiting for /upload/confirm
+    (see utils/import_utils.py). The changeset is JSON text.
+    """
+    __tablename__ = "master_data_previews"
+
+    id = Column(String, primary_key=True)
+    changes = Column(String, nullable=False)
+    # Previews expire after PREVIEW_TTL_SECONDS
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+# --- Order search (SQLite FTS5) ---
+# One document per order (rowid = orders.id) holding the text the order list searches.
+# Triggers keep it in step with every write, including edits made outside the API.
+
+ORDER_SEARCH_INSERT = """
+INSERT INTO order_search (rowid, tailor_name, slip_no, notes, school_names, product_names)
+SELECT o.id, t.name, o.slip_no, o.notes,
+    (SELECT group_concat(DISTINCT s.name) FROM order_lines l JOIN schools s ON s.id = l.school_id
+     WHERE l.order_id = o.id),
+    (SELECT group_concat(DISTINCT p.name) FROM order_lines l JOIN products p ON p.id = l.product_id
+     WHERE l.order_id = o.id)
+FROM orders o LEFT JOIN tailors t ON t.id = o.tailor_id
+WHERE {where};"""
+
+def _reindex(where: str) -> str:
+    """Trigger body replacing the documents of the orders matching `where` (a clause on o)."""
+    return (
+        f"DELETE FROM order_search WHERE rowid IN (SELECT o.id FROM orders o WHERE {where});"
+        + ORDER_SEARCH_INSERT.format(where=where)
+    )
+
+_LINE_ORDERS = "o.id IN (SELECT l.order_id FROM order_lines l WHERE l.{column} = NEW.id)"
+
+ORDER_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS order_search USING fts5("
+    "tailor_name, slip_no, notes, school_names, product_names, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+    "CREATE TRIGGER IF NOT EXISTS order_search_order_insert AFTER INSERT ON orders BEGIN "
+    + ORDER_SEARCH_INSERT.format(where="o.id = NEW.id") + " END",
+    "CREATE TRIGGER IF NOT EXISTS order_search_order_update AFTER UPDATE OF tailor_id, slip_no, notes ON orders BEGIN "
+    + _reindex("o.id = NEW.id") + " END",
+    "CREATE TRIGGER IF NOT EXISTS order_search_order_delete AFTER DELETE ON orders BEGIN "
+    "DELETE FROM order_search WHERE rowid = OLD.id; END",
+    "CREATE TRIGGER IF NOT EXISTS order_search_line_insert AFTER INSERT ON order_lines BEGIN "
+    + _reindex("o.id = NEW.order_id") + " END",
+    "CREATE TRIGGER IF NOT EXISTS order_search_line_update AFTER UPDATE OF order_id, school_id, product_id ON order_lines BEGIN "
+    + _reindex("o.id IN (OLD.order_id, NEW.order_id)") + " END",
+    "CREATE TRIGGER IF NOT EXISTS order_search_line_delete AFTER DELETE ON order_lines BEGIN "
+    + _reindex("o.id = OLD.order_id") + " END",
+    "CREATE TRIGGER IF NOT EXISTS order_search_tailor_rename AFTER UPDATE OF name ON tailors BEGIN "
+    + _reindex("o.tailor_id = NEW.id") + " END",
+    "CREATE TRIGGER IF NOT EXISTS order_search_school_rename AFTER UPDATE OF name ON schools BEGIN "
+    + _reindex(_LINE_ORDERS.format(column="school_id")) + " END",
+    "CREATE TRIGGER IF NOT EXISTS order_search_product_rename AFTER UPDATE OF name ON products BEGIN "
+    + _reindex(_LINE_ORDERS.format(column="product_id")) + " END",
+]
+
+for _statement in ORDER_SEARCH_DDL:
+    event.listen(Base.metadata, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
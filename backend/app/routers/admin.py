@@ -1,35 +1,46 @@
+from datetime import datetime, timezone
 from fastapi import APIRouter, Depends, HTTPException, Header
 from sqlalchemy.orm import Session
 from .. import models, schemas
 from ..database import get_db
-from ..utils.security import verify_password, get_password_hash
+from ..utils.security import (
+    ADMIN_PASSWORD_KEY, check_admin_password, clear_admin_password_cache, create_admin_token,
+    get_password_hash, verify_password
+)
 
 router = APIRouter(
     prefix="/admin",
     tags=["admin"]
 )
 
-@router.post("/verify-password", response_model=bool)
-def verify_admin_password(body: schemas.AdminPasswordVerify, db: Session = Depends(get_db)):
-    setting = db.query(models.Settings).filter(models.Settings.key == "admin_password").first()
-    if not setting:
-        raise HTTPException(status_code=500, detail="Admin password not set")
-    
-    if verify_password(body.password, setting.value):
-        return True
-    return False
+@router.post("/verify-password", response_model=schemas.AdminVerifyResult)
+async def verify_admin_password(body: schemas.AdminPasswordVerify, db: Session = Depends(get_db)):
+    """
+    Checks the admin password and, when it matches, issues a short-lived admin token
+    for the X-Admin-Token header, so later admin calls skip the bcrypt check.
+    """
+    password_hash = await check_admin_password(db, body.password)
+    if not password_hash:
+        return schemas.AdminVerifyResult(valid=False)
+
+    token, expires = create_admin_token(password_hash)
+    return schemas.AdminVerifyResult(
+        valid=True, token=token, expires_at=datetime.fromtimestamp(expires, tz=timezone.utc)
+    )
 
 @router.post("/change-password")
 def change_admin_password(body: schemas.AdminPasswordChange, db: Session = Depends(get_db)):
-    setting = db.query(models.Settings).filter(models.Settings.key == "admin_password").first()
+    setting = db.query(models.Settings).filter(models.Settings.key == ADMIN_PASSWORD_KEY).first()
     if not setting:
         raise HTTPException(status_code=500, detail="Admin password not set")
 
     if not verify_password(body.current_password, setting.value):
         raise HTTPException(status_code=401, detail="Incorrect current password")
-    
+
     new_hash = get_password_hash(body.new_password)
     setting.value = new_hash
     db.commit()
-    
+    # Tokens are signed with the hash, so the new one also revokes every issued token
+    clear_admin_password_cache()
+
     return {"message": "Password updated successfully"}
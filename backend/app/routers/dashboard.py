@@ -1,51 +1,72 @@
-from fastapi import APIRouter, Depends
+from datetime import date
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from .. import models, schemas
+from .. import schemas
 from ..database import get_db
+from ..utils.cache_utils import DASHBOARD_VERSION_KEY, TAILORS_VERSION_KEY, cached
+from ..utils.catalog_utils import CATALOG_VERSION_KEY
+from ..utils.dashboard_utils import read_dashboard_series, read_dashboard_stats
 
 router = APIRouter(
     prefix="/dashboard",
     tags=["dashboard"]
 )
 
-@router.get("/stats", response_model=schemas.DashboardStats)
-def get_dashboard_stats(db: Session = Depends(get_db)):
-    # 1. Active Orders (Pending + In Progress)
-    active_orders = db.query(models.Order).filter(models.Order.status.in_(["Pending", "In Progress"])).count()
-
-    # 2. Material Issued (Total total_material_req)
-    material_issued = db.query(func.sum(models.OrderLine.total_material_req)).scalar() or 0.0
-
-    # 3. Material Work Done (Sum of delivered_qty * material_req_per_unit)
-    material_work_done = db.query(
-        func.sum(models.Delivery.quantity_delivered * models.OrderLine.material_req_per_unit)
-    ).join(models.OrderLine).scalar() or 0.0
+# Figures change with orders; product and tailor names come from the master data
+DASHBOARD_DEPENDS_ON = [DASHBOARD_VERSION_KEY, CATALOG_VERSION_KEY, TAILORS_VERSION_KEY]
+_series_adapter = TypeAdapter(List[schemas.DashboardSeriesPoint])
 
-    material_work_pending = material_issued - material_work_done
-
-    # 4. Top Products (By total quantity)
-    # Group by product name, sum quantity
-    top_products_raw = db.query(
-        models.Product.name,
-        func.sum(models.OrderLine.quantity).label("total_quantity")
-    ).join(models.OrderLine).group_by(models.Product.name).order_by(func.sum(models.OrderLine.quantity).desc()).limit(5).all()
-    
-    top_products = [schemas.ProductStat(name=p[0], quantity=p[1]) for p in top_products_raw]
+@router.get("/stats", response_model=schemas.DashboardStats)
+def get_dashboard_stats(
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    school_id: Optional[int] = None,
+    tailor_id: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    def build():
+        # Read from the rollup tables: no scans over orders, lines or deliveries
+        stats = read_dashboard_stats(
+            db, date_from=date_from, date_to=date_to, school_id=school_id, tailor_id=tailor_id
+        )
+        return schemas.DashboardStats(
+            active_orders=stats["active_orders"],
+            material_issued=round(stats["material_issued"], 2),
+            material_work_done=round(stats["material_work_done"], 2),
+            material_work_pending=round(stats["material_work_pending"], 2),
+            top_products=[schemas.ProductStat(**p) for p in stats["top_products"]],
+            top_tailors=[schemas.TailorStat(**t) for t in stats["top_tailors"]]
+        ).model_dump_json()
 
-    # 4. Top Tailors (By order count)
-    top_tailors_raw = db.query(
-        models.Tailor.name,
-        func.count(models.Order.id).label("order_count")
-    ).join(models.Order).group_by(models.Tailor.name).order_by(func.count(models.Order.id).desc()).limit(5).all()
+    key = ("dashboard_stats", date_from, date_to, school_id, tailor_id)
+    return Response(content=cached(db, key, DASHBOARD_DEPENDS_ON, build), media_type="application/json")
 
-    top_tailors = [schemas.TailorStat(name=t[0], order_count=t[1]) for t in top_tailors_raw]
+@router.get("/series", response_model=List[schemas.DashboardSeriesPoint])
+def get_dashboard_series(
+    granularity: str = "day",
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    school_id: Optional[int] = None,
+    tailor_id: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    def build():
+        points = read_dashboard_series(
+            db, granularity, date_from=date_from, date_to=date_to, school_id=school_id, tailor_id=tailor_id
+        )
+        return _series_adapter.dump_json([
+            schemas.DashboardSeriesPoint(
+                **{**point, "material_issued": round(point["material_issued"], 2),
+                   "material_work_done": round(point["material_work_done"], 2)}
+            )
+            for point in points
+        ])
 
-    return {
-        "active_orders": active_orders,
-        "material_issued": round(material_issued, 2),
-        "material_work_done": round(material_work_done, 2),
-        "material_work_pending": round(material_work_pending, 2),
-        "top_products": top_products,
-        "top_tailors": top_tailors
-    }
+    key = ("dashboard_series", granularity, date_from, date_to, school_id, tailor_id)
+    try:
+        body = cached(db, key, [DASHBOARD_VERSION_KEY], build)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return Response(content=body, media_type="application/json")
@@ -1,28 +1,75 @@
-from fastapi import APIRouter, Depends, HTTPException
-from io import BytesIO
+from fastapi import APIRouter, Depends, HTTPException, Response, Header, Query
+import os
+import shutil
+import tempfile
+from pydantic import TypeAdapter
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from .. import models, schemas
 from ..database import get_db
 from fastapi import UploadFile, File
-from ..utils.import_utils import process_master_data_file
+from sqlalchemy.exc import IntegrityError
+from ..utils.import_utils import (
+    preview_master_data_file, pop_master_data_preview, apply_master_data_changes
+)
+from ..utils.catalog_utils import (
+    CATALOG_VERSION_KEY, get_catalog_snapshot, get_catalog_version, bump_catalog_version, dump_products,
+    etag_matches, load_catalog
+)
+from ..utils.cache_utils import TAILORS_VERSION_KEY, bump_data_version, cached
+from ..utils.import_jobs import (
+    submit_master_data_import, get_import_job, cancel_import_job, FINISHED_STATUSES
+)
 
 router = APIRouter(
     prefix="/master-data",
     tags=["master-data"]
 )
 
+_tailors_adapter = TypeAdapter(List[schemas.Tailor])
+
+# --- Catalog ---
+
+@router.get("/catalog", response_model=List[schemas.Product])
+def read_catalog(if_none_match: Optional[str] = Header(None), db: Session = Depends(get_db)):
+    """
+    The whole catalog (products, sizes by order_index, rules) from a snapshot that is
+    rebuilt only when the catalog version changes. Send the ETag back in If-None-Match
+    to get an empty 304 while the catalog is unchanged.
+    """
+    etag, body = get_catalog_snapshot(db)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(etag, if_none_match):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 # --- Products ---
 
 @router.get("/products", response_model=List[schemas.Product])
-def read_products(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    products = db.query(models.Product).order_by(models.Product.name).offset(skip).limit(limit).all()
-    return products
+def read_products(
+    skip: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    """
+    Products with their sizes and rules. Without a limit the whole catalog is returned;
+    with one, X-Total-Count carries the number of products for paging.
+    """
+    def build():
+        body = dump_products(load_catalog(db, skip, limit))
+        total = db.query(func.count(models.Product.id)).scalar() if limit is not None else None
+        return body, total
+
+    body, total = cached(db, ("products", skip, limit), [CATALOG_VERSION_KEY], build)
+    headers = {"X-Total-Count": str(total)} if total is not None else None
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @router.post("/products", response_model=schemas.Product)
 def create_product(product: schemas.ProductCreate, db: Session = Depends(get_db)):
     db_product = models.Product(**product.dict())
     db.add(db_product)
+    bump_catalog_version(db)
     db.commit()
     db.refresh(db_product)
     return db_product
@@ -36,6 +83,7 @@ def update_product(product_id: int, product: schemas.ProductCreate, db: Session
     for key, value in product.dict().items():
         setattr(db_product, key, value)
     
+    bump_catalog_version(db)
     db.commit()
     db.refresh(db_product)
     return db_product
@@ -48,6 +96,7 @@ def delete_product(product_id: int, db: Session = Depends(get_db)):
     
     try:
         db.delete(db_product)
+        bump_catalog_version(db)
         db.commit()
     except Exception as e:
         db.rollback()
@@ -71,6 +120,7 @@ def create_size(product_id: int, size: schemas.SizeCreate, db: Session = Depends
     
     db_size = models.Size(**size.dict(), product_id=product_id)
     db.add(db_size)
+    bump_catalog_version(db)
     db.commit()
     db.refresh(db_size)
     return db_size
@@ -84,6 +134,7 @@ def update_size(size_id: int, size: schemas.SizeCreate, db: Session = Depends(ge
     for key, value in size.dict().items():
         setattr(db_size, key, value)
     
+    bump_catalog_version(db)
     db.commit()
     db.refresh(db_size)
     return db_size
@@ -96,6 +147,7 @@ def delete_size(size_id: int, db: Session = Depends(get_db)):
     
     try:
         db.delete(db_size)
+        bump_catalog_version(db)
         db.commit()
     except Exception as e:
         db.rollback()
@@ -114,6 +166,7 @@ def create_material_rule(size_id: int, rule: schemas.MaterialRuleCreate, db: Ses
 
     db_rule = models.MaterialRule(**rule.dict(), size_id=size_id)
     db.add(db_rule)
+    bump_catalog_version(db)
     db.commit()
     db.refresh(db_rule)
     return db_rule
@@ -127,6 +180,7 @@ def update_material_rule(rule_id: int, rule: schemas.MaterialRuleCreate, db: Ses
     for key, value in rule.dict().items():
         setattr(db_rule, key, value)
     
+    bump_catalog_version(db)
     db.commit()
     db.refresh(db_rule)
     return db_rule
@@ -144,6 +198,7 @@ def delete_material_rule(rule_id: int, db: Session = Depends(get_db)):
     
     try:
         db.delete(db_rule)
+        bump_catalog_version(db)
         db.commit()
     except Exception as e:
         db.rollback()
@@ -155,12 +210,17 @@ def delete_material_rule(rule_id: int, db: Session = Depends(get_db)):
 
 @router.get("/tailors", response_model=List[schemas.Tailor])
 def read_tailors(db: Session = Depends(get_db)):
-    return db.query(models.Tailor).all()
+    def build():
+        tailors = db.query(models.Tailor).all()
+        return _tailors_adapter.dump_json(_tailors_adapter.validate_python(tailors, from_attributes=True))
+
+    return Response(content=cached(db, ("tailors",), [TAILORS_VERSION_KEY], build), media_type="application/json")
 
 @router.post("/tailors", response_model=schemas.Tailor)
 def create_tailor(tailor: schemas.TailorCreate, db: Session = Depends(get_db)):
     db_tailor = models.Tailor(**tailor.dict())
     db.add(db_tailor)
+    bump_data_version(db, TAILORS_VERSION_KEY)
     db.commit()
     db.refresh(db_tailor)
     return db_tailor
@@ -174,18 +234,71 @@ def update_tailor(tailor_id: int, tailor: schemas.TailorCreate, db: Session = De
     for key, value in tailor.dict().items():
         setattr(db_tailor, key, value)
     
+    bump_data_version(db, TAILORS_VERSION_KEY)
+    db.commit()
     db.refresh(db_tailor)
     return db_tailor
 
-@router.post("/upload")
-async def upload_master_data(file: UploadFile = File(...), db: Session = Depends(get_db)):
+@router.post("/upload", status_code=202)
+def upload_master_data(response: Response, file: UploadFile = File(...), dry_run: bool = False, db: Session = Depends(get_db)):
+    """
+    Queues a master data import as a background job: poll /upload/{job_id} for progress.
+    With dry_run=true nothing is written and the preview is returned directly: it
+    summarizes the changes and carries a preview_id for /upload/confirm/{preview_id}.
+    """
+    if not file.filename.endswith(('.csv', '.xls', '.xlsx')):
+        raise HTTPException(status_code=400, detail="Unsupported file format. Please use .csv or .xlsx")
+
+    if dry_run:
+        try:
+            # The spooled upload is streamed in batches rather than read into memory
+            preview = preview_master_data_file(file.file, db, file.filename)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+        response.status_code = 200
+        return {"message": "Preview only, nothing was written", **preview}
+
+    # The upload is gone once the request ends, so the job gets its own copy
+    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as tmp:
+        shutil.copyfileobj(file.file, tmp)
+    job = submit_master_data_import(tmp.name, file.filename, db)
+    return {"message": "Import started", **job}
+
+@router.get("/upload/{job_id}")
+def read_master_data_upload(job_id: str, db: Session = Depends(get_db)):
+    """
+    Progress of an import job: status, rows processed, stats and skipped rows so far.
+    The import commits only when it completes; failed or cancelled jobs leave no changes.
+    """
+    job = get_import_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
+
+@router.delete("/upload/{job_id}")
+def cancel_master_data_upload(job_id: str, db: Session = Depends(get_db)):
+    """Cancels a queued or running import; a running one stops after its current batch."""
+    job = cancel_import_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    if job["status"] in FINISHED_STATUSES:
+        raise HTTPException(status_code=409, detail=f"Import job already {job['status']}")
+    return {"message": "Cancellation requested", **job}
+
+@router.post("/upload/confirm/{preview_id}")
+def confirm_master_data_upload(preview_id: str, db: Session = Depends(get_db)):
+    """Applies the changeset computed by a dry-run upload, without re-reading the file."""
+    changes = pop_master_data_preview(db, preview_id)
+    if changes is None:
+        raise HTTPException(status_code=404, detail="Preview not found or expired. Please upload the file again.")
+    if get_catalog_version(db) != changes["catalog_version"]:
+        db.commit() # drops the stale preview
+        raise HTTPException(status_code=409, detail="The catalog changed since the preview. Please upload the file again.")
     try:
-        contents = await file.read()
-        file_obj = BytesIO(contents)
-        # Pass the file-like object directly to the utility
-        stats = process_master_data_file(file_obj, db, file.filename)
-        return {"message": "Import successful", "stats": stats}
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+        apply_master_data_changes(changes, db)
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="The catalog changed since the preview. Please upload the file again.")
+    return {"message": "Import successful", "stats": changes["stats"]}
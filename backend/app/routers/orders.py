@@ -1,26 +1,86 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session, joinedload, selectinload
+from typing import List, Optional
+import base64
+import json
 from .. import models, schemas
 from ..database import get_db
-from ..database import get_db
 from datetime import datetime
-from ..utils.email_utils import send_order_email
-from fastapi import Header
-from ..utils.security import verify_password
+from ..utils.email_utils import queue_order_email, wake_outbox_worker
+from ..utils.order_utils import add_delivered_qty, deliver_order_lines, recompute_order_status, reprice_open_orders
+from ..utils.rule_utils import RuleEntry, get_rule_index
+from ..utils.dashboard_utils import (
+    add_line_deltas, add_new_order_daily_deltas, add_order_daily_deltas, add_order_deltas,
+    apply_daily_deltas, apply_rollup_deltas
+)
+from fastapi import Header, UploadFile, File
+from ..utils.security import require_admin
+from ..utils.import_utils import process_order_file, process_order_rows
+from ..utils.search_utils import build_match_query, order_search_matches, relevance_bound
+from ..utils.idempotency_utils import commit_or_replay, remember_response, replay_response, request_fingerprint
 
 router = APIRouter(
     prefix="/orders",
     tags=["orders"]
 )
 
+def order_query(db: Session, include_deliveries: bool = True):
+    """
+    Base query for reading orders together with everything map_order_response touches.
+    Tailor is joined, lines (with product/size/school) and deliveries are loaded with
+    one SELECT ... IN each, so the query count stays fixed however many orders come back.
+    Delivered quantities come from the stored counters, so deliveries are only needed
+    when the response lists them.
+    """
+    lines = selectinload(models.Order.order_lines)
+    options = [
+        joinedload(models.Order.tailor),
+        lines.joinedload(models.OrderLine.product),
+        lines.joinedload(models.OrderLine.size),
+        lines.joinedload(models.OrderLine.school),
+    ]
+    if include_deliveries:
+        options.append(lines.selectinload(models.OrderLine.deliveries))
+    return db.query(models.Order).options(*options)
+
+def resolve_material_rules(db: Session, lines) -> List[RuleEntry]:
+    """
+    Finds the Material Rule for each requested line from the shared rule index
+    (see MaterialRuleIndex for the policy). Raises 400 if any line has no rule.
+    """
+    rules = get_rule_index(db).resolve_many(
+        (line.size_id, line.fabric_width_inches, line.rule_id) for line in lines
+    )
+    for line, rule in zip(lines, rules):
+        if not rule:
+            raise HTTPException(status_code=400, detail=f"No material rule found for Size ID {line.size_id}")
+    return rules
+
 @router.post("/", response_model=schemas.Order)
-def create_order(order: schemas.OrderCreate, db: Session = Depends(get_db)):
+def create_order(
+    order: schemas.OrderCreate,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    db: Session = Depends(get_db)
+):
+    """
+    Creates an order and its lines. With an Idempotency-Key header, repeating the request
+    (double click, client retry) returns the first response instead of a second order.
+    """
+    if idempotency_key is not None:
+        fingerprint = request_fingerprint("POST", "/orders/", order.model_dump(mode="json"))
+        replay = replay_response(db, idempotency_key, fingerprint)
+        if replay:
+            return replay
+
     # Verify Tailor exists
     tailor = db.query(models.Tailor).filter(models.Tailor.id == order.tailor_id).first()
     if not tailor:
         raise HTTPException(status_code=400, detail="Tailor not found")
 
+    # Resolve every line's Material Rule up front, so a bad line fails before anything is written
+    rules = resolve_material_rules(db, order.order_lines)
+
     db_order = models.Order(
         tailor_id=order.tailor_id, 
         # school_id=order.school_id, # REMOVED 
@@ -28,109 +88,282 @@ def create_order(order: schemas.OrderCreate, db: Session = Depends(get_db)):
         slip_no=order.slip_no,
         created_at=order.created_at or datetime.utcnow()
     )
-    db.add(db_order)
-    db.commit()
-    db.refresh(db_order)
 
-    # Process Lines
-    for line in order.order_lines:
-        # Find Material Rule
-        if line.rule_id:
-            rule = db.query(models.MaterialRule).filter(models.MaterialRule.id == line.rule_id).first()
-        else:
-            query = db.query(models.MaterialRule).filter(models.MaterialRule.size_id == line.size_id)
-            if line.fabric_width_inches:
-                rule = query.filter(models.MaterialRule.fabric_width_inches == line.fabric_width_inches).first()
-            else:
-                rule = query.first()
-        
-        if not rule:
-            raise HTTPException(status_code=400, detail=f"No material rule found for Size ID {line.size_id}")
-
-        material_req = rule.length_required
-        total_req = material_req * line.quantity
-
-        db_line = models.OrderLine(
-            order_id=db_order.id,
-            product_id=line.product_id,
-            size_id=line.size_id,
-            school_id=line.school_id, # ADDED
-            fabric_width_inches=line.fabric_width_inches,
-            material_req_per_unit=material_req,
-            unit=rule.unit,
-            quantity=line.quantity,
-            total_material_req=total_req,
-            group_id=line.group_id,
-            given_cloth=line.given_cloth
-        )
-        db.add(db_line)
-    
-    db.commit()
-    db.refresh(db_order)
-    
-    # Send Email
     try:
+        db.add(db_order)
+        db.flush()
+        order_id = db_order.id
+
+        # Process Lines: one executemany INSERT for all lines
+        line_rows = []
+        for line, rule in zip(order.order_lines, rules):
+            material_req = rule.length_required
+            total_req = material_req * line.quantity
+
+            line_rows.append(dict(
+                order_id=order_id,
+                product_id=line.product_id,
+                size_id=line.size_id,
+                school_id=line.school_id, # ADDED
+                fabric_width_inches=line.fabric_width_inches,
+                material_req_per_unit=material_req,
+                unit=rule.unit,
+                quantity=line.quantity,
+                total_material_req=total_req,
+                group_id=line.group_id,
+                given_cloth=line.given_cloth,
+                delivered_qty=0
+            ))
+        if line_rows:
+            # Core insert: one executemany even when lines leave different columns empty
+            db.execute(models.OrderLine.__table__.insert(), line_rows)
+
+        # Dashboard totals move in the same transaction
+        deltas = {}
+        add_order_deltas(deltas, order.tailor_id, db_order.status)
+        for row in line_rows:
+            add_line_deltas(deltas, row["product_id"], row["quantity"], row["total_material_req"])
+        apply_rollup_deltas(db, deltas)
+        daily = {}
+        add_new_order_daily_deltas(daily, db_order.created_at, order.tailor_id, db_order.status, line_rows)
+        apply_daily_deltas(db, daily)
+
+        # The email is queued with the order and sent by the outbox worker
         # Check explicit flag AND presence of email
-        if order.send_email and db_order.tailor.email:
-            order_response = map_order_response(db_order)
-            send_order_email(db_order.tailor.email, order_response.model_dump())
-    except Exception as e:
-        print(f"Failed to send email: {e}")
+        queue_email = order.send_email and bool(tailor.email)
+        if queue_email:
+            queue_order_email(db, order_id, tailor)
 
+        if idempotency_key is None:
+            # Order and lines are committed together: all or nothing
+            db.commit()
+        else:
+            # The response is stored with the key, in the order's transaction
+            db.flush()
+            db_order = order_query(db).populate_existing().filter(models.Order.id == order_id).first()
+            body = map_order_response(db_order).model_dump_json().encode("utf-8")
+            remember_response(db, idempotency_key, fingerprint, body)
+            replay = commit_or_replay(db, idempotency_key, fingerprint)
+            if replay:
+                return replay
+            if queue_email:
+                wake_outbox_worker()
+            return Response(content=body, media_type="application/json")
+    except Exception:
+        db.rollback()
+        raise
+    if queue_email:
+        wake_outbox_worker()
+
+    db_order = order_query(db).filter(models.Order.id == order_id).first()
     return map_order_response(db_order)
 
+ORDERS_PAGE_SIZE = 50
+ORDERS_MAX_PAGE_SIZE = 200
+
+def encode_order_cursor(order: models.Order) -> str:
+    # Opaque keyset cursor: the (created_at, id) of the last order on the page
+    raw = json.dumps({"c": order.created_at.isoformat(), "i": order.id})
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def decode_order_cursor(cursor: str):
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(raw["c"]), int(raw["i"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def encode_offset_cursor(offset: int) -> str:
+    # Relevance order has no stable key to resume from, so its cursor is a row offset
+    return base64.urlsafe_b64encode(json.dumps({"o": offset}).encode("utf-8")).decode("ascii")
+
+def decode_offset_cursor(cursor: str) -> int:
+    try:
+        return max(int(json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))["o"]), 0)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@router.post("/bulk", response_model=schemas.BulkOrderImportResult)
+def bulk_create_orders(rows: List[schemas.BulkOrderRow], db: Session = Depends(get_db)):
+    """Creates many orders from name-based rows; see process_order_rows."""
+    return process_order_rows(rows, db)
+
+@router.post("/bulk/upload", response_model=schemas.BulkOrderImportResult)
+def bulk_upload_orders(file: UploadFile = File(...), db: Session = Depends(get_db)):
+    """
+    Same as /orders/bulk for a CSV/Excel sheet with columns
+    Tailor, Product, Size, Quantity and optionally School, Fabric Width (Inches), Slip No, Notes, Date.
+    """
+    try:
+        return process_order_file(file.file, db, file.filename)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/reprice", response_model=schemas.RepriceResult, dependencies=[Depends(require_admin)])
+def reprice_orders(
+    request: schemas.RepriceRequest,
+    dry_run: bool = False,
+    db: Session = Depends(get_db)
+):
+    """
+    Recomputes the material figures of Pending / In Progress order lines from the current
+    Material Rules, for one rule, one product or all open orders.
+    Use dry_run=true to preview the material delta without changing anything.
+    """
+    if request.scope == "rule" and not request.rule_id:
+        raise HTTPException(status_code=400, detail="rule_id is required for scope 'rule'")
+    if request.scope == "product" and not request.product_id:
+        raise HTTPException(status_code=400, detail="product_id is required for scope 'product'")
+
+    try:
+        return reprice_open_orders(db, request.scope, request.rule_id, request.product_id, dry_run)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
 @router.get("/", response_model=List[schemas.Order])
 def list_orders(
+    response: Response,
     search: str = None,
-    sort_by: str = "newest",
+    sort_by: str = None,
     status: str = None,
     school_id: int = None,
+    limit: int = Query(ORDERS_PAGE_SIZE, ge=1, le=ORDERS_MAX_PAGE_SIZE),
+    cursor: str = None,
+    include_total: bool = False,
     db: Session = Depends(get_db)
 ):
-    query = db.query(models.Order)
+    """
+    Returns one page of orders, keyset-paginated on (created_at, id).
+    sort_by is newest (default), oldest or relevance (default when searching).
+    search matches the start of words only ("ali" finds "Alice", "ice" does not). Relevance
+    ranks the newest RELEVANCE_CANDIDATES matches; older matches follow them, newest first.
+    The next page's cursor is sent in the X-Next-Cursor header (absent on the last page).
+    With include_total=true, the number of matching orders is sent in X-Total-Count.
+    """
+    filters = []
     
-    # 1. Search (Order ID or Tailor Name)
+    # 1. Search: the order ID, or words from the tailor, slip no, notes, schools and products
+    # through the order_search full-text index
+    matches = None
+    search_filters = []
+    order_id = None
     if search:
-        # Check if search is numeric (for Order ID)
-        if search.isdigit():
-             query = query.filter(models.Order.id == int(search))
-        else:
-             # Search by tailor name or slip number
-             query = query.join(models.Tailor).filter(
-                 (models.Tailor.name.ilike(f"%{search}%")) |
-                 (models.Order.slip_no.ilike(f"%{search}%"))
-             )
+        match_query = build_match_query(search)
+        order_id = int(search) if search.strip().isdigit() else None
+        if match_query:
+            matches = order_search_matches(match_query).subquery()
+            # "+ 0" keeps the planner from driving the query off the match list: it walks the
+            # created_at (or status) index instead and stops once the page is full
+            text_match = (models.Order.id + 0).in_(select(matches.c.rowid))
+            search_filters.append(text_match if order_id is None else or_(models.Order.id == order_id, text_match))
+        elif order_id is not None:
+            search_filters.append(models.Order.id == order_id)
+    sort_by = sort_by or ("relevance" if matches is not None else "newest")
 
     # 3. Filter by School (Check if any line has this school)
     if school_id:
-        # Join Order -> OrderLine -> School (if needed, or just check OrderLine.school_id)
-        # We want orders where at least one line matches the school_id
-        query = query.join(models.OrderLine).filter(models.OrderLine.school_id == school_id)
+        # We want orders where at least one line matches the school_id.
+        # EXISTS instead of a JOIN so an order with several matching lines is not repeated.
+        filters.append(models.Order.order_lines.any(models.OrderLine.school_id == school_id))
 
     # 4. Filter by Status
     if status and status.lower() != "all":
         # Case-insensitive match for robustness, though usually exact enum/string is used
-        query = query.filter(models.Order.status == status)
-
-    # 5. Sort
-    if sort_by == "oldest":
-        query = query.order_by(models.Order.created_at.asc())
+        filters.append(models.Order.status == status)
+
+    # Total is counted over the filters only, before the cursor narrows the window
+    if include_total:
+        total = db.query(func.count(models.Order.id)).filter(*search_filters, *filters).scalar()
+        response.headers["X-Total-Count"] = str(total)
+
+    # Best matches first (an exact order ID before any text match), paged by offset.
+    # Only the newest RELEVANCE_CANDIDATES matches are ranked; older ones follow, newest first
+    if sort_by == "relevance" and matches is not None:
+        offset = decode_offset_cursor(cursor) if cursor else 0
+        bound = relevance_bound(db, match_query)
+        ranked = order_search_matches(match_query, min_rowid=bound).subquery()
+        # Joining the ranked matches stands in for the IN filter; an order ID search keeps
+        # the filter, as that order may match none of the words
+        query = order_query(db, include_deliveries=False)
+        if order_id is None:
+            query = query.join(ranked, ranked.c.rowid == models.Order.id).filter(*filters)
+        else:
+            query = query.outerjoin(ranked, ranked.c.rowid == models.Order.id).filter(
+                or_(models.Order.id == order_id, models.Order.id.in_(select(ranked.c.rowid))), *filters
+            )
+        orders = query.order_by(
+            ranked.c.rank.is_not(None), ranked.c.rank, models.Order.created_at.desc(), models.Order.id.desc()
+        ).offset(offset).limit(limit + 1).all()
+
+        if len(orders) <= limit and bound is not None:
+            # The page runs past the ranked matches
+            ranked_count = offset + len(orders) if orders else query.order_by(None).count()
+            older = order_search_matches(match_query, max_rowid=bound).subquery()
+            older_query = order_query(db, include_deliveries=False).filter(
+                (models.Order.id + 0).in_(select(older.c.rowid)), *filters,
+                *([models.Order.id != order_id] if order_id is not None else [])
+            ).order_by(models.Order.created_at.desc(), models.Order.id.desc())
+            orders += older_query.offset(max(offset - ranked_count, 0)).limit(limit + 1 - len(orders)).all()
+
+        if len(orders) > limit:
+            orders = orders[:limit]
+            response.headers["X-Next-Cursor"] = encode_offset_cursor(offset + limit)
+        return [map_order_response(o, include_deliveries=False) for o in orders]
+
+    # 5. Sort (id breaks ties between orders created at the same instant)
+    oldest_first = sort_by == "oldest"
+    if cursor:
+        last_created_at, last_id = decode_order_cursor(cursor)
+        if oldest_first:
+            filters.append(
+                (models.Order.created_at > last_created_at) |
+                ((models.Order.created_at == last_created_at) & (models.Order.id > last_id))
+            )
+        else:
+            filters.append(
+                (models.Order.created_at < last_created_at) |
+                ((models.Order.created_at == last_created_at) & (models.Order.id < last_id))
+            )
+
+    # Delivery history is only shown on the order details page
+    query = order_query(db, include_deliveries=False).filter(*search_filters, *filters)
+    if oldest_first:
+        query = query.order_by(models.Order.created_at.asc(), models.Order.id.asc())
     else:
         # Default to newest
-        query = query.order_by(models.Order.created_at.desc())
+        query = query.order_by(models.Order.created_at.desc(), models.Order.id.desc())
+
+    # Fetch one extra row to know whether another page exists
+    orders = query.limit(limit + 1).all()
+    if len(orders) > limit:
+        orders = orders[:limit]
+        response.headers["X-Next-Cursor"] = encode_order_cursor(orders[-1])
 
-    orders = query.all()
-    return [map_order_response(o) for o in orders]
+    return [map_order_response(o, include_deliveries=False) for o in orders]
 
 @router.get("/{order_id}", response_model=schemas.Order)
 def get_order(order_id: int, db: Session = Depends(get_db)):
-    order = db.query(models.Order).filter(models.Order.id == order_id).first()
+    order = order_query(db).filter(models.Order.id == order_id).first()
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     return map_order_response(order)
 
 @router.post("/lines/{line_id}/deliveries", response_model=schemas.Delivery)
-def record_delivery(line_id: int, delivery: schemas.DeliveryCreate, db: Session = Depends(get_db)):
+def record_delivery(
+    line_id: int,
+    delivery: schemas.DeliveryCreate,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    db: Session = Depends(get_db)
+):
+    """Records a delivery against a line; an Idempotency-Key header makes retries safe (see create_order)."""
+    if idempotency_key is not None:
+        fingerprint = request_fingerprint(
+            "POST", f"/orders/lines/{line_id}/deliveries", delivery.model_dump(mode="json")
+        )
+        replay = replay_response(db, idempotency_key, fingerprint)
+        if replay:
+            return replay
+
     line = db.query(models.OrderLine).filter(models.OrderLine.id == line_id).first()
     if not line:
         raise HTTPException(status_code=404, detail="Order Line not found")
@@ -141,70 +374,76 @@ def record_delivery(line_id: int, delivery: schemas.DeliveryCreate, db: Session
         date_delivered=delivery.date_delivered or datetime.utcnow()
     )
     db.add(db_delivery)
+    db.flush()
+
+    # Bump the stored counters and update the Order Status in the same transaction
+    add_delivered_qty(db, line, delivery.quantity_delivered, db_delivery.date_delivered)
+    recompute_order_status(db, line.order_id)
+    if idempotency_key is not None:
+        body = schemas.Delivery.model_validate(db_delivery).model_dump_json().encode("utf-8")
+        remember_response(db, idempotency_key, fingerprint, body)
+        return commit_or_replay(db, idempotency_key, fingerprint) or Response(content=body, media_type="application/json")
     db.commit()
     db.refresh(db_delivery)
     
-    # Update Order Status
-    # Logic: Check all lines in the order.
-    # If all lines have (delivered >= quantity), status = Completed
-    # If any delivery exists but not all completed, status = In Progress
-    # If no deliveries, status = Pending (usually starts here)
-    
-    order = db.query(models.Order).filter(models.Order.id == line.order_id).first()
-    if order:
-        # Force refresh of order and its relationships to ensure we see the new delivery
-        db.refresh(order)
-        
-        all_completed = True
-        any_delivered = False
-        
-        for ol in order.order_lines:
-            # Explicitly refresh the line or its deliveries if needed, 
-            # but usually refreshing order should cascade if configured, 
-            # or access triggers lazy load. 
-            # Safest is to sum manually from the relationship which will re-query if expired.
-            db.refresh(ol) 
-            d_qty = sum(d.quantity_delivered for d in ol.deliveries)
-            
-            if d_qty > 0:
-                any_delivered = True
-            
-            if d_qty < ol.quantity:
-                all_completed = False
-        
-        new_status = order.status
-        if all_completed and len(order.order_lines) > 0:
-            new_status = "Completed"
-        elif any_delivered:
-            new_status = "In Progress"
-        
-        if new_status != order.status:
-            order.status = new_status
-            db.commit()
-            db.refresh(order)
-    
     return db_delivery
 
-@router.put("/{order_id}", response_model=schemas.Order)
+@router.post("/{order_id}/deliveries", response_model=schemas.Order)
+def record_order_deliveries(
+    order_id: int,
+    request: schemas.OrderDeliveriesCreate,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    db: Session = Depends(get_db)
+):
+    """
+    Records a batch handed in by the tailor: many {line_id, quantity} entries, or
+    deliver_all_pending to complete every line, in one transaction.
+    Returns the updated order with its deliveries.
+    """
+    if bool(request.entries) == request.deliver_all_pending:
+        raise HTTPException(status_code=400, detail="Send either entries or deliver_all_pending")
+    if idempotency_key is not None:
+        fingerprint = request_fingerprint("POST", f"/orders/{order_id}/deliveries", request.model_dump(mode="json"))
+        replay = replay_response(db, idempotency_key, fingerprint)
+        if replay:
+            return replay
+
+    try:
+        deliver_order_lines(
+            db, order_id, [(entry.line_id, entry.quantity) for entry in request.entries],
+            request.deliver_all_pending, request.date_delivered
+        )
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        # Raised before anything is written
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if idempotency_key is not None:
+        db.flush()
+        db_order = order_query(db).populate_existing().filter(models.Order.id == order_id).first()
+        body = map_order_response(db_order).model_dump_json().encode("utf-8")
+        remember_response(db, idempotency_key, fingerprint, body)
+        return commit_or_replay(db, idempotency_key, fingerprint) or Response(content=body, media_type="application/json")
+    db.commit()
+    return map_order_response(order_query(db).filter(models.Order.id == order_id).first())
+
+@router.put("/{order_id}", response_model=schemas.Order, dependencies=[Depends(require_admin)])
 def update_order(
     order_id: int, 
     update_data: schemas.OrderUpdate, 
-    x_admin_password: str = Header(None, alias="X-Admin-Password"),
     db: Session = Depends(get_db)
 ):
-    # Verify Admin Password
-    if not x_admin_password:
-        raise HTTPException(status_code=401, detail="Admin password required")
-    
-    setting = db.query(models.Settings).filter(models.Settings.key == "admin_password").first()
-    if not setting or not verify_password(x_admin_password, setting.value):
-        raise HTTPException(status_code=401, detail="Invalid admin password")
-
     db_order = db.query(models.Order).filter(models.Order.id == order_id).first()
     if not db_order:
         raise HTTPException(status_code=404, detail="Order not found")
 
     updates = update_data.model_dump(exclude_unset=True)
+
+    # Moving the order to another tailor or status moves it in the dashboard counts too
+    deltas, daily = {}, {}
+    add_order_deltas(deltas, db_order.tailor_id, db_order.status, sign=-1)
+    add_order_daily_deltas(db, daily, models.Order.id == order_id, sign=-1)
     
     if "tailor_id" in updates:
         db_order.tailor_id = updates["tailor_id"]
@@ -217,25 +456,21 @@ def update_order(
     if "created_at" in updates:
         db_order.created_at = updates["created_at"]
 
+    add_order_deltas(deltas, db_order.tailor_id, db_order.status)
+    apply_rollup_deltas(db, deltas)
+    db.flush()
+    add_order_daily_deltas(db, daily, models.Order.id == order_id)
+    apply_daily_deltas(db, daily)
     db.commit()
-    db.refresh(db_order)
+    db_order = order_query(db).filter(models.Order.id == order_id).first()
     return map_order_response(db_order)
 
-@router.put("/lines/{line_id}", response_model=schemas.OrderLine)
+@router.put("/lines/{line_id}", response_model=schemas.OrderLine, dependencies=[Depends(require_admin)])
 def update_order_line(
     line_id: int, 
     update_data: schemas.OrderLineUpdate, 
-    x_admin_password: str = Header(None, alias="X-Admin-Password"),
     db: Session = Depends(get_db)
 ):
-    # Verify Admin Password
-    if not x_admin_password:
-        raise HTTPException(status_code=401, detail="Admin password required")
-    
-    setting = db.query(models.Settings).filter(models.Settings.key == "admin_password").first()
-    if not setting or not verify_password(x_admin_password, setting.value):
-        raise HTTPException(status_code=401, detail="Invalid admin password")
-
     db_line = db.query(models.OrderLine).filter(models.OrderLine.id == line_id).first()
     if not db_line:
         raise HTTPException(status_code=404, detail="Order Line not found")
@@ -260,6 +495,14 @@ def update_order_line(
         db_line.given_cloth = updates["given_cloth"]
     
     recalc_needed = False
+
+    # The line's old figures come out of the dashboard totals, its new ones go in below
+    deltas, daily = {}, {}
+    add_line_deltas(
+        deltas, db_line.product_id, db_line.quantity, db_line.total_material_req,
+        db_line.delivered_qty, db_line.material_req_per_unit, sign=-1
+    )
+    add_order_daily_deltas(db, daily, models.Order.id == db_line.order_id, sign=-1)
     
     # Check if we need to find a new rule
     new_size_id = updates.get("size_id", db_line.size_id)
@@ -271,14 +514,7 @@ def update_order_line(
         "rule_id" in updates):
         
         # Find new rule
-        if updates.get("rule_id"):
-            rule = db.query(models.MaterialRule).filter(models.MaterialRule.id == updates["rule_id"]).first()
-        else:
-            query = db.query(models.MaterialRule).filter(models.MaterialRule.size_id == new_size_id)
-            if new_fabric_width:
-                rule = query.filter(models.MaterialRule.fabric_width_inches == new_fabric_width).first()
-            else:
-                rule = query.first() # Default or only rule
+        rule = get_rule_index(db).resolve(new_size_id, new_fabric_width, updates.get("rule_id"))
         
         if not rule:
              raise HTTPException(status_code=400, detail=f"No material rule found for Size ID {new_size_id}")
@@ -303,6 +539,14 @@ def update_order_line(
     if recalc_needed:
         db_line.total_material_req = db_line.quantity * db_line.material_req_per_unit
 
+    add_line_deltas(
+        deltas, db_line.product_id, db_line.quantity, db_line.total_material_req,
+        db_line.delivered_qty, db_line.material_req_per_unit
+    )
+    apply_rollup_deltas(db, deltas)
+    db.flush()
+    add_order_daily_deltas(db, daily, models.Order.id == db_line.order_id)
+    apply_daily_deltas(db, daily)
     db.commit()
     db.refresh(db_line)
     
@@ -313,138 +557,98 @@ def update_order_line(
     # But schemas.OrderLine has computed fields pending_qty etc.
     # We can reuse the logic from map_order_response but scoped to one line.
     
-    delivered = sum(d.quantity_delivered for d in db_line.deliveries)
-    pending = db_line.quantity - delivered
-    
-    return schemas.OrderLine(
-        id=db_line.id,
-        order_id=db_line.order_id,
-        product_id=db_line.product_id,
-        size_id=db_line.size_id,
-        product_name=db_line.product.name if db_line.product else f"Product #{db_line.product_id}",
-        size_label=db_line.size.label if db_line.size else f"Size #{db_line.size_id}",
-        school_id=db_line.school_id,
-        school_name=db_line.school.name if db_line.school else None,
-        fabric_width_inches=db_line.fabric_width_inches,
-        quantity=db_line.quantity,
-        material_req_per_unit=db_line.material_req_per_unit,
-        unit=db_line.unit,
-        total_material_req=db_line.total_material_req,
-        delivered_qty=delivered,
-        pending_qty=pending,
-        group_id=db_line.group_id,
-        given_cloth=db_line.given_cloth,
-        deliveries=db_line.deliveries
-    )
-
-@router.delete("/{order_id}")
-def delete_order(order_id: int, x_admin_password: str = Header(None, alias="X-Admin-Password"), db: Session = Depends(get_db)):
-    if not x_admin_password:
-        raise HTTPException(status_code=401, detail="Admin password required")
-    
-    setting = db.query(models.Settings).filter(models.Settings.key == "admin_password").first()
-    if not setting or not verify_password(x_admin_password, setting.value):
-        raise HTTPException(status_code=401, detail="Invalid admin password")
+    return map_order_line_response(db_line)
 
+@router.delete("/{order_id}", dependencies=[Depends(require_admin)])
+def delete_order(order_id: int, db: Session = Depends(get_db)):
     order = db.query(models.Order).filter(models.Order.id == order_id).first()
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
+
+    # Take the order and its lines out of the dashboard totals
+    deltas = {}
+    add_order_deltas(deltas, order.tailor_id, order.status, sign=-1)
+    for line in order.order_lines:
+        add_line_deltas(
+            deltas, line.product_id, line.quantity, line.total_material_req,
+            line.delivered_qty, line.material_req_per_unit, sign=-1
+        )
+    apply_rollup_deltas(db, deltas)
+    daily = {}
+    add_order_daily_deltas(db, daily, models.Order.id == order_id, sign=-1)
+    apply_daily_deltas(db, daily)
     
     db.delete(order)
     db.commit()
     return {"message": "Order deleted"}
 
-@router.delete("/lines/{line_id}")
-def delete_order_line(line_id: int, x_admin_password: str = Header(None, alias="X-Admin-Password"), db: Session = Depends(get_db)):
-    if not x_admin_password:
-        raise HTTPException(status_code=401, detail="Admin password required")
-    
-    setting = db.query(models.Settings).filter(models.Settings.key == "admin_password").first()
-    if not setting or not verify_password(x_admin_password, setting.value):
-        raise HTTPException(status_code=401, detail="Invalid admin password")
-
+@router.delete("/lines/{line_id}", dependencies=[Depends(require_admin)])
+def delete_order_line(line_id: int, db: Session = Depends(get_db)):
     db_line = db.query(models.OrderLine).filter(models.OrderLine.id == line_id).first()
     if not db_line:
         raise HTTPException(status_code=404, detail="Order Line not found")
         
+    # Take the line's deliveries out of the order rollup before the line goes,
+    # then the rest of the line out of the dashboard totals
+    order_id = db_line.order_id
+    daily = {}
+    add_order_daily_deltas(db, daily, models.Order.id == order_id, sign=-1)
+    add_delivered_qty(db, db_line, -db_line.delivered_qty)
+    deltas = {}
+    add_line_deltas(deltas, db_line.product_id, db_line.quantity, db_line.total_material_req, sign=-1)
+    apply_rollup_deltas(db, deltas)
     db.delete(db_line)
+    db.flush()
+    add_order_daily_deltas(db, daily, models.Order.id == order_id)
+    apply_daily_deltas(db, daily)
     db.commit()
     return {"message": "Order line deleted"}
 
-@router.delete("/deliveries/{delivery_id}")
-def delete_delivery(delivery_id: int, x_admin_password: str = Header(None, alias="X-Admin-Password"), db: Session = Depends(get_db)):
-    if not x_admin_password:
-        raise HTTPException(status_code=401, detail="Admin password required")
-    
-    setting = db.query(models.Settings).filter(models.Settings.key == "admin_password").first()
-    if not setting or not verify_password(x_admin_password, setting.value):
-        raise HTTPException(status_code=401, detail="Invalid admin password")
-
+@router.delete("/deliveries/{delivery_id}", dependencies=[Depends(require_admin)])
+def delete_delivery(delivery_id: int, db: Session = Depends(get_db)):
     delivery = db.query(models.Delivery).filter(models.Delivery.id == delivery_id).first()
     if not delivery:
         raise HTTPException(status_code=404, detail="Delivery not found")
         
-    line_id = delivery.order_line_id
+    line = delivery.order_line
     db.delete(delivery)
-    db.commit()
+    db.flush()
 
-    # Update Order Status
-    line = db.query(models.OrderLine).filter(models.OrderLine.id == line_id).first()
-    if line:
-        order = db.query(models.Order).filter(models.Order.id == line.order_id).first()
-        if order:
-            db.refresh(order)
-            all_completed = True
-            any_delivered = False
-            
-            for ol in order.order_lines:
-                db.refresh(ol) 
-                d_qty = sum(d.quantity_delivered for d in ol.deliveries)
-                if d_qty > 0:
-                    any_delivered = True
-                if d_qty < ol.quantity:
-                    all_completed = False
-            
-            new_status = order.status
-            if all_completed and len(order.order_lines) > 0:
-                new_status = "Completed"
-            elif any_delivered:
-                new_status = "In Progress"
-            else:
-                new_status = "Pending"
-            
-            if new_status != order.status:
-                order.status = new_status
-                db.commit()
+    # Undo the delivery in the stored counters and update the Order Status
+    add_delivered_qty(db, line, -delivery.quantity_delivered, delivery.date_delivered)
+    recompute_order_status(db, line.order_id)
+    db.commit()
 
     return {"message": "Delivery deleted"}
 
-def map_order_response(order: models.Order) -> schemas.Order:
-    # Helper to calculate delivered/pending quantities for response
-    mapped_lines = []
-    for line in order.order_lines:
-        delivered = sum(d.quantity_delivered for d in line.deliveries)
-        pending = line.quantity - delivered
-        mapped_lines.append(schemas.OrderLine(
-            id=line.id,
-            order_id=line.order_id,
-            product_id=line.product_id,
-            size_id=line.size_id,
-            product_name=line.product.name if line.product else f"Product #{line.product_id}",
-            size_label=line.size.label if line.size else f"Size #{line.size_id}",
-            school_id=line.school_id,
-            school_name=line.school.name if line.school else None,
-            fabric_width_inches=line.fabric_width_inches,
-            quantity=line.quantity,
-            material_req_per_unit=line.material_req_per_unit,
-            unit=line.unit,
-            total_material_req=line.total_material_req,
-            delivered_qty=delivered,
-            pending_qty=pending,
-            group_id=line.group_id,
-            given_cloth=line.given_cloth,
-            deliveries=line.deliveries
-        ))
+def map_order_line_response(line: models.OrderLine, include_deliveries: bool = True) -> schemas.OrderLine:
+    delivered = line.delivered_qty
+    pending = line.quantity - delivered
+    return schemas.OrderLine(
+        id=line.id,
+        order_id=line.order_id,
+        product_id=line.product_id,
+        size_id=line.size_id,
+        product_name=line.product.name if line.product else f"Product #{line.product_id}",
+        size_label=line.size.label if line.size else f"Size #{line.size_id}",
+        school_id=line.school_id,
+        school_name=line.school.name if line.school else None,
+        fabric_width_inches=line.fabric_width_inches,
+        quantity=line.quantity,
+        material_req_per_unit=line.material_req_per_unit,
+        unit=line.unit,
+        total_material_req=line.total_material_req,
+        delivered_qty=delivered,
+        pending_qty=pending,
+        group_id=line.group_id,
+        given_cloth=line.given_cloth,
+        deliveries=line.deliveries if include_deliveries else []
+    )
+
+def map_order_response(order: models.Order, include_deliveries: bool = True) -> schemas.Order:
+    # Helper to calculate delivered/pending quantities for response.
+    # Load orders through order_query() so this does not trigger lazy loads per line.
+    mapped_lines = [map_order_line_response(line, include_deliveries) for line in order.order_lines]
 
     return schemas.Order(
         id=order.id,
@@ -456,5 +660,6 @@ def map_order_response(order: models.Order) -> schemas.Order:
         created_at=order.created_at,
         notes=order.notes,
         slip_no=order.slip_no,
+        delivered_qty=order.delivered_qty,
         order_lines=mapped_lines
     )
@@ -1,9 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
 from typing import List
 
 from .. import models, schemas
 from ..database import get_db
+from ..utils.cache_utils import SCHOOLS_VERSION_KEY, bump_data_version, cached
+
+_schools_adapter = TypeAdapter(List[schemas.School])
 
 router = APIRouter(
     prefix="/schools",
@@ -12,8 +16,12 @@ router = APIRouter(
 
 @router.get("/", response_model=List[schemas.School])
 def read_schools(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    schools = db.query(models.School).order_by(models.School.name).offset(skip).limit(limit).all()
-    return schools
+    def build():
+        schools = db.query(models.School).order_by(models.School.name).offset(skip).limit(limit).all()
+        return _schools_adapter.dump_json(_schools_adapter.validate_python(schools, from_attributes=True))
+
+    body = cached(db, ("schools", skip, limit), [SCHOOLS_VERSION_KEY], build)
+    return Response(content=body, media_type="application/json")
 
 @router.post("/", response_model=schemas.School)
 def create_school(school: schemas.SchoolCreate, db: Session = Depends(get_db)):
@@ -22,6 +30,7 @@ def create_school(school: schemas.SchoolCreate, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="School already registered")
     new_school = models.School(name=school.name)
     db.add(new_school)
+    bump_data_version(db, SCHOOLS_VERSION_KEY)
     db.commit()
     db.refresh(new_school)
     return new_school
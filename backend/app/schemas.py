@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field, ConfigDict
 from typing import List, Optional, Literal
-from datetime import datetime
+from datetime import date, datetime
 
 # --- Master Data Schemas ---
 
@@ -51,6 +51,7 @@ class TailorBase(BaseModel):
     name: str
     phone: Optional[str] = None
     email: Optional[str] = None
+    email_digest: bool = False
     is_active: bool = True
 
 class TailorCreate(TailorBase):
@@ -80,6 +81,16 @@ class DeliveryCreate(BaseModel):
     quantity_delivered: int
     date_delivered: Optional[datetime] = None
 
+class OrderDeliveryEntry(BaseModel):
+    line_id: int
+    quantity: int = Field(..., gt=0)
+
+class OrderDeliveriesCreate(BaseModel):
+    # Either explicit entries or every line's pending quantity
+    entries: List[OrderDeliveryEntry] = []
+    deliver_all_pending: bool = False
+    date_delivered: Optional[datetime] = None
+
 class Delivery(BaseModel):
     id: int
     order_line_id: int
@@ -156,10 +167,62 @@ class Order(BaseModel):
     notes: Optional[str] = None
     slip_no: Optional[str] = None
     given_cloth: Optional[float] = None
+    delivered_qty: int = 0
     order_lines: List[OrderLine] = []
 
     model_config = ConfigDict(from_attributes=True)
 
+class BulkOrderRow(BaseModel):
+    # One spreadsheet row: master data is referenced by name.
+    # Rows with the same tailor and slip number become one order.
+    tailor: str
+    product: str
+    size: str
+    quantity: int = Field(..., gt=0)
+    school: Optional[str] = None
+    fabric_width_inches: Optional[int] = None
+    slip_no: Optional[str] = None
+    notes: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+
+class BulkOrderRowError(BaseModel):
+    row: int
+    error: str
+
+class BulkOrderImportResult(BaseModel):
+    orders_created: int
+    lines_created: int
+    rows_skipped: int
+    errors: List[BulkOrderRowError] = []
+
+class RepriceRequest(BaseModel):
+    scope: Literal["rule", "product", "all"] = "all"
+    rule_id: Optional[int] = None
+    product_id: Optional[int] = None
+
+class RepriceDelta(BaseModel):
+    unit: str
+    lines_changed: int
+    old_total: float
+    new_total: float
+    delta: float
+
+class RepriceProductDelta(RepriceDelta):
+    product_id: int
+    product_name: str
+
+class RepriceResult(BaseModel):
+    scope: str
+    dry_run: bool
+    lines_matched: int
+    lines_changed: int
+    lines_updated: int
+    lines_without_rule: int
+    totals: List[RepriceDelta] = []
+    products: List[RepriceProductDelta] = []
+
 # --- Dashboard Schemas ---
 
 class ProductStat(BaseModel):
@@ -178,6 +241,12 @@ class DashboardStats(BaseModel):
     top_products: List[ProductStat]
     top_tailors: List[TailorStat]
 
+class DashboardSeriesPoint(BaseModel):
+    period: date # First day of the day, week (Monday) or month
+    material_issued: float
+    material_work_done: float
+    pieces_delivered: int
+
 # --- Admin Schemas ---
 
 class AdminPasswordVerify(BaseModel):
@@ -186,3 +255,9 @@ class AdminPasswordVerify(BaseModel):
 class AdminPasswordChange(BaseModel):
     current_password: str
     new_password: str
+
+class AdminVerifyResult(BaseModel):
+    valid: bool
+    # Send as X-Admin-Token to admin routes instead of the password
+    token: Optional[str] = None
+    expires_at: Optional[datetime] = None
@@ -0,0 +1,86 @@
+from collections import OrderedDict
+from typing import Callable, Hashable, Iterable, Tuple
+import threading
+import time
+from sqlalchemy import cast, Integer, String
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from .. import models
+
+# Settings rows holding data versions. A write bumps its area's version in the same
+# transaction, so every worker sees the change on its next read without any messaging.
+# The catalog keeps its own key (catalog_utils.CATALOG_VERSION_KEY).
+DASHBOARD_VERSION_KEY = "dashboard_version"
+SCHOOLS_VERSION_KEY = "schools_version"
+TAILORS_VERSION_KEY = "tailors_version"
+
+RESPONSE_CACHE_MAX_ENTRIES = 256
+RESPONSE_CACHE_TTL_SECONDS = 30
+
+def get_data_versions(db: Session, keys: Iterable[str]) -> Tuple[int, ...]:
+    """Current versions of the given keys (0 when never bumped), in one query."""
+    keys = tuple(keys)
+    values = dict(db.query(models.Settings.key, models.Settings.value).filter(models.Settings.key.in_(keys)))
+    return tuple(int(values[key]) if values.get(key) else 0 for key in keys)
+
+def bump_data_version(db: Session, key: str):
+    """
+    Increments a data version in SQL with a single upsert (creating it at 1).
+    Does not commit: call it before the write's commit.
+    """
+    settings = models.Settings.__table__
+    statement = insert(settings).values(key=key, value="1")
+    db.execute(statement.on_conflict_do_update(
+        index_elements=[settings.c.key],
+        set_={"value": cast(cast(settings.c.value, Integer) + 1, String)}
+    ))
+
+class ResponseCache:
+    """
+    Small LRU of built responses. An entry is served while it is younger than the TTL
+    and was built for the same data versions as the caller reads now; anything else
+    is rebuilt. Safe to share between request threads.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, ttl_seconds: float = RESPONSE_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[tuple, float, object]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key: Hashable, versions: tuple, build: Callable[[], object]):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == versions and entry[1] > now:
+                self._entries.move_to_end(key)
+                return entry[2]
+
+        # Built outside the lock: two threads may build the same entry, the last one wins
+        value = build()
+        with self._lock:
+            self._entries[key] = (versions, now + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+response_cache = ResponseCache()
+
+def cached(db: Session, key: Hashable, depends_on: Iterable[str], build: Callable[[], object]):
+    """
+    Returns build() from the shared response cache. `depends_on` lists the version keys
+    whose bump invalidates the entry; build should return something immutable, such as
+    serialized JSON bytes.
+    """
+    return response_cache.get_or_build(key, get_data_versions(db, depends_on), build)
+
+def clear_response_cache():
+    response_cache.clear()
@@ -0,0 +1,92 @@
+from typing import List, Optional, Tuple
+import hashlib
+import threading
+from pydantic import TypeAdapter
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from .. import models, schemas
+from .cache_utils import bump_data_version
+
+# Settings row holding the catalog version. Every product/size/rule write bumps it in
+# the same transaction, so any worker can tell whether its cached catalog is current.
+CATALOG_VERSION_KEY = "catalog_version"
+
+def get_catalog_version(db: Session) -> int:
+    value = db.query(models.Settings.value).filter(models.Settings.key == CATALOG_VERSION_KEY).scalar()
+    return int(value) if value else 0
+
+def bump_catalog_version(db: Session):
+    """Increments the catalog version in SQL. Does not commit: call it before the write's commit."""
+    bump_data_version(db, CATALOG_VERSION_KEY)
+
+# The serialized catalog for the current version: (version, etag, body)
+_catalog_snapshot: Optional[Tuple[int, str, bytes]] = None
+_catalog_lock = threading.Lock()
+_products_adapter = TypeAdapter(List[schemas.Product])
+
+def load_catalog(db: Session, skip: int = 0, limit: Optional[int] = None) -> List[models.Product]:
+    """
+    Products by name with their sizes (by order_index) and rules, in exactly three
+    queries whatever the catalog size. limit=None loads every product.
+    """
+    query = db.query(models.Product).order_by(models.Product.name, models.Product.id).offset(skip)
+    if limit is not None:
+        query = query.limit(limit)
+    products = query.all()
+
+    sizes_query = db.query(models.Size)
+    rules_query = db.query(models.MaterialRule).join(models.Size)
+    if skip or limit is not None:
+        product_ids = [p.id for p in products]
+        sizes_query = sizes_query.filter(models.Size.product_id.in_(product_ids))
+        rules_query = rules_query.filter(models.Size.product_id.in_(product_ids))
+
+    rules_by_size = {}
+    for rule in rules_query.order_by(models.MaterialRule.id):
+        rules_by_size.setdefault(rule.size_id, []).append(rule)
+    sizes_by_product = {}
+    for size in sizes_query.order_by(models.Size.order_index, models.Size.id):
+        set_committed_value(size, "material_rules", rules_by_size.get(size.id, []))
+        sizes_by_product.setdefault(size.product_id, []).append(size)
+    # Attach the collections as loaded so serializing them issues no lazy loads
+    for product in products:
+        set_committed_value(product, "sizes", sizes_by_product.get(product.id, []))
+    return products
+
+def dump_products(products: List[models.Product]) -> bytes:
+    """Products as the JSON the product endpoints return."""
+    return _products_adapter.dump_json(_products_adapter.validate_python(products, from_attributes=True))
+
+def get_catalog_snapshot(db: Session) -> Tuple[str, bytes]:
+    """
+    Returns (etag, JSON body) of the whole catalog. The body is serialized once per
+    catalog version and reused until the version moves.
+    """
+    global _catalog_snapshot
+    # Version and catalog are read in the same transaction, so they match
+    version = get_catalog_version(db)
+    snapshot = _catalog_snapshot
+    if snapshot is None or snapshot[0] != version:
+        body = dump_products(load_catalog(db))
+        etag = f'"{version}-{hashlib.sha1(body).hexdigest()[:12]}"'
+        snapshot = (version, etag, body)
+        with _catalog_lock:
+            _catalog_snapshot = snapshot
+    return snapshot[1], snapshot[2]
+
+def etag_matches(etag: str, if_none_match: Optional[str]) -> bool:
+    """If-None-Match check: a list of (possibly weak) tags, or *."""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag or tag == "*":
+            return True
+    return False
+
+def clear_catalog_cache():
+    global _catalog_snapshot
+    with _catalog_lock:
+        _catalog_snapshot = None
@@ -0,0 +1,308 @@
+from datetime import date, datetime
+from typing import Dict, Optional, Tuple
+from sqlalchemy import Date, case, func, literal, select, true
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from .. import models
+from .cache_utils import DASHBOARD_VERSION_KEY, bump_data_version
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Global metrics use ref_id 0; per-product / per-tailor metrics use the row id
+MATERIAL_ISSUED = "material_issued"          # sum of order_lines.total_material_req
+MATERIAL_WORK_DONE = "material_work_done"    # sum of delivered quantity * material_req_per_unit
+PRODUCT_QUANTITY = "product_quantity"        # ordered quantity per product
+TAILOR_ORDERS = "tailor_orders"              # order count per tailor
+
+def status_metric(status: str) -> str:
+    """Order count for one status, e.g. orders:Pending."""
+    return f"orders:{status}"
+
+RollupDeltas = Dict[Tuple[str, int], float]
+
+def add_delta(deltas: RollupDeltas, metric: str, amount, ref_id: int = 0):
+    deltas[(metric, ref_id)] = deltas.get((metric, ref_id), 0) + (amount or 0)
+
+def add_order_deltas(deltas: RollupDeltas, tailor_id, status, sign: int = 1):
+    """Contribution of one order (without its lines); sign=-1 takes it back out."""
+    if status:
+        add_delta(deltas, status_metric(status), sign)
+    if tailor_id:
+        add_delta(deltas, TAILOR_ORDERS, sign, tailor_id)
+
+def add_line_deltas(deltas: RollupDeltas, product_id, quantity, total_material_req,
+                    delivered_qty=0, material_req_per_unit=0, sign: int = 1):
+    """Contribution of one order line; sign=-1 takes it back out."""
+    add_delta(deltas, MATERIAL_ISSUED, sign * (total_material_req or 0))
+    add_delta(deltas, MATERIAL_WORK_DONE, sign * (delivered_qty or 0) * (material_req_per_unit or 0))
+    add_delta(deltas, PRODUCT_QUANTITY, sign * (quantity or 0), product_id)
+
+def apply_rollup_deltas(db: Session, deltas: RollupDeltas):
+    """
+    Adds the deltas to the rollup rows with one executemany upsert, and bumps the
+    dashboard version so cached stats are rebuilt. Does not commit; call inside the same transaction as the write it accounts for.
+    """
+    rows = [
+        {"metric": metric, "ref_id": ref_id or 0, "value": amount}
+        for (metric, ref_id), amount in deltas.items() if amount
+    ]
+    if not rows:
+        return
+    bump_data_version(db, DASHBOARD_VERSION_KEY)
+    table = models.DashboardRollup.__table__
+    statement = insert(table)
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=[table.c.metric, table.c.ref_id],
+            set_={"value": table.c.value + statement.excluded.value}
+        ),
+        rows
+    )
+
+# --- Daily rollups (time-windowed dashboard) ---
+
+ACTIVE_STATUSES = ("Pending", "In Progress")
+DAILY_COLUMNS = (
+    "quantity_ordered", "material_issued", "pieces_delivered",
+    "material_work_done", "orders_created", "orders_active",
+)
+
+DailyKey = Tuple[date, int, int, int]
+DailyDeltas = Dict[DailyKey, Dict[str, float]]
+
+def add_daily_delta(deltas: DailyDeltas, day, tailor_id=None, school_id=None, product_id=None, **amounts):
+    """Adds to the (day, tailor, school, product) row; day may be a date or a datetime."""
+    if isinstance(day, datetime):
+        day = day.date()
+    row = deltas.setdefault((day, tailor_id or 0, school_id or 0, product_id or 0), {})
+    for column, amount in amounts.items():
+        row[column] = row.get(column, 0) + (amount or 0)
+
+def add_new_order_daily_deltas(deltas: DailyDeltas, created_at, tailor_id, status, line_rows):
+    """Daily contribution of a freshly created order and its line rows (dicts as inserted)."""
+    add_daily_delta(deltas, created_at, tailor_id, orders_created=1, orders_active=int(status in ACTIVE_STATUSES))
+    for row in line_rows:
+        add_daily_delta(
+            deltas, created_at, tailor_id, row.get("school_id"), row["product_id"],
+            quantity_ordered=row["quantity"], material_issued=row["total_material_req"]
+        )
+
+def add_order_daily_deltas(db: Session, deltas: DailyDeltas, order_filter, sign: int = 1):
+    """
+    Daily contribution of the orders matching `order_filter` (a clause on Order), read
+    from their lines and deliveries with three grouped queries. Edits that may move an
+    order's figures between days, tailors or schools take the contribution out
+    (sign=-1) before the change and put it back after a flush.
+    """
+    order, line, delivery = models.Order, models.OrderLine, models.Delivery
+    created_day = func.date(order.created_at, type_=Date)
+    delivered_day = func.date(delivery.date_delivered, type_=Date)
+
+    lines = db.query(
+        created_day, order.tailor_id, line.school_id, line.product_id,
+        func.sum(line.quantity), func.sum(line.total_material_req)
+    ).join(order, line.order_id == order.id).filter(order_filter).group_by(
+        created_day, order.tailor_id, line.school_id, line.product_id
+    )
+    for day, tailor_id, school_id, product_id, quantity, total in lines:
+        add_daily_delta(
+            deltas, day, tailor_id, school_id, product_id,
+            quantity_ordered=sign * (quantity or 0), material_issued=sign * (total or 0)
+        )
+
+    deliveries = db.query(
+        delivered_day, order.tailor_id, line.school_id, line.product_id,
+        func.sum(delivery.quantity_delivered),
+        func.sum(delivery.quantity_delivered * line.material_req_per_unit)
+    ).join(line, delivery.order_line_id == line.id).join(order, line.order_id == order.id).filter(
+        order_filter
+    ).group_by(delivered_day, order.tailor_id, line.school_id, line.product_id)
+    for day, tailor_id, school_id, product_id, pieces, done in deliveries:
+        add_daily_delta(
+            deltas, day, tailor_id, school_id, product_id,
+            pieces_delivered=sign * (pieces or 0), material_work_done=sign * (done or 0)
+        )
+
+    orders = db.query(
+        created_day, order.tailor_id, func.count(order.id),
+        func.sum(case((order.status.in_(ACTIVE_STATUSES), 1), else_=0))
+    ).filter(order_filter).group_by(created_day, order.tailor_id)
+    for day, tailor_id, count, active in orders:
+        add_daily_delta(deltas, day, tailor_id, orders_created=sign * count, orders_active=sign * (active or 0))
+
+def apply_daily_deltas(db: Session, deltas: DailyDeltas):
+    """
+    Adds the deltas to the daily rows with one executemany upsert, and bumps the
+    dashboard version. Does not commit; call inside the same transaction as the write it accounts for.
+    """
+    rows = []
+    for (day, tailor_id, school_id, product_id), amounts in deltas.items():
+        if not any(amounts.values()):
+            continue
+        row = {"day": day, "tailor_id": tailor_id, "school_id": school_id, "product_id": product_id}
+        row.update({column: amounts.get(column, 0) for column in DAILY_COLUMNS})
+        rows.append(row)
+    if not rows:
+        return
+    bump_data_version(db, DASHBOARD_VERSION_KEY)
+    table = models.DashboardDaily.__table__
+    statement = insert(table)
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=[table.c.day, table.c.tailor_id, table.c.school_id, table.c.product_id],
+            set_={column: table.c[column] + statement.excluded[column] for column in DAILY_COLUMNS}
+        ),
+        rows
+    )
+
+def rebuild_dashboard_rollups(db: Session) -> int:
+    """
+    Recomputes every rollup row, global and daily, from orders, order_lines and deliveries
+    with grouped queries, e.g. after manual edits through scripts/edit_db.py.
+    Returns the number of rollup rows written.
+    """
+    table = models.DashboardRollup.__table__
+    line, order = models.OrderLine, models.Order
+    columns = ["metric", "ref_id", "value"]
+
+    db.execute(table.delete())
+    sources = [
+        select(literal(MATERIAL_ISSUED), literal(0), func.coalesce(func.sum(line.total_material_req), 0)),
+        select(
+            literal(MATERIAL_WORK_DONE), literal(0),
+            func.coalesce(func.sum(models.Delivery.quantity_delivered * line.material_req_per_unit), 0)
+        ).select_from(models.Delivery).join(line, models.Delivery.order_line_id == line.id),
+        select(literal("orders:") + order.status, literal(0), func.count(order.id))
+        .where(order.status.is_not(None)).group_by(order.status),
+        select(literal(PRODUCT_QUANTITY), line.product_id, func.sum(line.quantity))
+        .where(line.product_id.is_not(None)).group_by(line.product_id),
+        select(literal(TAILOR_ORDERS), order.tailor_id, func.count(order.id))
+        .where(order.tailor_id.is_not(None)).group_by(order.tailor_id),
+    ]
+    for source in sources:
+        db.execute(table.insert().from_select(columns, source))
+
+    db.execute(models.DashboardDaily.__table__.delete())
+    daily = {}
+    add_order_daily_deltas(db, daily, true())
+    apply_daily_deltas(db, daily)
+    bump_data_version(db, DASHBOARD_VERSION_KEY)
+    db.commit()
+
+    rows = db.query(func.count()).select_from(table).scalar() + len(daily)
+    logger.info(f"Dashboard rollups rebuilt: {rows} rows")
+    return rows
+
+def read_dashboard_stats(db: Session, top: int = 5, date_from: Optional[date] = None,
+                         date_to: Optional[date] = None, school_id: Optional[int] = None,
+                         tailor_id: Optional[int] = None) -> dict:
+    """
+    Dashboard figures from the rollup tables: a handful of small reads whose cost does not
+    depend on how many orders are kept. Without filters the all-time totals are read;
+    any filter switches to the daily rows.
+    """
+    if any(value is not None for value in (date_from, date_to, school_id, tailor_id)):
+        return _read_windowed_stats(db, top, date_from, date_to, school_id, tailor_id)
+
+    rollup = models.DashboardRollup
+    totals = dict(db.query(rollup.metric, rollup.value).filter(rollup.ref_id == 0))
+
+    top_products = db.query(models.Product.name, rollup.value).join(
+        models.Product, models.Product.id == rollup.ref_id
+    ).filter(rollup.metric == PRODUCT_QUANTITY, rollup.value > 0).order_by(rollup.value.desc()).limit(top).all()
+
+    top_tailors = db.query(models.Tailor.name, rollup.value).join(
+        models.Tailor, models.Tailor.id == rollup.ref_id
+    ).filter(rollup.metric == TAILOR_ORDERS, rollup.value > 0).order_by(rollup.value.desc()).limit(top).all()
+
+    material_issued = totals.get(MATERIAL_ISSUED, 0.0)
+    material_work_done = totals.get(MATERIAL_WORK_DONE, 0.0)
+    return {
+        "active_orders": int(totals.get(status_metric("Pending"), 0) + totals.get(status_metric("In Progress"), 0)),
+        "material_issued": material_issued,
+        "material_work_done": material_work_done,
+        "material_work_pending": material_issued - material_work_done,
+        "top_products": [{"name": name, "quantity": int(value)} for name, value in top_products],
+        "top_tailors": [{"name": name, "order_count": int(value)} for name, value in top_tailors],
+    }
+
+def _daily_filters(date_from, date_to, school_id, tailor_id, by_school=True):
+    daily = models.DashboardDaily
+    filters = []
+    if date_from is not None:
+        filters.append(daily.day >= date_from)
+    if date_to is not None:
+        filters.append(daily.day <= date_to)
+    if tailor_id is not None:
+        filters.append(daily.tailor_id == tailor_id)
+    if school_id is not None and by_school:
+        filters.append(daily.school_id == school_id)
+    return filters
+
+def _read_windowed_stats(db: Session, top, date_from, date_to, school_id, tailor_id) -> dict:
+    """
+    Figures for orders created (and deliveries made) between date_from and date_to, both
+    inclusive. Order counts ignore school_id: an order may span several schools.
+    """
+    daily = models.DashboardDaily
+    line_filters = _daily_filters(date_from, date_to, school_id, tailor_id)
+    order_filters = _daily_filters(date_from, date_to, school_id, tailor_id, by_school=False)
+
+    issued, done = db.query(
+        func.coalesce(func.sum(daily.material_issued), 0.0),
+        func.coalesce(func.sum(daily.material_work_done), 0.0)
+    ).filter(*line_filters).one()
+    active = db.query(func.coalesce(func.sum(daily.orders_active), 0)).filter(*order_filters).scalar()
+
+    product_quantity = func.sum(daily.quantity_ordered)
+    top_products = db.query(models.Product.name, product_quantity).join(
+        models.Product, models.Product.id == daily.product_id
+    ).filter(*line_filters).group_by(models.Product.id).having(product_quantity > 0).order_by(
+        product_quantity.desc()
+    ).limit(top).all()
+
+    tailor_orders = func.sum(daily.orders_created)
+    top_tailors = db.query(models.Tailor.name, tailor_orders).join(
+        models.Tailor, models.Tailor.id == daily.tailor_id
+    ).filter(*order_filters).group_by(models.Tailor.id).having(tailor_orders > 0).order_by(
+        tailor_orders.desc()
+    ).limit(top).all()
+
+    return {
+        "active_orders": int(active),
+        "material_issued": issued,
+        "material_work_done": done,
+        "material_work_pending": issued - done,
+        "top_products": [{"name": name, "quantity": int(value)} for name, value in top_products],
+        "top_tailors": [{"name": name, "order_count": int(value)} for name, value in top_tailors],
+    }
+
+# SQLite date modifiers mapping a day to the first day of its period (weeks start on Monday)
+SERIES_PERIODS = {
+    "day": (),
+    "week": ("-6 days", "weekday 1"),
+    "month": ("start of month",),
+}
+
+def read_dashboard_series(db: Session, granularity: str = "day", date_from: Optional[date] = None,
+                          date_to: Optional[date] = None, school_id: Optional[int] = None,
+                          tailor_id: Optional[int] = None) -> list:
+    """
+    Material issued, material work done and pieces delivered per day, week or month,
+    summed from the daily rows in one grouped query. Periods without activity are omitted.
+    Raises ValueError for an unknown granularity.
+    """
+    if granularity not in SERIES_PERIODS:
+        raise ValueError(f"Unknown granularity '{granularity}'. Use one of: {', '.join(SERIES_PERIODS)}")
+    daily = models.DashboardDaily
+    period = func.date(daily.day, *SERIES_PERIODS[granularity], type_=Date)
+    rows = db.query(
+        period, func.sum(daily.material_issued), func.sum(daily.material_work_done), func.sum(daily.pieces_delivered)
+    ).filter(*_daily_filters(date_from, date_to, school_id, tailor_id)).group_by(period).order_by(period)
+    return [
+        {"period": day, "material_issued": issued or 0.0, "material_work_done": done or 0.0,
+         "pieces_delivered": int(pieces or 0)}
+        for day, issued, done, pieces in rows
+        if issued or done or pieces
+    ]
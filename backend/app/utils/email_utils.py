@@ -1,37 +1,48 @@
-from typing import Dict, List, Any
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import Callable, Dict, Iterable, List, Any, Optional, Tuple
 import logging
+import os
+import smtplib
+import threading
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.orm import Session
+from .. import models
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def send_order_email(tailor_email: str, order_details: Dict[str, Any]):
-    """
-    Simulates sending an email to the tailor with order details.
-    
-    Args:
-        tailor_email: The recipient's email address.
-        order_details: A dictionary containing order information.
-    """
-    if not tailor_email:
-        logger.warning("No email address provided for tailor. Skipping email.")
-        return
+# SMTP relay; without SMTP_HOST emails are only logged (local development)
+SMTP_HOST = os.environ.get("SMTP_HOST", "")
+SMTP_PORT = int(os.environ.get("SMTP_PORT") or 25)
+SMTP_USER = os.environ.get("SMTP_USER", "")
+SMTP_PASSWORD = os.environ.get("SMTP_PASSWORD", "")
+SMTP_STARTTLS = os.environ.get("SMTP_STARTTLS", "").lower() in ("1", "true", "yes")
+SMTP_TIMEOUT_SECONDS = 30
+EMAIL_FROM = os.environ.get("EMAIL_FROM", "Tailor Tally <no-reply@tailortally.local>")
 
-    subject = f"New Order Received: #{order_details.get('id')}"
-    
-    # Format the email body
-    body_lines = [
-        f"Dear {order_details.get('tailor_name', 'Tailor')},",
-        "",
-        f"You have received a new order (ID: {order_details.get('id')}).",
-        f"Date: {order_details.get('created_at')}",
-        "",
-        "Order Items:",
-    ]
-    
+# Outbox worker: batches share one SMTP connection; failed sends are retried after
+# OUTBOX_RETRY_BASE_SECONDS, doubling per attempt up to OUTBOX_RETRY_MAX_SECONDS
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_POLL_SECONDS = float(os.environ.get("OUTBOX_POLL_SECONDS") or 5)
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_RETRY_BASE_SECONDS = 30
+OUTBOX_RETRY_MAX_SECONDS = 60 * 60
+# A claimed email not marked sent or failed within this time (worker crash) is retried
+OUTBOX_CLAIM_SECONDS = 5 * 60
+OUTBOX_KEEP_SENT_DAYS = 30
+# Tailors in digest mode get their day's new orders in one email at this hour (UTC)
+EMAIL_DIGEST_HOUR_UTC = int(os.environ.get("EMAIL_DIGEST_HOUR_UTC") or 18)
+
+ORDER_EMAIL = "order"
+ORDER_DIGEST_EMAIL = "order_digest"
+
+def _order_item_lines(order_details: Dict[str, Any]) -> List[str]:
+    """One "- product (size): qty ..." line per order line, then the notes if any."""
+    body_lines = []
     for line in order_details.get('order_lines', []):
         try:
-            # Handle both object and dict access for flexibility if schema dumping varies
-             # (Assuming Pydantic model dump or dict access)
             product = line.get('product_name', 'Unknown Product')
             size = line.get('size_label', 'Unknown Size')
             qty = line.get('quantity', 0)
@@ -48,20 +59,301 @@ def send_order_email(tailor_email: str, order_details: Dict[str, Any]):
     if order_details.get('notes'):
         body_lines.append("")
         body_lines.append(f"Notes: {order_details.get('notes')}")
-        
-    body_lines.append("")
-    body_lines.append("Please log in to your dashboard for more details.")
-    body_lines.append("Best regards,")
-    body_lines.append("Tailor Tally Team")
-    
-    email_body = "\n".join(body_lines)
-    
-    # Simulate sending
-    print("="*60)
-    print(f"SENDING EMAIL TO: {tailor_email}")
-    print(f"SUBJECT: {subject}")
-    print("-" * 60)
-    print(email_body)
-    print("="*60)
-    
-    logger.info(f"Email simulated to {tailor_email} for Order #{order_details.get('id')}")
+    return body_lines
+
+_SIGN_OFF = [
+    "",
+    "Please log in to your dashboard for more details.",
+    "Best regards,",
+    "Tailor Tally Team",
+]
+
+def render_order_email(order_details: Dict[str, Any]) -> Tuple[str, str]:
+    """
+    Subject and body of the new-order email sent to the tailor.
+
+    Args:
+        order_details: A dictionary containing order information.
+    """
+    subject = f"New Order Received: #{order_details.get('id')}"
+
+    # Format the email body
+    body_lines = [
+        f"Dear {order_details.get('tailor_name', 'Tailor')},",
+        "",
+        f"You have received a new order (ID: {order_details.get('id')}).",
+        f"Date: {order_details.get('created_at')}",
+        "",
+        "Order Items:",
+    ]
+    body_lines += _order_item_lines(order_details)
+    body_lines += _SIGN_OFF
+
+    return subject, "\n".join(body_lines)
+
+def render_order_digest_email(orders: List[Dict[str, Any]]) -> Tuple[str, str]:
+    """Subject and body of the digest listing a tailor's new orders, in the given order."""
+    count = f"{len(orders)} new order{'s' if len(orders) != 1 else ''}"
+    subject = f"New Orders Received: {count}"
+    body_lines = [
+        f"Dear {orders[0].get('tailor_name') or 'Tailor'},",
+        "",
+        f"You have received {count}:",
+    ]
+    for order in orders:
+        body_lines.append("")
+        body_lines.append(f"Order #{order.get('id')} ({order.get('created_at')})")
+        body_lines += _order_item_lines(order)
+    body_lines += _SIGN_OFF
+
+    return subject, "\n".join(body_lines)
+
+def load_order_email_details(db: Session, order_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+    """
+    Everything render_order_email needs for the given orders, from one query over the
+    lines joined to their order, tailor, product, size and school.
+    Orders that no longer exist are absent from the result.
+    """
+    order_ids = set(order_ids)
+    if not order_ids:
+        return {}
+    rows = db.query(
+        models.Order.id, models.Order.created_at, models.Order.notes, models.Tailor.name,
+        models.Product.name, models.Size.label, models.School.name,
+        models.OrderLine.quantity, models.OrderLine.total_material_req, models.OrderLine.unit
+    ).select_from(models.Order).outerjoin(
+        models.Tailor, models.Tailor.id == models.Order.tailor_id
+    ).outerjoin(
+        models.OrderLine, models.OrderLine.order_id == models.Order.id
+    ).outerjoin(
+        models.Product, models.Product.id == models.OrderLine.product_id
+    ).outerjoin(
+        models.Size, models.Size.id == models.OrderLine.size_id
+    ).outerjoin(
+        models.School, models.School.id == models.OrderLine.school_id
+    ).filter(models.Order.id.in_(order_ids)).order_by(models.Order.id, models.OrderLine.id).all()
+
+    details = {}
+    for order_id, created_at, notes, tailor_name, product, size, school, quantity, material, unit in rows:
+        order = details.setdefault(order_id, {
+            "id": order_id, "created_at": created_at, "notes": notes,
+            "tailor_name": tailor_name, "order_lines": [],
+        })
+        if quantity is not None:
+            order["order_lines"].append({
+                "product_name": product, "size_label": size, "school_name": school,
+                "quantity": quantity, "total_material_req": material, "unit": unit,
+            })
+    return details
+
+# --- Outbox ---
+
+_outbox_wakeup = threading.Event()
+
+def next_digest_time(after: datetime) -> datetime:
+    """The first EMAIL_DIGEST_HOUR_UTC o'clock after `after` (naive UTC)."""
+    send_at = after.replace(hour=EMAIL_DIGEST_HOUR_UTC, minute=0, second=0, microsecond=0)
+    return send_at if send_at > after else send_at + timedelta(days=1)
+
+def queue_order_email(db: Session, order_id: int, tailor: models.Tailor):
+    """
+    Queues the new-order email for the outbox worker. Does not commit: call it inside
+    the order's transaction so the email exists exactly when the order does.
+    For a tailor in digest mode the row waits for the next digest time, when it is sent
+    in one email with the tailor's other new orders.
+    """
+    if tailor.email_digest:
+        db.add(models.EmailOutbox(
+            kind=ORDER_DIGEST_EMAIL, recipient=tailor.email, order_id=order_id, tailor_id=tailor.id,
+            next_attempt_at=next_digest_time(datetime.utcnow())
+        ))
+    else:
+        db.add(models.EmailOutbox(kind=ORDER_EMAIL, recipient=tailor.email, order_id=order_id, tailor_id=tailor.id))
+
+def wake_outbox_worker():
+    """Asks the worker to look at the outbox now instead of at its next poll (call after commit)."""
+    _outbox_wakeup.set()
+
+class LoggingSMTP:
+    """Stands in for the SMTP connection when no SMTP_HOST is configured."""
+
+    def send_message(self, message: EmailMessage):
+        logger.info(f"Email (not sent, no SMTP_HOST) to {message['To']}: {message['Subject']}\n{message.get_content()}")
+
+@contextmanager
+def smtp_connection():
+    """One SMTP session (or a LoggingSMTP without SMTP_HOST), closed on exit."""
+    if not SMTP_HOST:
+        yield LoggingSMTP()
+        return
+    with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT_SECONDS) as smtp:
+        if SMTP_STARTTLS:
+            smtp.starttls()
+        if SMTP_USER:
+            smtp.login(SMTP_USER, SMTP_PASSWORD)
+        yield smtp
+
+def _build_message(email: models.EmailOutbox) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = EMAIL_FROM
+    message["To"] = email.recipient
+    message["Subject"] = email.subject
+    message.set_content(email.body)
+    return message
+
+def _retry_later(email: models.EmailOutbox, error: Exception, now: datetime):
+    email.attempts += 1
+    email.last_error = str(error)[:500]
+    if email.attempts >= OUTBOX_MAX_ATTEMPTS:
+        email.status = "failed"
+        logger.error(f"Giving up on email {email.id} to {email.recipient} after {email.attempts} attempts: {error}")
+        return
+    delay = min(OUTBOX_RETRY_BASE_SECONDS * 2 ** (email.attempts - 1), OUTBOX_RETRY_MAX_SECONDS)
+    email.next_attempt_at = now + timedelta(seconds=delay)
+    logger.warning(f"Email {email.id} to {email.recipient} failed ({error}), retrying in {delay}s")
+
+def claim_due_emails(db: Session, now: datetime, limit: int = OUTBOX_BATCH_SIZE) -> List[int]:
+    """
+    Claims up to `limit` due emails, and every due digest row of up to `limit` tailors,
+    by pushing their next attempt past the send. Commits, so another worker process
+    does not pick them up too.
+    """
+    outbox = models.EmailOutbox.__table__
+    due = (outbox.c.status == "pending", outbox.c.next_attempt_at <= now)
+    single = select(outbox.c.id).where(*due, outbox.c.kind != ORDER_DIGEST_EMAIL).order_by(
+        outbox.c.next_attempt_at, outbox.c.id
+    ).limit(limit)
+    # A tailor's digest rows are claimed together, so one email covers all of them
+    digest_tailors = select(outbox.c.tailor_id).where(*due, outbox.c.kind == ORDER_DIGEST_EMAIL).distinct().limit(limit)
+    claimed = db.execute(
+        update(outbox).where(*due, or_(
+            outbox.c.id.in_(single.scalar_subquery()),
+            and_(outbox.c.kind == ORDER_DIGEST_EMAIL, outbox.c.tailor_id.in_(digest_tailors.scalar_subquery()))
+        ))
+        .values(next_attempt_at=now + timedelta(seconds=OUTBOX_CLAIM_SECONDS))
+        .returning(outbox.c.id)
+    ).scalars().all()
+    db.commit()
+    return sorted(claimed)
+
+def _group_messages(emails: List[models.EmailOutbox]) -> List[List[models.EmailOutbox]]:
+    """Outbox rows per email to send: one each, except digest rows, grouped per tailor and recipient."""
+    messages, digests = [], {}
+    for email in emails:
+        if email.kind == ORDER_DIGEST_EMAIL:
+            digests.setdefault((email.tailor_id, email.recipient), []).append(email)
+        else:
+            messages.append([email])
+    return messages + list(digests.values())
+
+def deliver_outbox_batch(db: Session, connect: Callable = None, limit: int = OUTBOX_BATCH_SIZE,
+                         now: Optional[datetime] = None) -> int:
+    """
+    Sends one batch of due emails over a single SMTP connection and records the outcome.
+    The orders of the whole batch are read with one query (load_order_email_details).
+    A refused message is retried on its own; a connection failure retries the rest of
+    the batch. Returns the number of emails sent.
+    """
+    now = now or datetime.utcnow()
+    ids = claim_due_emails(db, now, limit)
+    if not ids:
+        return 0
+    emails = db.query(models.EmailOutbox).filter(models.EmailOutbox.id.in_(ids)).order_by(models.EmailOutbox.id).all()
+    orders = load_order_email_details(db, (e.order_id for e in emails if e.order_id))
+
+    sent, done = 0, set()
+    try:
+        with (connect or smtp_connection)() as smtp:
+            for message_emails in _group_messages(emails):
+                for email in message_emails:
+                    if email.order_id not in orders:
+                        email.status = "failed"
+                        email.last_error = "Order no longer exists"
+                        done.add(email.id)
+                message_emails = [email for email in message_emails if email.id not in done]
+                if not message_emails:
+                    continue
+
+                if message_emails[0].kind == ORDER_DIGEST_EMAIL:
+                    subject, body = render_order_digest_email([orders[e.order_id] for e in message_emails])
+                else:
+                    subject, body = render_order_email(orders[message_emails[0].order_id])
+                for email in message_emails:
+                    email.subject, email.body = subject, body
+                try:
+                    smtp.send_message(_build_message(message_emails[0]))
+                except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+                    for email in message_emails:
+                        _retry_later(email, e, now)
+                        done.add(email.id)
+                    continue
+                sent_at = datetime.utcnow()
+                for email in message_emails:
+                    email.status = "sent"
+                    email.sent_at = sent_at
+                    done.add(email.id)
+                sent += 1
+    except (OSError, smtplib.SMTPException) as e:
+        for email in emails:
+            if email.id not in done:
+                _retry_later(email, e, now)
+    db.commit()
+    return sent
+
+def purge_sent_emails(db: Session, now: Optional[datetime] = None) -> int:
+    """Deletes sent emails older than OUTBOX_KEEP_SENT_DAYS."""
+    cutoff = (now or datetime.utcnow()) - timedelta(days=OUTBOX_KEEP_SENT_DAYS)
+    deleted = db.query(models.EmailOutbox).filter(
+        models.EmailOutbox.status == "sent", models.EmailOutbox.sent_at < cutoff
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+class OutboxWorker:
+    """
+    Background thread draining the outbox: a batch at a time while there is a backlog,
+    otherwise every OUTBOX_POLL_SECONDS or as soon as wake_outbox_worker() is called.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session], connect: Callable = None,
+                 poll_seconds: float = OUTBOX_POLL_SECONDS):
+        self.session_factory = session_factory
+        self.connect = connect
+        self.poll_seconds = poll_seconds
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_purge = None
+
+    def run_once(self) -> int:
+        db = self.session_factory()
+        try:
+            now = datetime.utcnow()
+            if self._last_purge is None or now - self._last_purge > timedelta(hours=1):
+                purge_sent_emails(db, now)
+                self._last_purge = now
+            return deliver_outbox_batch(db, self.connect, now=now)
+        finally:
+            db.close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                sent = self.run_once()
+            except Exception:
+                logger.exception("Outbox worker failed; retrying at the next poll")
+                sent = 0
+            if sent < OUTBOX_BATCH_SIZE:
+                _outbox_wakeup.wait(self.poll_seconds)
+                _outbox_wakeup.clear()
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="email-outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        self._stop.set()
+        _outbox_wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
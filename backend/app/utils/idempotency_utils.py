@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+from typing import Any, Optional
+import hashlib
+import json
+from fastapi import HTTPException, Response
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from .. import models
+
+# Keys are remembered for a day: long enough for any client retry
+IDEMPOTENCY_KEY_TTL_HOURS = 24
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+def request_fingerprint(method: str, path: str, payload: Any) -> str:
+    """Hash of what the request asks for, to tell a replay from a different request reusing its key."""
+    raw = json.dumps([method, path, payload], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def _check_key(key: str):
+    if not key or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1-{IDEMPOTENCY_KEY_MAX_LENGTH} characters")
+
+def replay_response(db: Session, key: str, fingerprint: str, now: Optional[datetime] = None) -> Optional[Response]:
+    """
+    The stored response of an earlier request with this Idempotency-Key, or None when the
+    key is new (or expired). Raises 422 if the key was used for a different request.
+    """
+    _check_key(key)
+    now = now or datetime.utcnow()
+    stored = db.get(models.IdempotencyKey, key)
+    if stored is None or stored.created_at < now - timedelta(hours=IDEMPOTENCY_KEY_TTL_HOURS):
+        return None
+    if stored.request_hash != fingerprint:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+    return Response(
+        content=stored.response_body, status_code=stored.status_code, media_type="application/json",
+        headers={"Idempotent-Replayed": "true"}
+    )
+
+def remember_response(db: Session, key: str, fingerprint: str, body: bytes, status_code: int = 200,
+                      now: Optional[datetime] = None):
+    """
+    Stores the response for the key. Does not commit: call it before the write's commit,
+    so the key exists exactly when the write does. Expired keys are dropped on the way.
+    """
+    now = now or datetime.utcnow()
+    # An expired key being reused, plus any other expired ones (indexed range delete)
+    db.query(models.IdempotencyKey).filter(
+        models.IdempotencyKey.created_at < now - timedelta(hours=IDEMPOTENCY_KEY_TTL_HOURS)
+    ).delete(synchronize_session=False)
+    db.add(models.IdempotencyKey(
+        key=key, request_hash=fingerprint, status_code=status_code, response_body=body.decode("utf-8"),
+        created_at=now
+    ))
+
+def commit_or_replay(db: Session, key: str, fingerprint: str) -> Optional[Response]:
+    """
+    Commits the write and its key. If a concurrent request with the same key committed
+    first, rolls this one back and returns that request's response instead.
+    """
+    try:
+        db.commit()
+        return None
+    except IntegrityError:
+        db.rollback()
+        replay = replay_response(db, key, fingerprint)
+        if replay is None:
+            raise
+        return replay
@@ -0,0 +1,189 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import json
+import os
+import threading
+import time
+import uuid
+from sqlalchemy.orm import Session
+from .. import models
+from ..database import SessionLocal
+from .import_utils import process_master_data_file
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ImportCancelled(Exception):
+    pass
+
+# One worker: catalog imports write the same tables, so they run one after another
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="master-data-import")
+
+# Job state lives in the import_jobs table, so any server worker can report or cancel a job;
+# the import itself runs in the process that accepted the upload.
+# Finished jobs are deleted after JOB_TTL_SECONDS
+JOB_TTL_SECONDS = 60 * 60
+# An unfinished job not updated for this long is reported as failed: the worker running it
+# died. The import bumps updated_at after each batch, for itself and this process's queue
+JOB_STALE_SECONDS = 10 * 60
+MAX_JOB_ERRORS = 100
+INTERRUPTED_ERROR = "The server restarted before the import finished. Please upload the file again."
+STALE_ERROR = "The import stopped responding. Please upload the file again."
+# This process's running jobs, for wait_for_import_job
+_futures: Dict[str, Tuple[float, Future]] = {}
+_futures_lock = threading.Lock()
+
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+def _snapshot(job: models.ImportJob) -> dict:
+    status, error = job.status, job.error
+    last_update = job.updated_at or job.created_at
+    if status not in FINISHED_STATUSES and last_update < datetime.utcnow() - timedelta(seconds=JOB_STALE_SECONDS):
+        status, error = "failed", STALE_ERROR
+    return {
+        "job_id": job.id,
+        "filename": job.filename,
+        "status": status,
+        "rows_processed": job.rows_processed,
+        "stats": json.loads(job.stats),
+        "errors": json.loads(job.errors),
+        "error": error,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+    }
+
+def submit_master_data_import(path: str, filename: str, db: Session) -> dict:
+    """
+    Records an import of the file at `path` (removed once the job ends) and queues it on
+    the import worker. The job opens its own sessions on db's bind, as db is closed by then.
+    """
+    now = datetime.utcnow()
+    db.query(models.ImportJob).filter(
+        models.ImportJob.finished_at < now - timedelta(seconds=JOB_TTL_SECONDS)
+    ).delete(synchronize_session=False)
+    job = models.ImportJob(
+        id=uuid.uuid4().hex, filename=filename, status="queued", rows_processed=0,
+        stats="{}", errors="[]", created_at=now, updated_at=now
+    )
+    db.add(job)
+    db.commit()
+    snapshot = _snapshot(job)
+
+    with _futures_lock:
+        submitted = time.monotonic()
+        for key in [k for k, (at, f) in _futures.items() if f.done() and submitted - at > JOB_TTL_SECONDS]:
+            del _futures[key]
+        _futures[job.id] = (submitted, _executor.submit(_run_import, job.id, path, db.get_bind()))
+    return snapshot
+
+def get_import_job(db: Session, job_id: str) -> Optional[dict]:
+    job = db.get(models.ImportJob, job_id)
+    return _snapshot(job) if job else None
+
+def cancel_import_job(db: Session, job_id: str) -> Optional[dict]:
+    """
+    Asks a job to stop. A queued job never starts; a running one stops after the batch it
+    is reading, before anything is written. Finished jobs are returned unchanged.
+    """
+    job = db.get(models.ImportJob, job_id)
+    if job is None:
+        return None
+    if _snapshot(job)["status"] not in FINISHED_STATUSES:
+        job.cancel_requested = True
+        db.commit()
+    return _snapshot(job)
+
+def _pending_job_ids() -> List[str]:
+    with _futures_lock:
+        return [job_id for job_id, (_, future) in _futures.items() if not future.done()]
+
+def fail_interrupted_import_jobs(db: Session) -> int:
+    """
+    Marks queued or running jobs that this process is not running as failed, and returns
+    how many. Called at server startup: those imports died with the process before it.
+    Assumes one server process (see Dockerfile): with several, a restarting worker would
+    also fail the jobs the others are running.
+    """
+    now = datetime.utcnow()
+    count = db.query(models.ImportJob).filter(
+        models.ImportJob.status.in_(("queued", "running")),
+        models.ImportJob.id.notin_(_pending_job_ids()),
+    ).update(
+        {"status": "failed", "error": INTERRUPTED_ERROR, "updated_at": now, "finished_at": now},
+        synchronize_session=False,
+    )
+    db.commit()
+    if count:
+        logger.warning(f"Marked {count} interrupted import job(s) as failed")
+    return count
+
+def wait_for_import_job(job_id: str, timeout: Optional[float] = None) -> Optional[dict]:
+    """
+    Blocks until a job submitted by this process has finished (for scripts and tests)
+    and returns its final state.
+    """
+    with _futures_lock:
+        _, future = _futures.get(job_id, (None, None))
+    if future is None:
+        return None
+    return future.result(timeout=timeout)
+
+def _finish(jobs_db: Session, job: models.ImportJob, status: str, error: Optional[str] = None) -> dict:
+    job.status = status
+    job.error = error
+    job.finished_at = job.updated_at = datetime.utcnow()
+    jobs_db.commit()
+    return _snapshot(job)
+
+def _run_import(job_id: str, path: str, bind) -> dict:
+    # Progress is committed through its own session: the import's transaction stays apart
+    jobs_db = SessionLocal(bind=bind)
+    try:
+        job = jobs_db.get(models.ImportJob, job_id)
+        if job.cancel_requested:
+            return _finish(jobs_db, job, "cancelled")
+        job.status = "running"
+        job.updated_at = datetime.utcnow()
+        jobs_db.commit()
+
+        errors = []
+
+        def on_batch(rows_read, stats, skipped_rows):
+            room = MAX_JOB_ERRORS - len(errors)
+            errors.extend(f"Row {row}: Invalid length required. Skipped." for row in skipped_rows[:max(room, 0)])
+            job.rows_processed = rows_read
+            job.stats = json.dumps(stats)
+            job.errors = json.dumps(errors)
+            job.updated_at = datetime.utcnow()
+            # Jobs queued behind this one are alive too
+            jobs_db.query(models.ImportJob).filter(
+                models.ImportJob.id.in_(_pending_job_ids()), models.ImportJob.status == "queued"
+            ).update({"updated_at": job.updated_at}, synchronize_session=False)
+            jobs_db.commit()
+            # Reloaded after the commit, so a cancel sent to any worker is seen
+            if job.cancel_requested:
+                raise ImportCancelled()
+
+        db = SessionLocal(bind=bind)
+        try:
+            with open(path, 'rb') as f:
+                stats = process_master_data_file(f, db, job.filename, on_batch=on_batch)
+            job.stats = json.dumps(stats)
+            return _finish(jobs_db, job, "completed")
+        except ImportCancelled:
+            logger.info(f"Import job {job_id} cancelled")
+            return _finish(jobs_db, job, "cancelled")
+        except ValueError as e:
+            return _finish(jobs_db, job, "failed", str(e))
+        except Exception as e:
+            logger.exception(f"Import job {job_id} failed")
+            return _finish(jobs_db, job, "failed", f"Internal Server Error: {str(e)}")
+        finally:
+            db.close()
+    finally:
+        jobs_db.close()
+        try:
+            os.remove(path)
+        except OSError:
+            pass
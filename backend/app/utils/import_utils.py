@@ -1,178 +1,750 @@
 import pandas as pd
+from openpyxl import load_workbook
+from datetime import datetime, timedelta
+from typing import List, Optional
+import json
+import uuid
+from pydantic import ValidationError
+from sqlalchemy import bindparam
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from .. import models
+from .. import models, schemas
+from .catalog_utils import bump_catalog_version, get_catalog_version
+from .dashboard_utils import (
+    add_line_deltas, add_new_order_daily_deltas, add_order_deltas, apply_daily_deltas, apply_rollup_deltas
+)
+from .rule_utils import get_rule_index
 import logging
 
 logger = logging.getLogger(__name__)
 
-def process_master_data_file(file_obj, db: Session, filename: str):
-    logger.info(f"Processing file: {filename}")
-    
-    # Read the file initially with no header processing to inspect rows
-    if filename.endswith('.csv'):
-        # using header=None to read everything as data first
-        df_raw = pd.read_csv(file_obj, header=None)
-    elif filename.endswith(('.xls', '.xlsx')):
-        df_raw = pd.read_excel(file_obj, header=None)
-    else:
-        raise ValueError("Unsupported file format. Please use .csv or .xlsx")
+# Rows per batch when streaming an upload; bounds memory regardless of file size
+IMPORT_CHUNK_SIZE = 5000
+
+def _iter_csv_chunks(file_obj, chunk_size: int):
+    # dtype=str keeps cells as text (like a header=None read of the whole file would)
+    # so numbers are parsed later, in one place
+    yield from pd.read_csv(file_obj, header=None, dtype=str, chunksize=chunk_size)
+
+def _excel_cell(value):
+    # Same conversions pandas.read_excel does: empty -> NaN, 24.0 -> 24
+    if value is None:
+        return float('nan')
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
 
-    # Expected columns validation
-    expected_cols = [
-        'Product Name', 'Category', 'Size Label', 'Size Order Index', 
-        'Fabric Width (Inches)', 'Length Required', 'Unit'
-    ]
+def _iter_xlsx_chunks(file_obj, chunk_size: int):
+    # Read-only mode streams the sheet XML instead of building the whole workbook
+    workbook = load_workbook(file_obj, read_only=True, data_only=True)
+    try:
+        start, batch = 0, []
+        for row in workbook.worksheets[0].iter_rows(values_only=True):
+            batch.append([_excel_cell(v) for v in row])
+            if len(batch) >= chunk_size:
+                yield pd.DataFrame(batch, index=range(start, start + len(batch)), dtype=object)
+                start, batch = start + len(batch), []
+        if batch:
+            yield pd.DataFrame(batch, index=range(start, start + len(batch)), dtype=object)
+    finally:
+        workbook.close()
+
+def _find_header_row(df_raw: pd.DataFrame, expected_cols) -> int:
     expected_cols_lower = [c.lower() for c in expected_cols]
+    required_matches = min(4, len(expected_cols))
 
     # Search for the header row in the first 10 rows
-    header_row_index = None
     for i in range(min(10, len(df_raw))):
         # Get values of the row as strings, stripped, lowercased
         row_values = [str(x).strip().lower() for x in df_raw.iloc[i].values]
-        # Check if this row contains 'product name' and 'size label' (strong indicators)
-        # or most of the expected columns. Let's look for a subset match.
-        matches = sum(1 for col in expected_cols_lower if col in row_values)
-        
         # If we match at least 4 of the expected columns, assume this is the header
-        if matches >= 4:
-            header_row_index = i
-            break
-    
-    if header_row_index is not None:
-        # Re-read or slice the dataframe
-        # Slicing is faster since we already have it
-        df = df_raw.iloc[header_row_index + 1:].copy()
-        df.columns = df_raw.iloc[header_row_index].values
+        if sum(1 for col in expected_cols_lower if col in row_values) >= required_matches:
+            return i
+
+    # Fall back to the first row; validation below will report what is missing
+    return 0
+
+def iter_tabular_file(file_obj, filename: str, expected_cols, optional_cols=(), chunk_size: int = IMPORT_CHUNK_SIZE):
+    """
+    Streams a CSV/Excel upload as DataFrames of at most chunk_size rows, with columns named
+    exactly as expected_cols / optional_cols (matched case-insensitively; other columns dropped).
+    The header row may be any of the first 10 rows and is sniffed from those rows only.
+    Raises ValueError on unsupported formats or missing columns, before yielding anything.
+    Each index is the 0-based position in the file, so index + 1 is the sheet row.
+    """
+    if filename.endswith('.csv'):
+        raw_chunks = _iter_csv_chunks(file_obj, chunk_size)
+    elif filename.endswith('.xlsx'):
+        raw_chunks = _iter_xlsx_chunks(file_obj, chunk_size)
+    elif filename.endswith('.xls'):
+        # Legacy format: no streaming reader, so it is read whole and sliced
+        df_raw = pd.read_excel(file_obj, header=None)
+        raw_chunks = (df_raw.iloc[i:i + chunk_size] for i in range(0, len(df_raw), chunk_size))
     else:
-        # Fallback to assuming first row was header (or re-read if we used header=None)
-        # Since we read with header=None, row 0 is the "header" if check failed,
-        # but the check failed so we proceed to standard validation which will fail and show the error.
-        df = df_raw.iloc[1:].copy()
-        df.columns = df_raw.iloc[0].values
-    
-    # Normalize headers
-    df.columns = [str(c).strip() for c in df.columns]
-
-    # Try to map columns case-insensitively
-    actual_cols_map = {c.lower(): c for c in df.columns}
-    
-    for expected in expected_cols:
-        if expected not in df.columns and expected.lower() in actual_cols_map:
-            # Rename the actual column to the expected one
-            df.rename(columns={actual_cols_map[expected.lower()]: expected}, inplace=True)
-    
-    missing_cols = [col for col in expected_cols if col not in df.columns]
-    
+        raise ValueError("Unsupported file format. Please use .csv or .xlsx")
+
+    # The header may sit in any of the first 10 rows, so buffer at least that many
+    head = []
+    while sum(len(c) for c in head) < 10:
+        chunk = next(raw_chunks, None)
+        if chunk is None:
+            break
+        head.append(chunk)
+    if not head or all(c.empty for c in head):
+        raise ValueError("The file is empty")
+    first = pd.concat(head) if len(head) > 1 else head[0]
+
+    header_row_index = _find_header_row(first, expected_cols)
+    header = [str(c).strip() for c in first.iloc[header_row_index].values]
+
+    # Map columns case-insensitively to their position in the sheet
+    positions = {}
+    for i, col in enumerate(header):
+        positions.setdefault(col, i)
+    positions_lower = {}
+    for i, col in enumerate(header):
+        positions_lower.setdefault(col.lower(), i)
+    wanted = {}
+    for expected in list(expected_cols) + list(optional_cols):
+        if expected in positions:
+            wanted[expected] = positions[expected]
+        elif expected.lower() in positions_lower:
+            wanted[expected] = positions_lower[expected.lower()]
+
+    missing_cols = [col for col in expected_cols if col not in wanted]
+
     if missing_cols:
-        # Check if it looks like the header is on the second row (common issue)
-        # e.g. if explicit columns like "run 1" or "unnamed: 0" are present
-        found_cols_str = ", ".join([str(c) for c in df.columns[:5]])  # Show first 5 to avoid clutter
-        if len(df.columns) > 5:
+        found_cols_str = ", ".join(header[:5])  # Show first 5 to avoid clutter
+        if len(header) > 5:
             found_cols_str += "..."
-            
+
         error_msg = f"Missing columns: {missing_cols}. Found columns: [{found_cols_str}]"
-        
+
         # Hint for the user
-        if any("unnamed" in str(c).lower() for c in df.columns):
+        if any("unnamed" in c.lower() for c in header):
             error_msg += ". It looks like the file might not have headers in the first row."
-            
+
         raise ValueError(error_msg)
 
-    # Counters
-    stats = {
-        "products_created": 0,
-        "products_updated": 0,
-        "sizes_created": 0,
-        "rules_created": 0,
-        "rules_updated": 0
-    }
+    def select(chunk: pd.DataFrame) -> pd.DataFrame:
+        # Ragged Excel rows can be shorter than the header: missing cells read as NaN
+        df = chunk.reindex(columns=list(wanted.values()))
+        df.columns = list(wanted)
+        return df
 
+    yield select(first.iloc[header_row_index + 1:])
+    for chunk in raw_chunks:
+        yield select(chunk)
+
+def read_tabular_file(file_obj, filename: str, expected_cols, optional_cols=()):
+    """
+    Reads a whole CSV/Excel upload into one DataFrame, see iter_tabular_file.
+    For imports that need every row at once (orders are grouped across the sheet).
+    """
+    return pd.concat(list(iter_tabular_file(file_obj, filename, expected_cols, optional_cols)))
+
+# Expected master data columns
+MASTER_DATA_COLUMNS = [
+    'Product Name', 'Category', 'Size Label', 'Size Order Index', 
+    'Fabric Width (Inches)', 'Length Required', 'Unit'
+]
+
+CATALOG_CHANGED_DURING_IMPORT = "The catalog changed during the import. Please upload the file again."
+
+def process_master_data_file(file_obj, db: Session, filename: str, chunk_size: int = IMPORT_CHUNK_SIZE, on_batch=None):
+    """
+    Imports a master data sheet in two steps. The file is read in batches of chunk_size
+    rows and diffed against the catalog with reads only; the net changeset is then written
+    with a few bulk statements in one short transaction, so the SQLite write lock is not
+    held while the file is parsed. If the catalog changed in the meantime, the import
+    fails with ValueError and writes nothing; any other error also leaves no changes.
+    on_batch(rows_read, stats, skipped_rows) is called after each batch; raising from it
+    aborts the import.
+    """
+    logger.info(f"Processing file: {filename}")
+
+    # 1. Parse and diff. Nothing is written, so one diff carries the state across batches
+    # and an error here has nothing to roll back
+    version = get_catalog_version(db)
+    diff = MasterDataDiff(db)
+    rows_read = 0
+    for df in iter_tabular_file(file_obj, filename, MASTER_DATA_COLUMNS, chunk_size=chunk_size):
+        rows = normalize_master_data(df)
+        diff.add_rows(rows)
+        rows_read += len(df)
+        if on_batch:
+            on_batch(rows_read, dict(diff.stats), [int(i) + 1 for i in df.index.difference(rows.index)])
+    changes = diff.changes()
+
+    # 2. Apply. The write takes the lock, so the catalog version read after it is current:
+    # anything but our own bump means another write landed after the diff was computed
     try:
-        for index, row in df.iterrows():
-            product_name = str(row['Product Name']).strip()
-            category = str(row['Category']).strip() if pd.notna(row['Category']) else 'General'
-            size_label = str(row['Size Label']).strip()
-            
-            # Size Index
-            try:
-                size_index = int(row['Size Order Index'])
-            except ValueError:
-                size_index = 0
-                
-            # Rule details
-            fabric_width = row['Fabric Width (Inches)']
-            fabric_width = int(fabric_width) if pd.notna(fabric_width) and str(fabric_width).strip() != '' else None
-            
-            try:
-                length_req = float(row['Length Required'])
-            except ValueError:
-                logger.warning(f"Row {index+2}: Invalid length required. Skipping.")
-                continue
-                
-            unit = str(row['Unit']).strip().lower() if pd.notna(row['Unit']) else 'meters'
-
-            # 1. Product
-            product = db.query(models.Product).filter(models.Product.name == product_name).first()
-            if not product:
-                product = models.Product(name=product_name, category=category)
-                db.add(product)
-                db.commit()
-                db.refresh(product)
+        apply_master_data_changes(changes, db, commit=False)
+        if any(changes[key] for key in MASTER_DATA_CHANGE_KEYS) and get_catalog_version(db) != version + 1:
+            raise ValueError(CATALOG_CHANGED_DURING_IMPORT)
+        db.commit()
+        return changes["stats"]
+
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error during import: {e}")
+        if isinstance(e, IntegrityError):
+            raise ValueError(CATALOG_CHANGED_DURING_IMPORT) from e
+        raise e
+
+def normalize_master_data(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Cleans the master data columns with vectorized ops.
+    Rows without a numeric Length Required are dropped with a warning;
+    a non-numeric Fabric Width raises ValueError listing the sheet rows.
+    """
+    rows = pd.DataFrame(index=df.index)
+    rows["product"] = df['Product Name'].astype(str).str.strip()
+    rows["category"] = df['Category'].where(df['Category'].notna(), 'General').astype(str).str.strip()
+    rows["size"] = df['Size Label'].astype(str).str.strip()
+    rows["order_index"] = pd.to_numeric(df['Size Order Index'], errors='coerce').fillna(0).astype(int)
+
+    width_raw = df['Fabric Width (Inches)']
+    width_blank = width_raw.isna() | (width_raw.astype(str).str.strip() == '')
+    width = pd.to_numeric(width_raw.where(~width_blank), errors='coerce')
+    bad_width = ~width_blank & width.isna()
+    if bad_width.any():
+        bad_rows = [int(i) + 1 for i in df.index[bad_width][:10]]
+        raise ValueError(f"Invalid Fabric Width (Inches) in rows: {bad_rows}")
+    # Keep as objects so a blank width stays None rather than NaN
+    rows["width"] = pd.Series([int(w) if pd.notna(w) else None for w in width], index=df.index, dtype=object)
+
+    # to_numeric only flags bad cells: its fast parser can be off by one ulp,
+    # so valid values go through astype(float) to compare equal to stored lengths
+    rows["length"] = pd.to_numeric(df['Length Required'], errors='coerce')
+    valid_length = rows["length"].notna()
+    rows.loc[valid_length, "length"] = df.loc[valid_length, 'Length Required'].astype(float)
+    rows["unit"] = df['Unit'].where(df['Unit'].notna(), 'meters').astype(str).str.strip().str.lower()
+
+    bad_length = ~valid_length
+    for i in df.index[bad_length]:
+        logger.warning(f"Row {int(i)+1}: Invalid length required. Skipping.")
+    return rows[~bad_length]
+
+class MasterDataDiff:
+    """
+    Computes the changes normalized sheet rows make to the catalog, without writing anything.
+    Rows can be fed in batches with add_rows: the existing products, sizes and rules for
+    products not seen yet are loaded into dicts keyed by name / (name, label) /
+    (name, label, width), and rows are replayed in file order so `stats` counts exactly
+    what a row-by-row import would. Memory grows with the catalog touched, not the file.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.stats = {
+            "products_created": 0,
+            "products_updated": 0,
+            "sizes_created": 0,
+            "rules_created": 0,
+            "rules_updated": 0
+        }
+        self.products = {}
+        self.sizes = {}
+        self.rules = {}
+
+    def _load(self, names):
+        products, sizes, rules = self.products, self.sizes, self.rules
+        names_by_id = {}
+        for id, name, category in self.db.query(models.Product.id, models.Product.name, models.Product.category).filter(
+            models.Product.name.in_(names)
+        ):
+            products[name] = {"id": id, "category": category, "original": category}
+            names_by_id[id] = name
+        if not names_by_id:
+            return
+
+        size_keys = {}
+        for id, product_id, label, order_index in self.db.query(
+            models.Size.id, models.Size.product_id, models.Size.label, models.Size.order_index
+        ).filter(models.Size.product_id.in_(names_by_id)).order_by(models.Size.id):
+            key = (names_by_id[product_id], label)
+            if key not in sizes:
+                sizes[key] = {"id": id, "order_index": order_index, "original": order_index}
+                size_keys[id] = key
+
+        for id, size_id, width, length, unit in self.db.query(
+            models.MaterialRule.id, models.MaterialRule.size_id, models.MaterialRule.fabric_width_inches,
+            models.MaterialRule.length_required, models.MaterialRule.unit
+        ).filter(models.MaterialRule.size_id.in_(size_keys)).order_by(models.MaterialRule.id):
+            rules.setdefault(size_keys[size_id] + (width,), {
+                "id": id, "length": length, "unit": unit, "original": (length, unit)
+            })
+
+    def add_rows(self, rows: pd.DataFrame) -> "MasterDataDiff":
+        products, sizes, rules, stats = self.products, self.sizes, self.rules, self.stats
+
+        # 1. Preload the existing catalog for products this batch introduces
+        unseen = set(rows["product"]) - set(products)
+        if unseen:
+            self._load(unseen)
+
+        # 2. Replay the rows against the in-memory catalog
+        for product_name, category, size_label, order_index, width, length, unit in rows[
+            ["product", "category", "size", "order_index", "width", "length", "unit"]
+        ].itertuples(index=False, name=None):
+            product = products.get(product_name)
+            if product is None:
+                products[product_name] = {"id": None, "category": category, "original": None}
                 stats["products_created"] += 1
-            else:
-                if product.category != category:
-                    product.category = category
-                    db.commit()
-                    stats["products_updated"] += 1
-
-            # 2. Size
-            size = db.query(models.Size).filter(
-                models.Size.product_id == product.id, 
-                models.Size.label == size_label
-            ).first()
-            
-            if not size:
-                size = models.Size(product_id=product.id, label=size_label, order_index=size_index)
-                db.add(size)
-                db.commit()
-                db.refresh(size)
+            elif product["category"] != category:
+                product["category"] = category
+                stats["products_updated"] += 1
+
+            size_key = (product_name, size_label)
+            size = sizes.get(size_key)
+            if size is None:
+                sizes[size_key] = {"id": None, "order_index": int(order_index), "original": None}
                 stats["sizes_created"] += 1
             else:
-                if size.order_index != size_index:
-                    size.order_index = size_index
-                    db.commit()
-
-            # 3. Material Rule
-            if fabric_width is None:
-                rule = db.query(models.MaterialRule).filter(
-                    models.MaterialRule.size_id == size.id,
-                    models.MaterialRule.fabric_width_inches.is_(None)
-                ).first()
-            else:
-                rule = db.query(models.MaterialRule).filter(
-                    models.MaterialRule.size_id == size.id,
-                    models.MaterialRule.fabric_width_inches == fabric_width
-                ).first()
-
-            if rule:
-                if rule.length_required != length_req or rule.unit != unit:
-                    rule.length_required = length_req
-                    rule.unit = unit
-                    db.commit()
-                    stats["rules_updated"] += 1
-            else:
-                rule = models.MaterialRule(
-                    size_id=size.id,
-                    fabric_width_inches=fabric_width,
-                    length_required=length_req,
-                    unit=unit
-                )
-                db.add(rule)
-                db.commit()
+                size["order_index"] = int(order_index)
+
+            rule_key = size_key + (width,)
+            rule = rules.get(rule_key)
+            if rule is None:
+                rules[rule_key] = {"id": None, "length": float(length), "unit": unit, "original": None}
                 stats["rules_created"] += 1
-                
-        return stats
+            elif rule["length"] != length or rule["unit"] != unit:
+                rule["length"] = float(length)
+                rule["unit"] = unit
+                stats["rules_updated"] += 1
+        return self
+
+    def changes(self) -> dict:
+        """Net changeset: only rows that are new or end up different from the database."""
+        products, sizes, rules = self.products, self.sizes, self.rules
+        return {
+            "stats": dict(self.stats),
+            "new_products": [
+                {"name": name, "category": p["category"]}
+                for name, p in products.items() if p["id"] is None
+            ],
+            "updated_products": [
+                {"id": p["id"], "product": name, "category": p["category"], "old_category": p["original"]}
+                for name, p in products.items() if p["id"] is not None and p["category"] != p["original"]
+            ],
+            "new_sizes": [
+                {"product": name, "product_id": products[name]["id"], "label": label, "order_index": s["order_index"]}
+                for (name, label), s in sizes.items() if s["id"] is None
+            ],
+            "updated_sizes": [
+                {"id": s["id"], "product": name, "label": label, "order_index": s["order_index"]}
+                for (name, label), s in sizes.items() if s["id"] is not None and s["order_index"] != s["original"]
+            ],
+            "new_rules": [
+                {"product": name, "product_id": products[name]["id"], "label": label, "size_id": sizes[(name, label)]["id"],
+                 "fabric_width_inches": width, "length_required": r["length"], "unit": r["unit"]}
+                for (name, label, width), r in rules.items() if r["id"] is None
+            ],
+            "updated_rules": [
+                {"id": r["id"], "product": name, "label": label, "fabric_width_inches": width,
+                 "length_required": r["length"], "unit": r["unit"],
+                 "old_length_required": r["original"][0], "old_unit": r["original"][1]}
+                for (name, label, width), r in rules.items()
+                if r["id"] is not None and (r["length"], r["unit"]) != r["original"]
+            ],
+        }
+
+MASTER_DATA_CHANGE_KEYS = (
+    "new_products", "updated_products", "new_sizes", "updated_sizes", "new_rules", "updated_rules"
+)
+
+def apply_master_data_changes(changes: dict, db: Session, commit: bool = True):
+    """
+    Writes a changeset from MasterDataDiff with a handful of bulk statements
+    (one per table and kind of change) and commits once, unless commit=False.
+    """
+    product_table = models.Product.__table__
+    size_table = models.Size.__table__
+    rule_table = models.MaterialRule.__table__
+
+    # 1. Products: new ones first, their ids are needed for the sizes
+    product_ids = {}
+    if changes["new_products"]:
+        returned = db.execute(
+            product_table.insert().returning(product_table.c.id, product_table.c.name),
+            [{"name": p["name"], "category": p["category"], "is_active": True} for p in changes["new_products"]]
+        ).all()
+        product_ids = {name: id for id, name in returned}
+    if changes["updated_products"]:
+        db.execute(
+            product_table.update().where(product_table.c.id == bindparam("b_id")),
+            [{"b_id": p["id"], "category": p["category"]} for p in changes["updated_products"]]
+        )
+
+    # 2. Sizes (product_id is None for products created above)
+    size_ids = {}
+    if changes["new_sizes"]:
+        returned = db.execute(
+            size_table.insert().returning(size_table.c.id, size_table.c.product_id, size_table.c.label),
+            [
+                {"product_id": s["product_id"] or product_ids[s["product"]], "label": s["label"],
+                 "order_index": s["order_index"], "is_active": True}
+                for s in changes["new_sizes"]
+            ]
+        ).all()
+        size_ids = {(product_id, label): id for id, product_id, label in returned}
+    if changes["updated_sizes"]:
+        db.execute(
+            size_table.update().where(size_table.c.id == bindparam("b_id")),
+            [{"b_id": s["id"], "order_index": s["order_index"]} for s in changes["updated_sizes"]]
+        )
+
+    # 3. Material Rules (size_id is None for sizes created above)
+    if changes["new_rules"]:
+        db.execute(rule_table.insert(), [
+            {"size_id": r["size_id"] or size_ids[(r["product_id"] or product_ids[r["product"]], r["label"])],
+             "fabric_width_inches": r["fabric_width_inches"],
+             "length_required": r["length_required"], "unit": r["unit"]}
+            for r in changes["new_rules"]
+        ])
+    if changes["updated_rules"]:
+        db.execute(
+            rule_table.update().where(rule_table.c.id == bindparam("b_id")),
+            [
+                {"b_id": r["id"], "length_required": r["length_required"], "unit": r["unit"]}
+                for r in changes["updated_rules"]
+            ]
+        )
+
+    if any(changes[key] for key in MASTER_DATA_CHANGE_KEYS):
+        bump_catalog_version(db)
+
+    if commit:
+        db.commit()
+
+def summarize_master_data_changes(changes: dict) -> dict:
+    """Compact preview of a changeset: totals plus a per-product breakdown."""
+    breakdown = {}
+
+    def entry(product):
+        return breakdown.setdefault(product, {
+            "created": False, "category_changed": False,
+            "sizes_created": 0, "sizes_updated": 0,
+            "rules_created": 0, "rules_updated": 0,
+            "length_changes": []
+        })
+
+    for p in changes["new_products"]:
+        entry(p["name"])["created"] = True
+    for p in changes["updated_products"]:
+        entry(p["product"])["category_changed"] = True
+    for size in changes["new_sizes"]:
+        entry(size["product"])["sizes_created"] += 1
+    for size in changes["updated_sizes"]:
+        entry(size["product"])["sizes_updated"] += 1
+    for rule in changes["new_rules"]:
+        entry(rule["product"])["rules_created"] += 1
+
+    length_changed = 0
+    for rule in changes["updated_rules"]:
+        e = entry(rule["product"])
+        e["rules_updated"] += 1
+        if rule["length_required"] != rule["old_length_required"]:
+            length_changed += 1
+            e["length_changes"].append({
+                "size": rule["label"],
+                "fabric_width_inches": rule["fabric_width_inches"],
+                "old": rule["old_length_required"],
+                "new": rule["length_required"]
+            })
+
+    return {
+        "products_created": len(changes["new_products"]),
+        "products_updated": len(changes["updated_products"]),
+        "sizes_created": len(changes["new_sizes"]),
+        "sizes_updated": len(changes["updated_sizes"]),
+        "rules_created": len(changes["new_rules"]),
+        "rules_updated": len(changes["updated_rules"]),
+        "rules_length_changed": length_changed,
+        "products": dict(sorted(breakdown.items()))
+    }
+
+# Dry-run changesets waiting for confirmation, in the master_data_previews table so a
+# confirm can reach any server worker
+PREVIEW_TTL_SECONDS = 30 * 60
+
+def store_master_data_preview(db: Session, changes: dict) -> str:
+    """
+    Keeps a computed changeset so a later confirm applies it without re-parsing the file.
+    Commits; expired previews are dropped on the way.
+    """
+    now = datetime.utcnow()
+    db.query(models.MasterDataPreview).filter(
+        models.MasterDataPreview.created_at < now - timedelta(seconds=PREVIEW_TTL_SECONDS)
+    ).delete(synchronize_session=False)
+    preview_id = uuid.uuid4().hex
+    db.add(models.MasterDataPreview(id=preview_id, changes=json.dumps(changes), created_at=now))
+    db.commit()
+    return preview_id
+
+def pop_master_data_preview(db: Session, preview_id: str) -> Optional[dict]:
+    """
+    Returns and deletes a stored changeset, or None if unknown or expired. The delete is
+    not committed: it lands with the confirm's write, so only one confirm can apply it.
+    """
+    table = models.MasterDataPreview.__table__
+    row = db.execute(
+        table.delete().where(table.c.id == preview_id).returning(table.c.changes, table.c.created_at)
+    ).first()
+    if row is None or row.created_at < datetime.utcnow() - timedelta(seconds=PREVIEW_TTL_SECONDS):
+        return None
+    return json.loads(row.changes)
+
+def preview_master_data_file(file_obj, db: Session, filename: str, chunk_size: int = IMPORT_CHUNK_SIZE) -> dict:
+    """Dry run of process_master_data_file: computes and stores the changeset, writes nothing."""
+    logger.info(f"Previewing file: {filename}")
+    # Nothing is written between batches, so one diff carries the state across them
+    # Confirm refuses the changeset if the catalog has moved on since this version
+    version = get_catalog_version(db)
+    diff = MasterDataDiff(db)
+    for df in iter_tabular_file(file_obj, filename, MASTER_DATA_COLUMNS, chunk_size=chunk_size):
+        diff.add_rows(normalize_master_data(df))
+    changes = {**diff.changes(), "catalog_version": version}
+    return {
+        "preview_id": store_master_data_preview(db, changes),
+        "stats": changes["stats"],
+        "summary": summarize_master_data_changes(changes)
+    }
+
+# --- Bulk Orders ---
+
+ORDER_FILE_COLUMNS = {
+    # Sheet column -> BulkOrderRow field
+    'Tailor': 'tailor',
+    'Product': 'product',
+    'Size': 'size',
+    'Quantity': 'quantity',
+}
+ORDER_FILE_OPTIONAL_COLUMNS = {
+    'School': 'school',
+    'Fabric Width (Inches)': 'fabric_width_inches',
+    'Slip No': 'slip_no',
+    'Notes': 'notes',
+    'Date': 'created_at',
+}
 
+def _cell_value(value):
+    # Excel gives numbers as floats: 24.0 should read as "24"
+    if not pd.notna(value) or str(value).strip() == '':
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+def _format_validation_error(e: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(l) for l in err['loc'])}: {err['msg']}" for err in e.errors())
+
+def process_order_file(file_obj, db: Session, filename: str):
+    """Parses an order spreadsheet and imports it with process_order_rows."""
+    logger.info(f"Processing order file: {filename}")
+    df = read_tabular_file(
+        file_obj, filename, list(ORDER_FILE_COLUMNS), list(ORDER_FILE_OPTIONAL_COLUMNS)
+    )
+    columns = {**ORDER_FILE_COLUMNS, **ORDER_FILE_OPTIONAL_COLUMNS}
+    present = [c for c in columns if c in df.columns]
+
+    numbered = []
+    for index, values in zip(df.index, df[present].itertuples(index=False, name=None)):
+        raw = {columns[col]: _cell_value(v) for col, v in zip(present, values)}
+        if all(v is None for v in raw.values()):
+            continue # Blank line in the sheet
+        numbered.append((index + 1, raw))
+
+    rows, row_numbers, invalid_rows = _validate_order_rows(numbered)
+    return process_order_rows(rows, db, row_numbers, invalid_rows)
+
+def process_order_json(file_obj, db: Session):
+    """
+    Imports a JSON array of order rows (the body /orders/bulk takes) with process_order_rows.
+    Row numbers in the result are 1-based positions in the array.
+    """
+    try:
+        data = json.load(file_obj)
+    except ValueError as e:
+        raise ValueError(f"Invalid JSON: {e}")
+    if not isinstance(data, list):
+        raise ValueError("Expected a JSON array of order rows")
+
+    numbered, not_objects = [], []
+    for number, raw in enumerate(data, start=1):
+        if isinstance(raw, dict):
+            numbered.append((number, raw))
+        else:
+            not_objects.append((number, {}, "Expected an object"))
+
+    rows, row_numbers, invalid_rows = _validate_order_rows(numbered)
+    return process_order_rows(rows, db, row_numbers, invalid_rows + not_objects)
+
+def _validate_order_rows(numbered):
+    # (row_number, raw dict) pairs -> rows, their row numbers, and the invalid ones
+    rows, row_numbers, invalid_rows = [], [], []
+    for row_number, raw in numbered:
+        try:
+            rows.append(schemas.BulkOrderRow(**raw))
+            row_numbers.append(row_number)
+        except ValidationError as e:
+            invalid_rows.append((row_number, raw, _format_validation_error(e)))
+    return rows, row_numbers, invalid_rows
+
+def process_order_rows(
+    rows: List[schemas.BulkOrderRow],
+    db: Session,
+    row_numbers: Optional[List[int]] = None,
+    invalid_rows=()
+):
+    """
+    Imports many order rows at once. Tailors, schools, products and sizes are looked up
+    through maps built once per batch and rules through the shared rule index,
+    orders are inserted with one batched
+    INSERT and their lines with one executemany INSERT, and everything commits together.
+    An order with any bad row is skipped as a whole; every affected row is reported.
+    invalid_rows holds (row_number, raw dict, error) for rows that failed validation,
+    so they can fail their order too.
+    """
+    if row_numbers is None:
+        row_numbers = list(range(1, len(rows) + 1))
+
+    # 1. Lookup maps (names are matched case-insensitively)
+    tailors = {name.lower(): id for id, name in db.query(models.Tailor.id, models.Tailor.name)}
+    schools = {name.lower(): id for id, name in db.query(models.School.id, models.School.name)}
+    products = {name.lower(): id for id, name in db.query(models.Product.id, models.Product.name)}
+
+    wanted_products = {products[r.product.lower()] for r in rows if r.product.lower() in products}
+    sizes = {}
+    if wanted_products:
+        for id, product_id, label in db.query(models.Size.id, models.Size.product_id, models.Size.label).filter(
+            models.Size.product_id.in_(wanted_products)
+        ):
+            sizes[(product_id, str(label).strip().lower())] = id
+    rule_index = get_rule_index(db)
+
+    # 2. Resolve each row and group rows into orders by (tailor, slip no)
+    groups = {}
+    errors = []
+    for row_number, row in zip(row_numbers, rows):
+        tailor_id = tailors.get(row.tailor.lower())
+        product_id = products.get(row.product.lower())
+        size_id = sizes.get((product_id, row.size.lower())) if product_id else None
+        school_id = schools.get(row.school.lower()) if row.school else None
+        rule = rule_index.resolve(size_id, row.fabric_width_inches) if size_id else None
+
+        if tailor_id is None:
+            error = f"Unknown tailor '{row.tailor}'"
+        elif product_id is None:
+            error = f"Unknown product '{row.product}'"
+        elif size_id is None:
+            error = f"Unknown size '{row.size}' for product '{row.product}'"
+        elif row.school and school_id is None:
+            error = f"Unknown school '{row.school}'"
+        elif rule is None:
+            error = f"No material rule found for {row.product} size {row.size}"
+        else:
+            error = None
+
+        group = groups.setdefault((tailor_id or row.tailor, row.slip_no), {"rows": [], "failed": False})
+        group["rows"].append((row_number, row, tailor_id, product_id, size_id, school_id, rule))
+        if error:
+            group["failed"] = True
+            errors.append({"row": row_number, "error": error})
+
+    rows_skipped = 0
+    for row_number, raw, error in invalid_rows:
+        errors.append({"row": row_number, "error": error})
+        rows_skipped += 1
+        tailor = str(raw.get("tailor") or "")
+        slip_no = raw.get("slip_no")
+        key = (tailors.get(tailor.lower(), tailor), str(slip_no) if slip_no is not None else None)
+        if key in groups:
+            groups[key]["failed"] = True
+
+    # Valid rows of a failed order are not imported either
+    failed_rows = {err["row"] for err in errors}
+    for group in groups.values():
+        if group["failed"]:
+            rows_skipped += len(group["rows"])
+            for row_number, *_ in group["rows"]:
+                if row_number not in failed_rows:
+                    errors.append({"row": row_number, "error": "Skipped: another row of the same order has an error"})
+
+    # 3. Bulk insert
+    valid_groups = [g for g in groups.values() if not g["failed"]]
+    lines_created = 0
+    try:
+        order_rows = []
+        for group in valid_groups:
+            first = group["rows"][0][1]
+            order_rows.append(dict(
+                tailor_id=group["rows"][0][2],
+                status="Pending",
+                slip_no=first.slip_no,
+                notes=next((r.notes for _, r, *_ in group["rows"] if r.notes), None),
+                created_at=first.created_at or datetime.utcnow(),
+                delivered_qty=0
+            ))
+        order_ids = []
+        if order_rows:
+            # (tailor_id, slip_no) is unique within the batch, so map the returned ids
+            # back by key instead of relying on RETURNING row order
+            returned = db.execute(
+                models.Order.__table__.insert().returning(models.Order.id, models.Order.tailor_id, models.Order.slip_no),
+                order_rows
+            ).all()
+            ids_by_key = {(tailor_id, slip_no): id for id, tailor_id, slip_no in returned}
+            order_ids = [ids_by_key[(row["tailor_id"], row["slip_no"])] for row in order_rows]
+
+        line_rows = []
+        for order_id, group in zip(order_ids, valid_groups):
+            for _, row, _, product_id, size_id, school_id, rule in group["rows"]:
+                line_rows.append(dict(
+                    order_id=order_id,
+                    product_id=product_id,
+                    size_id=size_id,
+                    school_id=school_id,
+                    fabric_width_inches=row.fabric_width_inches,
+                    material_req_per_unit=rule.length_required,
+                    unit=rule.unit,
+                    quantity=row.quantity,
+                    total_material_req=rule.length_required * row.quantity,
+                    delivered_qty=0
+                ))
+        if line_rows:
+            # Core insert: one executemany even when rows leave different columns empty
+            db.execute(models.OrderLine.__table__.insert(), line_rows)
+            lines_created = len(line_rows)
+
+        deltas = {}
+        for row in order_rows:
+            add_order_deltas(deltas, row["tailor_id"], row["status"])
+        for row in line_rows:
+            add_line_deltas(deltas, row["product_id"], row["quantity"], row["total_material_req"])
+        apply_rollup_deltas(db, deltas)
+        daily, lines_by_order = {}, {}
+        for row in line_rows:
+            lines_by_order.setdefault(row["order_id"], []).append(row)
+        for order_row, order_id in zip(order_rows, order_ids):
+            add_new_order_daily_deltas(
+                daily, order_row["created_at"], order_row["tailor_id"], order_row["status"],
+                lines_by_order.get(order_id, [])
+            )
+        apply_daily_deltas(db, daily)
+        db.commit()
     except Exception as e:
-        logger.error(f"Error during import: {e}")
+        db.rollback()
+        logger.error(f"Error during order import: {e}")
         raise e
+
+    logger.info(f"Order import: {len(order_ids)} orders, {lines_created} lines, {rows_skipped} rows skipped")
+    return {
+        "orders_created": len(order_ids),
+        "lines_created": lines_created,
+        "rows_skipped": rows_skipped,
+        "errors": sorted(errors, key=lambda err: err["row"])
+    }
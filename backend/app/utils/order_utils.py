@@ -0,0 +1,340 @@
+from sqlalchemy import and_, bindparam, case, func, or_, select, update
+from sqlalchemy.orm import Session
+from datetime import datetime
+from .. import models
+from .dashboard_utils import (
+    ACTIVE_STATUSES, MATERIAL_ISSUED, MATERIAL_WORK_DONE, add_daily_delta, add_delta,
+    add_order_daily_deltas, apply_daily_deltas, apply_rollup_deltas, status_metric
+)
+from .rule_utils import get_rule_index
+import logging
+
+logger = logging.getLogger(__name__)
+
+def order_status_expression():
+    """
+    Correlated SQL expression deriving an order's status from its lines' stored counters:
+    Completed if every line is fully delivered, In Progress if anything was delivered, else Pending.
+    One aggregate over order_lines, usable inside UPDATE orders SET status = ...
+    """
+    line = models.OrderLine
+    short_lines = func.sum(case((line.delivered_qty < line.quantity, 1), else_=0))
+    return select(
+        case(
+            (and_(func.count(line.id) > 0, short_lines == 0), "Completed"),
+            (func.sum(line.delivered_qty) > 0, "In Progress"),
+            else_="Pending"
+        )
+    ).where(line.order_id == models.Order.id).scalar_subquery()
+
+def recompute_order_status(db: Session, order_id: int):
+    """
+    Recomputes one order's status from its lines; a change also moves the order between
+    the dashboard status counts. Does not commit.
+    """
+    order = models.Order
+    old_status, new_status, created_at, tailor_id = db.execute(
+        select(order.status, order_status_expression(), order.created_at, order.tailor_id)
+        .where(order.id == order_id)
+    ).one()
+    if old_status == new_status:
+        return
+    db.execute(
+        update(models.Order)
+        .where(models.Order.id == order_id)
+        .values(status=new_status)
+        .execution_options(synchronize_session=False)
+    )
+    apply_status_change(db, old_status, new_status, created_at, tailor_id)
+
+def apply_status_change(db: Session, old_status, new_status, created_at=None, tailor_id=None):
+    """
+    Moves one order between the dashboard status counts, and its day's active count
+    when created_at is given. Does not commit.
+    """
+    deltas = {}
+    if old_status:
+        add_delta(deltas, status_metric(old_status), -1)
+    if new_status:
+        add_delta(deltas, status_metric(new_status), 1)
+    apply_rollup_deltas(db, deltas)
+
+    active_change = int(new_status in ACTIVE_STATUSES) - int(old_status in ACTIVE_STATUSES)
+    if created_at and active_change:
+        daily = {}
+        add_daily_delta(daily, created_at, tailor_id, orders_active=active_change)
+        apply_daily_deltas(db, daily)
+
+def recompute_statuses(db: Session) -> int:
+    """
+    Maintenance: fixes the status of every order in one pass, e.g. after manual edits
+    through scripts/edit_db.py. Relies on the line counters, so run
+    rebuild_delivery_counters first if deliveries were edited by hand, and
+    rebuild_dashboard_rollups afterwards.
+    Returns the number of orders whose status changed.
+    """
+    new_status = order_status_expression()
+    fixed = db.execute(
+        update(models.Order)
+        .where(models.Order.status.is_distinct_from(new_status))
+        .values(status=new_status)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    logger.info(f"Order statuses recomputed: {fixed} orders fixed")
+    return fixed
+
+def add_delivered_qty(db: Session, line: models.OrderLine, quantity: int, delivered_on=None):
+    """
+    Adjusts the delivered counters of a line and its order by `quantity` (negative to undo),
+    and the dashboard's material work done with them. With delivered_on (the delivery's
+    date) the day's delivered figures move too; callers moving several deliveries at once
+    account for the daily rows themselves.
+    The increment happens in SQL so concurrent deliveries cannot overwrite each other.
+    Does not commit; call inside the same transaction as the delivery write.
+    """
+    db.query(models.OrderLine).filter(models.OrderLine.id == line.id).update(
+        {models.OrderLine.delivered_qty: models.OrderLine.delivered_qty + quantity},
+        synchronize_session=False
+    )
+    db.query(models.Order).filter(models.Order.id == line.order_id).update(
+        {models.Order.delivered_qty: models.Order.delivered_qty + quantity},
+        synchronize_session=False
+    )
+    deltas = {}
+    add_delta(deltas, MATERIAL_WORK_DONE, quantity * (line.material_req_per_unit or 0))
+    apply_rollup_deltas(db, deltas)
+    if delivered_on is not None:
+        daily = {}
+        add_daily_delta(
+            daily, delivered_on, line.order.tailor_id, line.school_id, line.product_id,
+            pieces_delivered=quantity, material_work_done=quantity * (line.material_req_per_unit or 0)
+        )
+        apply_daily_deltas(db, daily)
+
+def deliver_order_lines(db: Session, order_id: int, entries=None, deliver_all_pending: bool = False,
+                        delivered_on=None) -> int:
+    """
+    Records several deliveries against one order in one go: `entries` is a list of
+    (line_id, quantity), or deliver_all_pending delivers what every line still lacks.
+    Lines are read and checked against their pending quantities with one query; the
+    deliveries and line counters are written with one executemany each, and the order
+    counter, dashboard totals and order status are updated once.
+    Raises LookupError if the order does not exist, ValueError for an invalid entry.
+    Returns the number of pieces delivered. Does not commit.
+    """
+    delivered_on = delivered_on or datetime.utcnow()
+    line = models.OrderLine
+    rows = db.execute(
+        select(models.Order.tailor_id, line.id, line.quantity, line.delivered_qty,
+               line.material_req_per_unit, line.school_id, line.product_id)
+        .select_from(models.Order).outerjoin(line, line.order_id == models.Order.id)
+        .where(models.Order.id == order_id)
+    ).all()
+    if not rows:
+        raise LookupError("Order not found")
+    tailor_id = rows[0].tailor_id
+    lines = {row.id: row for row in rows if row.id is not None}
+
+    quantities = {}
+    if deliver_all_pending:
+        quantities = {id: row.quantity - row.delivered_qty for id, row in lines.items() if row.quantity > row.delivered_qty}
+    else:
+        for line_id, quantity in entries or []:
+            if line_id not in lines:
+                raise ValueError(f"Line {line_id} is not part of order {order_id}")
+            quantities[line_id] = quantities.get(line_id, 0) + quantity
+        for line_id, quantity in quantities.items():
+            pending = lines[line_id].quantity - lines[line_id].delivered_qty
+            if quantity > pending:
+                raise ValueError(f"Line {line_id} has {max(pending, 0)} pieces pending, cannot deliver {quantity}")
+    if not quantities:
+        return 0
+
+    db.execute(models.Delivery.__table__.insert(), [
+        dict(order_line_id=line_id, quantity_delivered=quantity, date_delivered=delivered_on)
+        for line_id, quantity in quantities.items()
+    ])
+    # The increments happen in SQL so concurrent deliveries cannot overwrite each other
+    db.execute(
+        update(models.OrderLine.__table__)
+        .where(models.OrderLine.__table__.c.id == bindparam("b_line_id"))
+        .values(delivered_qty=models.OrderLine.__table__.c.delivered_qty + bindparam("b_quantity")),
+        [dict(b_line_id=line_id, b_quantity=quantity) for line_id, quantity in quantities.items()]
+    )
+    total = sum(quantities.values())
+    db.query(models.Order).filter(models.Order.id == order_id).update(
+        {models.Order.delivered_qty: models.Order.delivered_qty + total},
+        synchronize_session=False
+    )
+
+    deltas, daily = {}, {}
+    for line_id, quantity in quantities.items():
+        row = lines[line_id]
+        work_done = quantity * (row.material_req_per_unit or 0)
+        add_delta(deltas, MATERIAL_WORK_DONE, work_done)
+        add_daily_delta(
+            daily, delivered_on, tailor_id, row.school_id, row.product_id,
+            pieces_delivered=quantity, material_work_done=work_done
+        )
+    apply_rollup_deltas(db, deltas)
+    apply_daily_deltas(db, daily)
+    recompute_order_status(db, order_id)
+    return total
+
+def rebuild_delivery_counters(db: Session) -> dict:
+    """
+    Recomputes delivered_qty on every order line and order from the deliveries table
+    in two set-based UPDATEs. Only rows whose counter was wrong are touched.
+    Returns the number of lines and orders that were fixed.
+    """
+    line_total = select(func.coalesce(func.sum(models.Delivery.quantity_delivered), 0)).where(
+        models.Delivery.order_line_id == models.OrderLine.id
+    ).scalar_subquery()
+    lines_fixed = db.execute(
+        update(models.OrderLine)
+        .where(models.OrderLine.delivered_qty.is_distinct_from(line_total))
+        .values(delivered_qty=line_total)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+    order_total = select(func.coalesce(func.sum(models.OrderLine.delivered_qty), 0)).where(
+        models.OrderLine.order_id == models.Order.id
+    ).scalar_subquery()
+    orders_fixed = db.execute(
+        update(models.Order)
+        .where(models.Order.delivered_qty.is_distinct_from(order_total))
+        .values(delivered_qty=order_total)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+    db.commit()
+    logger.info(f"Delivery counters rebuilt: {lines_fixed} lines, {orders_fixed} orders fixed")
+    return {"lines_fixed": lines_fixed, "orders_fixed": orders_fixed}
+
+OPEN_ORDER_STATUSES = ("Pending", "In Progress")
+
+def _open_lines_filter():
+    return models.OrderLine.order_id.in_(
+        select(models.Order.id).where(models.Order.status.in_(OPEN_ORDER_STATUSES))
+    )
+
+def _reprice_bucket(buckets: dict, key, unit: str, **fields) -> dict:
+    return buckets.setdefault(key, {**fields, "unit": unit, "lines_changed": 0, "old_total": 0.0, "new_total": 0.0})
+
+def reprice_open_orders(db: Session, scope: str = "all", rule_id=None, product_id=None, dry_run: bool = False) -> dict:
+    """
+    Brings the material snapshot (per unit, unit, total) of open order lines back in line
+    with the current Material Rules. scope is "rule" (lines priced by rule_id),
+    "product" (lines of product_id) or "all".
+    Open lines are aggregated by pricing key (size, fabric width) in one query and each key
+    is resolved through the rule index, so the work grows with the number of keys, not lines.
+    With dry_run only the material delta is reported. Otherwise one UPDATE per changed key
+    (a single executemany) rewrites the lines, and the whole batch commits together.
+    Raises ValueError for an unknown rule or product.
+    """
+    index = get_rule_index(db)
+    if scope == "rule" and index.by_id.get(rule_id) is None:
+        raise ValueError(f"Material rule {rule_id} not found")
+    if scope == "product" and not db.query(models.Product.id).filter(models.Product.id == product_id).first():
+        raise ValueError(f"Product {product_id} not found")
+
+    line = models.OrderLine
+    query = db.query(
+        line.product_id, line.size_id, line.fabric_width_inches, line.material_req_per_unit, line.unit,
+        func.count(line.id), func.sum(line.quantity), func.sum(line.total_material_req), func.sum(line.delivered_qty)
+    ).filter(_open_lines_filter())
+    if scope == "product":
+        query = query.filter(line.product_id == product_id)
+    query = query.group_by(
+        line.product_id, line.size_id, line.fabric_width_inches, line.material_req_per_unit, line.unit
+    )
+
+    summary = {"lines_matched": 0, "lines_changed": 0, "lines_without_rule": 0}
+    totals, products, changed_keys = {}, {}, {}
+    rollup_deltas = {}
+    for p_id, size_id, width, per_unit, unit, count, quantity, total, delivered in query:
+        rule = index.resolve(size_id, width)
+        if rule is None:
+            summary["lines_without_rule"] += count
+            continue
+        if scope == "rule" and rule.id != rule_id:
+            continue
+        summary["lines_matched"] += count
+        if per_unit == rule.length_required and unit == rule.unit:
+            continue
+
+        summary["lines_changed"] += count
+        changed_keys[(size_id, width)] = rule
+        old_total, new_total = total or 0.0, quantity * rule.length_required
+        add_delta(rollup_deltas, MATERIAL_ISSUED, new_total - old_total)
+        add_delta(rollup_deltas, MATERIAL_WORK_DONE, (delivered or 0) * (rule.length_required - (per_unit or 0)))
+        # Totals are per unit: when the rule's unit changed, the old total is counted under
+        # the unit the lines were priced in and the new one (and the lines) under the rule's
+        old_unit = unit or rule.unit
+        for bucket_unit, old, new, lines in ((old_unit, old_total, 0.0, 0), (rule.unit, 0.0, new_total, count)):
+            for bucket in (_reprice_bucket(totals, bucket_unit, bucket_unit),
+                           _reprice_bucket(products, (p_id, bucket_unit), bucket_unit, product_id=p_id)):
+                bucket["lines_changed"] += lines
+                bucket["old_total"] += old
+                bucket["new_total"] += new
+
+    product_ids = {p_id for p_id, _ in products}
+    names = dict(db.query(models.Product.id, models.Product.name).filter(models.Product.id.in_(product_ids))) if products else {}
+    for bucket in list(totals.values()) + list(products.values()):
+        bucket["old_total"] = round(bucket["old_total"], 4)
+        bucket["new_total"] = round(bucket["new_total"], 4)
+        bucket["delta"] = round(bucket["new_total"] - bucket["old_total"], 4)
+    for bucket in products.values():
+        bucket["product_name"] = names.get(bucket["product_id"], "Unknown")
+
+    summary.update(
+        scope=scope,
+        dry_run=dry_run,
+        lines_updated=0,
+        totals=sorted(totals.values(), key=lambda b: b["unit"]),
+        products=sorted(products.values(), key=lambda b: (b["product_name"], b["unit"])),
+    )
+    if dry_run or not changed_keys:
+        return summary
+
+    # Repriced lines may span many days: take the affected orders out of the daily rows
+    # before the UPDATE and put them back after it
+    affected_orders = models.Order.id.in_(
+        select(line.order_id).where(
+            _open_lines_filter(), *([line.product_id == product_id] if scope == "product" else [])
+        )
+    )
+    daily_deltas = {}
+
+    # Core table: a list of parameters means executemany, not the ORM's update-by-primary-key
+    table = line.__table__
+    statement = table.update().where(
+        table.c.size_id == bindparam("b_size_id"),
+        table.c.fabric_width_inches.is_not_distinct_from(bindparam("b_width")),
+        _open_lines_filter(),
+        *([table.c.product_id == product_id] if scope == "product" else []),
+        or_(
+            table.c.material_req_per_unit.is_distinct_from(bindparam("b_length")),
+            table.c.unit.is_distinct_from(bindparam("b_unit"))
+        )
+    ).values(
+        material_req_per_unit=bindparam("b_length"),
+        unit=bindparam("b_unit"),
+        total_material_req=table.c.quantity * bindparam("b_length"),
+    )
+    try:
+        add_order_daily_deltas(db, daily_deltas, affected_orders, sign=-1)
+        summary["lines_updated"] = db.execute(statement, [
+            {"b_size_id": size_id, "b_width": width, "b_length": rule.length_required, "b_unit": rule.unit}
+            for (size_id, width), rule in changed_keys.items()
+        ]).rowcount
+        apply_rollup_deltas(db, rollup_deltas)
+        add_order_daily_deltas(db, daily_deltas, affected_orders)
+        apply_daily_deltas(db, daily_deltas)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    logger.info(f"Repriced {summary['lines_updated']} open order lines (scope: {scope})")
+    return summary
@@ -0,0 +1,69 @@
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+import threading
+from sqlalchemy.orm import Session
+from .. import models
+from .catalog_utils import get_catalog_version
+
+class RuleEntry(NamedTuple):
+    """Plain copy of a Material Rule row: safe to share between sessions and threads."""
+    id: int
+    size_id: int
+    fabric_width_inches: Optional[int]
+    length_required: float
+    unit: str
+
+class MaterialRuleIndex:
+    """
+    Every Material Rule, indexed for order pricing. Policy for an order line:
+    an explicit rule_id wins; otherwise the size's rule for the given fabric width,
+    or the size's default rule (its lowest id) when no width is given.
+    When a size has several rules for one width, the lowest id is used.
+    """
+
+    def __init__(self, rules: Iterable[RuleEntry]):
+        self.by_id: Dict[int, RuleEntry] = {}
+        self.by_size_width: Dict[Tuple[int, Optional[int]], RuleEntry] = {}
+        self.default_by_size: Dict[int, RuleEntry] = {}
+        for rule in sorted(rules, key=lambda r: r.id):
+            self.by_id[rule.id] = rule
+            self.by_size_width.setdefault((rule.size_id, rule.fabric_width_inches), rule)
+            self.default_by_size.setdefault(rule.size_id, rule)
+
+    def resolve(self, size_id, fabric_width_inches=None, rule_id=None) -> Optional[RuleEntry]:
+        """Returns None when nothing matches."""
+        if rule_id:
+            return self.by_id.get(rule_id)
+        if fabric_width_inches:
+            return self.by_size_width.get((size_id, fabric_width_inches))
+        return self.default_by_size.get(size_id)
+
+    def resolve_many(self, requests: Iterable[Tuple]) -> List[Optional[RuleEntry]]:
+        """Batch form of resolve: one (size_id, fabric_width_inches, rule_id) tuple per line."""
+        return [self.resolve(*request) for request in requests]
+
+# Built once per catalog version: any catalog write or import bumps the version,
+# which replaces the index on its next use, in every worker
+_rule_index: Optional[Tuple[int, MaterialRuleIndex]] = None
+_rule_index_lock = threading.Lock()
+
+def get_rule_index(db: Session) -> MaterialRuleIndex:
+    global _rule_index
+    version = get_catalog_version(db)
+    cached = _rule_index
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    rule = models.MaterialRule
+    index = MaterialRuleIndex(
+        RuleEntry(*row) for row in db.query(
+            rule.id, rule.size_id, rule.fabric_width_inches, rule.length_required, rule.unit
+        )
+    )
+    with _rule_index_lock:
+        _rule_index = (version, index)
+    return index
+
+def clear_rule_index():
+    global _rule_index
+    with _rule_index_lock:
+        _rule_index = None
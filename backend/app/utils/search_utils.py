@@ -0,0 +1,70 @@
+from typing import Optional
+import re
+from sqlalchemy import Column, Float, Integer, MetaData, Table, select, text
+from sqlalchemy.orm import Session
+from .. import models
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Read-only handle on the FTS5 table (created by the DDL in models.py, not by the ORM)
+order_search = Table(
+    "order_search", MetaData(),
+    Column("rowid", Integer),
+    Column("rank", Float),
+)
+
+def build_match_query(search: str) -> Optional[str]:
+    """
+    FTS5 query for free text typed in the order list: every word must match, as a word
+    prefix ("ali tail" finds "Alice Tailor"; unlike the old LIKE search, "ice" does not
+    find "Alice", as the index has no substrings). Single characters match whole words only,
+    since a one-letter prefix hits most of the index ("S-42" is "s" and "42"*).
+    Returns None when there is nothing to search.
+    """
+    words = re.findall(r"\w+", search.lower())
+    if not words:
+        return None
+    return " ".join(f'"{word}"' if len(word) < 2 else f'"{word}"*' for word in words)
+
+# bm25 reads every document it ranks, so relevance ranks only this many matches (the newest);
+# a search matching more of the orders lists the older matches after them, newest first
+RELEVANCE_CANDIDATES = 1000
+
+def _match(match_query: str):
+    return text("order_search MATCH :order_search_query").bindparams(order_search_query=match_query)
+
+def order_search_matches(match_query: str, min_rowid: Optional[int] = None, max_rowid: Optional[int] = None):
+    """
+    (rowid, rank) of the orders matching an FTS5 query; a lower rank is a better match (bm25).
+    min_rowid / max_rowid (inclusive / exclusive) bound the order ids inside the index scan.
+    """
+    query = select(order_search.c.rowid, order_search.c.rank).where(_match(match_query))
+    if min_rowid is not None:
+        query = query.where(order_search.c.rowid >= min_rowid)
+    if max_rowid is not None:
+        query = query.where(order_search.c.rowid < max_rowid)
+    return query
+
+def relevance_bound(db: Session, match_query: str) -> Optional[int]:
+    """
+    Order id of the RELEVANCE_CANDIDATES-th newest match (by id), or None if there are fewer
+    matches: the matches from that id up are the ones relevance ranks.
+    """
+    return db.execute(
+        select(order_search.c.rowid).where(_match(match_query))
+        .order_by(order_search.c.rowid.desc()).offset(RELEVANCE_CANDIDATES - 1).limit(1)
+    ).scalar()
+
+def rebuild_order_search(db: Session) -> int:
+    """
+    Recreates every order document from orders, order_lines, tailors, schools and products,
+    e.g. if the index was created after the data. Returns the number of orders indexed.
+    """
+    db.execute(text("DELETE FROM order_search"))
+    db.execute(text(models.ORDER_SEARCH_INSERT.format(where="1")))
+    db.execute(text("INSERT INTO order_search (order_search) VALUES ('optimize')"))
+    db.commit()
+    indexed = db.execute(text("SELECT count(*) FROM order_search")).scalar()
+    logger.info(f"Order search index rebuilt: {indexed} orders")
+    return indexed
@@ -1,4 +1,29 @@
+from typing import Optional, Tuple
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
 import bcrypt
+from fastapi import Depends, Header, HTTPException
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from .. import models
+from ..database import get_db
+
+ADMIN_PASSWORD_KEY = "admin_password"
+# Admin tokens from /admin/verify-password stand in for the password on admin routes
+ADMIN_TOKEN_TTL_SECONDS = int(os.environ.get("ADMIN_TOKEN_TTL_SECONDS") or 15 * 60)
+# Server secret mixed into the token key, so reading the database (and the password hash)
+# is not enough to mint tokens. Set it to share tokens across workers and restarts;
+# without it each process uses a random one and tokens die with the process.
+ADMIN_TOKEN_SECRET = os.environ.get("ADMIN_TOKEN_SECRET") or secrets.token_hex(32)
+# The admin password hash is cached per process for this many seconds, so after a password
+# change the other workers keep accepting the old password (and tokens signed with it) for
+# up to this long. 0 reads the Settings row on every admin check.
+ADMIN_HASH_CACHE_SECONDS = int(os.environ.get("ADMIN_HASH_CACHE_SECONDS", "60"))
 
 def get_password_hash(password: str) -> str:
     pwd_bytes = password.encode('utf-8')
@@ -13,3 +38,90 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     except Exception as e:
         print(f"Password verification error: {e}")
         return False
+
+# --- Admin password hash cache ---
+
+_admin_hash: Tuple[Optional[str], float] = (None, 0.0)
+_admin_hash_lock = threading.Lock()
+
+def _cached_admin_password_hash() -> Optional[str]:
+    with _admin_hash_lock:
+        password_hash, expires_at = _admin_hash
+    return password_hash if expires_at > time.monotonic() else None
+
+def get_admin_password_hash(db: Session) -> Optional[str]:
+    """The stored admin password hash, read from Settings at most once per ADMIN_HASH_CACHE_SECONDS."""
+    global _admin_hash
+    password_hash = _cached_admin_password_hash()
+    if password_hash:
+        return password_hash
+
+    setting = db.query(models.Settings).filter(models.Settings.key == ADMIN_PASSWORD_KEY).first()
+    password_hash = setting.value if setting else None
+    with _admin_hash_lock:
+        _admin_hash = (password_hash, time.monotonic() + ADMIN_HASH_CACHE_SECONDS)
+    return password_hash
+
+def clear_admin_password_cache():
+    """Call after changing the admin password."""
+    global _admin_hash
+    with _admin_hash_lock:
+        _admin_hash = (None, 0.0)
+
+# --- Admin tokens ---
+
+def _token_signature(expires: int, password_hash: str) -> str:
+    # Keyed on the password hash, so changing the password revokes every token issued before
+    key = hashlib.sha256(f"{ADMIN_TOKEN_SECRET}:{password_hash}".encode("utf-8")).digest()
+    digest = hmac.new(key, str(expires).encode("ascii"), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode("ascii").rstrip("=")
+
+def create_admin_token(password_hash: str, ttl_seconds: int = ADMIN_TOKEN_TTL_SECONDS) -> Tuple[str, int]:
+    """Signed token "<expiry>.<signature>" and its expiry (unix seconds)."""
+    expires = int(time.time()) + ttl_seconds
+    return f"{expires}.{_token_signature(expires, password_hash)}", expires
+
+def verify_admin_token(token: str, password_hash: str) -> bool:
+    try:
+        expires_part, signature = token.split(".", 1)
+        expires = int(expires_part)
+    except ValueError:
+        return False
+    if expires < time.time():
+        return False
+    return hmac.compare_digest(signature, _token_signature(expires, password_hash))
+
+async def _admin_password_hash(db: Session) -> Optional[str]:
+    # Only a cache miss needs the database, and then in the thread pool
+    return _cached_admin_password_hash() or await run_in_threadpool(get_admin_password_hash, db)
+
+async def check_admin_password(db: Session, password: str) -> Optional[str]:
+    """
+    Checks `password` against the admin password and returns the hash when it matches.
+    The Settings read (on a cache miss) and bcrypt run in the thread pool, off the event loop.
+    """
+    password_hash = await _admin_password_hash(db)
+    if not password_hash:
+        raise HTTPException(status_code=500, detail="Admin password not set")
+    if await run_in_threadpool(verify_password, password, password_hash):
+        return password_hash
+    return None
+
+async def require_admin(
+    x_admin_token: str = Header(None, alias="X-Admin-Token"),
+    x_admin_password: str = Header(None, alias="X-Admin-Password"),
+    db: Session = Depends(get_db)
+):
+    """
+    Dependency for admin-only routes: an X-Admin-Token from /admin/verify-password is
+    checked with one HMAC; X-Admin-Password still works but costs a bcrypt check.
+    """
+    if x_admin_token:
+        password_hash = await _admin_password_hash(db)
+        if not password_hash or not verify_admin_token(x_admin_token, password_hash):
+            raise HTTPException(status_code=401, detail="Invalid or expired admin token")
+        return
+    if not x_admin_password:
+        raise HTTPException(status_code=401, detail="Admin password required")
+    if not await check_admin_password(db, x_admin_password):
+        raise HTTPException(status_code=401, detail="Invalid admin password")
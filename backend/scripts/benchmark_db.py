@@ -0,0 +1,134 @@
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import logging
+
+# Allow running as `python scripts/benchmark_db.py` from backend/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from app import models
+from app.database import Base, create_db_engine
+from app.utils.order_utils import add_delivered_qty, recompute_order_status
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def seed(Session, orders: int, lines_per_order: int):
+    db = Session()
+    try:
+        tailor = models.Tailor(name="Benchmark Tailor")
+        product = models.Product(name="Benchmark Product")
+        size = models.Size(label="32", order_index=1)
+        product.sizes.append(size)
+        db.add_all([tailor, product])
+        db.flush()
+        for _ in range(orders):
+            order = models.Order(tailor_id=tailor.id, status="Pending", delivered_qty=0)
+            order.order_lines = [
+                models.OrderLine(product_id=product.id, size_id=size.id, quantity=1000,
+                                 material_req_per_unit=1.0, unit="meters", total_material_req=1000.0,
+                                 delivered_qty=0)
+                for _ in range(lines_per_order)
+            ]
+            db.add(order)
+        db.commit()
+        return [id for (id,) in db.query(models.OrderLine.id)]
+    finally:
+        db.close()
+
+def writer(Session, line_ids, stop, stats):
+    """Records deliveries the way the delivery endpoint does, one transaction each."""
+    i = 0
+    while not stop.is_set():
+        db = Session()
+        try:
+            line = db.get(models.OrderLine, line_ids[i % len(line_ids)])
+            db.add(models.Delivery(order_line_id=line.id, quantity_delivered=1))
+            db.flush()
+            add_delivered_qty(db, line, 1)
+            recompute_order_status(db, line.order_id)
+            db.commit()
+            stats["writes"] += 1
+        except OperationalError:
+            db.rollback()
+            stats["write_errors"] += 1
+        finally:
+            db.close()
+        i += 1
+
+def reader(Session, stop, latencies, stats):
+    """Runs the kind of aggregate the order list and dashboard read."""
+    while not stop.is_set():
+        db = Session()
+        started = time.perf_counter()
+        try:
+            db.query(models.Order.status, func.count(models.Order.id), func.sum(models.OrderLine.delivered_qty)).join(
+                models.OrderLine
+            ).group_by(models.Order.status).all()
+            latencies.append((time.perf_counter() - started) * 1000)
+        except OperationalError:
+            stats["read_errors"] += 1
+        finally:
+            db.close()
+
+def run(journal_mode: str, synchronous: str, seconds: float, readers: int, orders: int, lines: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_engine = create_db_engine(
+            f"sqlite:///{os.path.join(tmp, 'bench.db')}", pool_size=readers + 2,
+            journal_mode=journal_mode, synchronous=synchronous
+        )
+        Base.metadata.create_all(bind=db_engine)
+        Session = sessionmaker(autocommit=False, autoflush=False, bind=db_engine)
+        line_ids = seed(Session, orders, lines)
+
+        stop = threading.Event()
+        stats = {"writes": 0, "write_errors": 0, "read_errors": 0}
+        latencies = []
+        threads = [threading.Thread(target=writer, args=(Session, line_ids, stop, stats))]
+        threads += [threading.Thread(target=reader, args=(Session, stop, latencies, stats)) for _ in range(readers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        db_engine.dispose()
+
+    latencies.sort()
+    return {
+        "mode": f"{journal_mode}/{synchronous}",
+        "reads": len(latencies),
+        "read_p50_ms": statistics.median(latencies) if latencies else 0,
+        "read_p99_ms": latencies[int(len(latencies) * 0.99)] if latencies else 0,
+        "read_max_ms": latencies[-1] if latencies else 0,
+        **stats,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare concurrent read latency during delivery writes, per journal mode')
+    parser.add_argument('--seconds', type=float, default=5, help='Duration of each run')
+    parser.add_argument('--readers', type=int, default=4, help='Concurrent reader threads')
+    parser.add_argument('--orders', type=int, default=2000, help='Orders to seed')
+    parser.add_argument('--lines', type=int, default=5, help='Lines per order')
+    args = parser.parse_args()
+
+    results = [
+        run("DELETE", "FULL", args.seconds, args.readers, args.orders, args.lines),
+        run("WAL", "NORMAL", args.seconds, args.readers, args.orders, args.lines),
+    ]
+    logger.info(f"{'mode':<14}{'reads':>8}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}{'writes':>8}{'errors':>8}")
+    for r in results:
+        logger.info(
+            f"{r['mode']:<14}{r['reads']:>8}{r['read_p50_ms']:>9.1f}{r['read_p99_ms']:>9.1f}"
+            f"{r['read_max_ms']:>9.1f}{r['writes']:>8}{r['write_errors'] + r['read_errors']:>8}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import logging
+
+# Allow running as `python scripts/benchmark_search.py` from backend/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime, timedelta
+from fastapi import Response
+from sqlalchemy.orm import sessionmaker
+from app import models
+from app.database import Base, create_db_engine
+from app.routers.orders import list_orders
+from app.utils.search_utils import rebuild_order_search
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+WORDS = ["cotton", "blue", "navy", "pleated", "winter", "summer", "house", "sports", "formal", "khaki"]
+
+def seed(db, orders: int, lines_per_order: int):
+    rng = random.Random(7)
+    db.execute(models.Tailor.__table__.insert(), [{"name": f"Tailor {i} {rng.choice(WORDS)}"} for i in range(200)])
+    db.execute(models.School.__table__.insert(), [{"name": f"School {i} {rng.choice(WORDS)}"} for i in range(100)])
+    products = [f"{w} {kind}" for w in WORDS for kind in ("Shirt", "Pant", "Skirt")]
+    db.execute(models.Product.__table__.insert(), [{"id": i, "name": name} for i, name in enumerate(products, 1)])
+    # One size per product, sharing its id
+    db.execute(models.Size.__table__.insert(), [{"id": i, "product_id": i, "label": "32"} for i in range(1, len(products) + 1)])
+    start = datetime(2024, 1, 1)
+    db.execute(models.Order.__table__.insert(), [
+        {"id": i, "tailor_id": rng.randint(1, 200), "status": "Pending", "delivered_qty": 0,
+         "slip_no": f"S-{i}", "notes": f"{rng.choice(WORDS)} {rng.choice(WORDS)}",
+         "created_at": start + timedelta(minutes=i)}
+        for i in range(1, orders + 1)
+    ])
+    db.execute(models.OrderLine.__table__.insert(), [
+        {"order_id": i, "product_id": product_id, "size_id": product_id, "school_id": rng.randint(1, 100),
+         "quantity": 10, "material_req_per_unit": 1.0, "unit": "meters", "total_material_req": 10.0,
+         "delivered_qty": 0}
+        for i in range(1, orders + 1)
+        for product_id in rng.sample(range(1, len(products) + 1), lines_per_order)
+    ])
+    db.commit()
+
+def main():
+    parser = argparse.ArgumentParser(description='Time order list searches through the full-text index')
+    parser.add_argument('--orders', type=int, default=200000, help='Orders to seed')
+    parser.add_argument('--lines', type=int, default=5, help='Lines per order')
+    parser.add_argument('--repeat', type=int, default=20, help='Runs per search')
+    parser.add_argument('--db', help='Database file to seed once and reuse on later runs (default: a temporary one)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_engine = create_db_engine(f"sqlite:///{args.db or os.path.join(tmp, 'search.db')}")
+        Base.metadata.create_all(bind=db_engine)
+        db = sessionmaker(autocommit=False, autoflush=False, bind=db_engine)()
+
+        if db.query(models.Order.id).first() is None:
+            started = time.perf_counter()
+            seed(db, args.orders, args.lines)
+            logger.info(f"Seeded {args.orders} orders / {args.orders * args.lines} lines in {time.perf_counter() - started:.1f}s")
+            started = time.perf_counter()
+            rebuild_order_search(db)
+            logger.info(f"Rebuilt the search index in {time.perf_counter() - started:.1f}s")
+
+        for search, sort_by in [("S-4242", None), ("Tailor 17", None), ("school 42 navy", None),
+                                ("pleated", None), ("pleated", "newest"), ("4242", None)]:
+            timings = []
+            for _ in range(args.repeat):
+                db.expire_all()
+                started = time.perf_counter()
+                page = list_orders(response=Response(), search=search, sort_by=sort_by, status=None,
+                                   school_id=None, limit=50, cursor=None, include_total=False, db=db)
+                timings.append((time.perf_counter() - started) * 1000)
+            logger.info(f"{search!r:<18} sort={sort_by or 'relevance':<10} {len(page):>3} rows  "
+                        f"median {statistics.median(timings):6.1f} ms  max {max(timings):6.1f} ms")
+        db.close()
+        db_engine.dispose()
+
+if __name__ == "__main__":
+    main()
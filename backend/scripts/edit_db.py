@@ -61,5 +61,24 @@ def main():
     except Exception as e:
         print(f"An error occurred: {e}")
 
+    # Manual edits bypass the API, so bring counters and statuses back in line
+    print("Repairing order counters and statuses...")
+    from rebuild_order_counters import main as repair_orders
+    repair_orders()
+
+    # The catalog, schools or tailors may have been edited too: new versions make
+    # servers rebuild their snapshots and cached responses
+    from app.database import SessionLocal
+    from app.utils.cache_utils import SCHOOLS_VERSION_KEY, TAILORS_VERSION_KEY, bump_data_version
+    from app.utils.catalog_utils import bump_catalog_version
+    db = SessionLocal()
+    try:
+        bump_catalog_version(db)
+        bump_data_version(db, SCHOOLS_VERSION_KEY)
+        bump_data_version(db, TAILORS_VERSION_KEY)
+        db.commit()
+    finally:
+        db.close()
+
 if __name__ == "__main__":
     main()
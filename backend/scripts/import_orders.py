@@ -0,0 +1,45 @@
+import argparse
+import sys
+import os
+import logging
+
+# Allow running as `python scripts/import_orders.py` from backend/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import SessionLocal
+from app.utils.import_utils import process_order_file, process_order_json
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def import_orders(file_path: str):
+    db = SessionLocal()
+    try:
+        with open(file_path, 'rb') as f:
+            if file_path.endswith('.json'):
+                result = process_order_json(f, db)
+            else:
+                result = process_order_file(f, db, file_path)
+
+        logger.info("Import Completed.")
+        logger.info(f"Orders Created: {result['orders_created']}")
+        logger.info(f"Order Lines Created: {result['lines_created']}")
+        logger.info(f"Rows Skipped: {result['rows_skipped']}")
+        for err in result["errors"]:
+            logger.warning(f"Row {err['row']}: {err['error']}")
+    except ValueError as e:
+        logger.error(str(e))
+        sys.exit(1)
+    except Exception as e:
+        logger.error(f"Error during import: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Import Orders from CSV/Excel/JSON')
+    parser.add_argument('file', help='Path to the CSV or Excel file, or a JSON array of rows as /orders/bulk takes')
+    
+    args = parser.parse_args()
+    import_orders(args.file)
@@ -0,0 +1,33 @@
+import sys
+import os
+import logging
+
+# Allow running as `python scripts/rebuild_order_counters.py` from backend/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import SessionLocal
+from app.utils.order_utils import rebuild_delivery_counters, recompute_statuses
+from app.utils.dashboard_utils import rebuild_dashboard_rollups
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def main():
+    """Repairs delivered counters, then order statuses, then dashboard rollups, after manual database edits."""
+    db = SessionLocal()
+    try:
+        stats = rebuild_delivery_counters(db)
+        logger.info(f"Order lines fixed: {stats['lines_fixed']}")
+        logger.info(f"Orders fixed: {stats['orders_fixed']}")
+        statuses_fixed = recompute_statuses(db)
+        logger.info(f"Order statuses fixed: {statuses_fixed}")
+        rollup_rows = rebuild_dashboard_rollups(db)
+        logger.info(f"Dashboard rollup rows rebuilt: {rollup_rows}")
+    except Exception as e:
+        logger.error(f"Error repairing orders: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
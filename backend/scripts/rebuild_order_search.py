@@ -0,0 +1,27 @@
+import sys
+import os
+import logging
+
+# Allow running as `python scripts/rebuild_order_search.py` from backend/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import SessionLocal
+from app.utils.search_utils import rebuild_order_search
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def main():
+    """Recreates the order search index from the orders and their lines."""
+    db = SessionLocal()
+    try:
+        indexed = rebuild_order_search(db)
+        logger.info(f"Orders indexed for search: {indexed}")
+    except Exception as e:
+        logger.error(f"Error rebuilding order search: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,16 @@
 import sqlite3
 import os
+import sys
 
-# Database file name - assumed to be in the current working directory (backend/)
-DB_FILE = "tailor_tally.db"
+# Allow running as `python scripts/update_schema.py` from backend/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.engine import make_url
+
+# The app's database: SQLALCHEMY_DATABASE_URL's file when set (docker-compose.prod.yml keeps
+# it in data/), else tailor_tally.db in the current working directory (backend/)
+DB_FILE = (make_url(os.environ["SQLALCHEMY_DATABASE_URL"]).database
+           if os.environ.get("SQLALCHEMY_DATABASE_URL") else "tailor_tally.db")
 
 def add_column_if_not_exists(cursor, table, column, definition):
     try:
@@ -25,6 +33,52 @@ def add_column_if_not_exists(cursor, table, column, definition):
     # print(f"Column '{column}' already exists in '{table}'.")
     return False
 
+# Secondary indexes declared on the models: (name, table, columns)
+INDEXES = [
+    ("ix_sizes_product_id", "sizes", "product_id"),
+    ("ix_material_rules_size_id_fabric_width_inches", "material_rules", "size_id, fabric_width_inches"),
+    ("ix_orders_created_at", "orders", "created_at"),
+    ("ix_orders_status_created_at", "orders", "status, created_at"),
+    ("ix_orders_tailor_id_created_at", "orders", "tailor_id, created_at"),
+    ("ix_order_lines_order_id", "order_lines", "order_id"),
+    ("ix_order_lines_product_id", "order_lines", "product_id"),
+    ("ix_order_lines_school_id", "order_lines", "school_id"),
+    ("ix_order_lines_size_id_fabric_width_inches", "order_lines", "size_id, fabric_width_inches"),
+    ("ix_deliveries_order_line_id", "deliveries", "order_line_id"),
+    ("ix_email_outbox_status_next_attempt_at", "email_outbox", "status, next_attempt_at"),
+    ("ix_idempotency_keys_created_at", "idempotency_keys", "created_at"),
+    ("ix_master_data_previews_created_at", "master_data_previews", "created_at"),
+]
+
+def create_indexes_if_not_exist(cursor):
+    """Each index is built in its own short write transaction; readers are not blocked in WAL mode."""
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='index'")
+    existing = {row[0] for row in cursor.fetchall()}
+    created = 0
+    for name, table, columns in INDEXES:
+        if name in existing:
+            continue
+        print(f"Creating index '{name}' on {table} ({columns})...")
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+        cursor.connection.commit()
+        created += 1
+    if created:
+        # Refresh the planner statistics the new indexes rely on
+        cursor.execute("PRAGMA optimize")
+    return created
+
+def create_table_if_not_exists(cursor, table, definition):
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table,))
+    if cursor.fetchone():
+        return False
+    print(f"Creating table '{table}'...")
+    cursor.execute(f"CREATE TABLE {table} ({definition})")
+    return True
+
+def count_rows(cursor, table):
+    cursor.execute(f"SELECT COUNT(*) FROM {table}")
+    return cursor.fetchone()[0]
+
 def main():
     if not os.path.exists(DB_FILE):
         print(f"Database file '{DB_FILE}' not found. Skipping schema update.")
@@ -37,7 +91,8 @@ def main():
     print(f"Checking for schema updates in: {DB_FILE}")
     
     try:
-        conn = sqlite3.connect(DB_FILE)
+        # Wait for a running server's writes instead of failing with "database is locked"
+        conn = sqlite3.connect(DB_FILE, timeout=30)
         cursor = conn.cursor()
 
         # 1. orders: given_cloth (Float)
@@ -55,8 +110,100 @@ def main():
         # 4. order_lines: group_id (String)
         add_column_if_not_exists(cursor, "order_lines", "group_id", "VARCHAR")
 
+        # 5. Stored delivery counters (backfilled from deliveries when first added)
+        if add_column_if_not_exists(cursor, "order_lines", "delivered_qty", "INTEGER NOT NULL DEFAULT 0"):
+            cursor.execute(
+                "UPDATE order_lines SET delivered_qty = COALESCE("
+                "(SELECT SUM(quantity_delivered) FROM deliveries WHERE order_line_id = order_lines.id), 0)"
+            )
+        if add_column_if_not_exists(cursor, "orders", "delivered_qty", "INTEGER NOT NULL DEFAULT 0"):
+            cursor.execute(
+                "UPDATE orders SET delivered_qty = COALESCE("
+                "(SELECT SUM(delivered_qty) FROM order_lines WHERE order_id = orders.id), 0)"
+            )
+
+        # 6. Dashboard rollups (filled from the existing orders below)
+        create_table_if_not_exists(
+            cursor, "dashboard_rollups",
+            "metric VARCHAR NOT NULL, ref_id INTEGER NOT NULL, value FLOAT NOT NULL DEFAULT 0, "
+            "PRIMARY KEY (metric, ref_id)"
+        )
+
+        # 7. Daily dashboard rollups
+        create_table_if_not_exists(
+            cursor, "dashboard_daily",
+            "day DATE NOT NULL, tailor_id INTEGER NOT NULL, school_id INTEGER NOT NULL, "
+            "product_id INTEGER NOT NULL, quantity_ordered INTEGER NOT NULL DEFAULT 0, "
+            "material_issued FLOAT NOT NULL DEFAULT 0, pieces_delivered INTEGER NOT NULL DEFAULT 0, "
+            "material_work_done FLOAT NOT NULL DEFAULT 0, orders_created INTEGER NOT NULL DEFAULT 0, "
+            "orders_active INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (day, tailor_id, school_id, product_id)"
+        )
+
+        # 7b. Email outbox drained by the background worker
+        create_table_if_not_exists(
+            cursor, "email_outbox",
+            "id INTEGER NOT NULL PRIMARY KEY, kind VARCHAR NOT NULL, recipient VARCHAR NOT NULL, "
+            "order_id INTEGER, tailor_id INTEGER, status VARCHAR NOT NULL DEFAULT 'pending', attempts INTEGER NOT NULL DEFAULT 0, "
+            "next_attempt_at DATETIME NOT NULL, last_error VARCHAR, subject VARCHAR, body VARCHAR, "
+            "created_at DATETIME, sent_at DATETIME"
+        )
+
+        # 7c. Daily digest emails per tailor
+        add_column_if_not_exists(cursor, "tailors", "email_digest", "BOOLEAN NOT NULL DEFAULT 0")
+        add_column_if_not_exists(cursor, "email_outbox", "tailor_id", "INTEGER")
+
+        # 7d. Idempotency keys of order and delivery writes
+        create_table_if_not_exists(
+            cursor, "idempotency_keys",
+            "key VARCHAR NOT NULL PRIMARY KEY, request_hash VARCHAR NOT NULL, status_code INTEGER NOT NULL, "
+            "response_body VARCHAR NOT NULL, created_at DATETIME NOT NULL"
+        )
+
+        # 7e. Master data import jobs
+        create_table_if_not_exists(
+            cursor, "import_jobs",
+            "id VARCHAR NOT NULL PRIMARY KEY, filename VARCHAR NOT NULL, status VARCHAR NOT NULL DEFAULT 'queued', "
+            "rows_processed INTEGER NOT NULL DEFAULT 0, stats VARCHAR NOT NULL DEFAULT '{}', "
+            "errors VARCHAR NOT NULL DEFAULT '[]', error VARCHAR, cancel_requested BOOLEAN NOT NULL DEFAULT 0, "
+            "created_at DATETIME NOT NULL, updated_at DATETIME, finished_at DATETIME"
+        )
+        add_column_if_not_exists(cursor, "import_jobs", "updated_at", "DATETIME")
+
+        # 7f. Dry-run master data previews waiting for confirmation
+        create_table_if_not_exists(
+            cursor, "master_data_previews",
+            "id VARCHAR NOT NULL PRIMARY KEY, changes VARCHAR NOT NULL, created_at DATETIME NOT NULL"
+        )
+
+        conn.commit()
+
+        # 8. Indexes on hot foreign keys and filters
+        create_indexes_if_not_exist(cursor)
+
+        # 9. Order full-text search: FTS5 table and the triggers keeping it in step
+        from app.models import ORDER_SEARCH_DDL
+        for statement in ORDER_SEARCH_DDL:
+            cursor.execute(statement)
         conn.commit()
+
+        # 10. Backfills. The app's create_all makes these tables empty before this script
+        # runs, so check their contents rather than whether this run created them.
+        orders = count_rows(cursor, "orders")
+        search_missing = count_rows(cursor, "order_search") < orders
+        rollups_missing = orders > 0 and (
+            count_rows(cursor, "dashboard_rollups") == 0 or count_rows(cursor, "dashboard_daily") == 0
+        )
         conn.close()
+
+        if search_missing:
+            print("Rebuilding order search index...")
+            from rebuild_order_search import main as rebuild_search
+            rebuild_search()
+
+        if rollups_missing:
+            print("Backfilling dashboard rollups...")
+            from rebuild_order_counters import main as repair_orders
+            repair_orders()
         print("Schema check/update completed.")
         
     except Exception as e:
@@ -1,23 +1,25 @@
 import pytest
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import event
 from sqlalchemy.orm import sessionmaker
 from fastapi.testclient import TestClient
 
 # Import app components 
 from app.main import app
-from app.database import Base, get_db
+from app.database import Base, create_db_engine, get_db
 from app.seed import db_seed
 from app import models
+from app.utils.cache_utils import clear_response_cache
+from app.utils.catalog_utils import clear_catalog_cache
+from app.utils.rule_utils import clear_rule_index
+from app.utils.security import clear_admin_password_cache
 
 # Test DB URL
 BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 TEST_DATABASE_PATH = os.path.join(BACKEND_DIR, 'test.db')
 TEST_DATABASE_URL = f"sqlite:///{TEST_DATABASE_PATH}"
 
-engine = create_engine(
-    TEST_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+engine = create_db_engine(TEST_DATABASE_URL)
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 @pytest.fixture(scope="session", autouse=True)
@@ -41,11 +43,14 @@ def setup_test_db():
         
     yield
     
-    if os.path.exists(TEST_DATABASE_PATH):
-        try:
-            os.remove(TEST_DATABASE_PATH)
-        except:
-            pass
+    engine.dispose()
+    # WAL mode leaves -wal/-shm files next to the database while connections are open
+    for path in (TEST_DATABASE_PATH, TEST_DATABASE_PATH + "-wal", TEST_DATABASE_PATH + "-shm"):
+        if os.path.exists(path):
+            try:
+                os.remove(path)
+            except:
+                pass
 
 @pytest.fixture(scope="function")
 def db():
@@ -65,6 +70,11 @@ def db():
     session.close()
     transaction.rollback()
     connection.close()
+    # In-process caches may hold data from the rolled back transaction
+    clear_catalog_cache()
+    clear_rule_index()
+    clear_response_cache()
+    clear_admin_password_cache()
 
 @pytest.fixture(scope="function")
 def client(db):
@@ -74,3 +84,26 @@ def client(db):
     app.dependency_overrides[get_db] = override_get_db
     yield TestClient(app, raise_server_exceptions=False)
     app.dependency_overrides.clear()
+
+@pytest.fixture(scope="function")
+def query_counter():
+    """
+    Counts SQL statements sent to the test engine.
+    Usage: `with query_counter() as queries: ...` then `len(queries)`.
+    """
+    from contextlib import contextmanager
+
+    @contextmanager
+    def counter():
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    return counter
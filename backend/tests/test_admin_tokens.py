@@ -0,0 +1,77 @@
+import base64
+import hashlib
+import hmac
+import time
+
+from app.utils import security
+
+def _order(client):
+    products = client.get("/master-data/products").json()
+    tailor_id = client.get("/master-data/tailors").json()[0]["id"]
+    response = client.post("/orders/", json={
+        "tailor_id": tailor_id,
+        "order_lines": [{"product_id": products[0]["id"], "size_id": products[0]["sizes"][0]["id"], "quantity": 2}]
+    })
+    assert response.status_code == 200
+    return response.json()
+
+def _token(client, password="admin"):
+    body = client.post("/admin/verify-password", json={"password": password}).json()
+    return body["token"] if body["valid"] else None
+
+def test_verify_password_issues_token(client):
+    body = client.post("/admin/verify-password", json={"password": "admin"}).json()
+    assert body["valid"] and body["token"] and body["expires_at"]
+    assert client.post("/admin/verify-password", json={"password": "wrong"}).json() == {
+        "valid": False, "token": None, "expires_at": None
+    }
+
+def test_admin_token_authorizes_edits(client, monkeypatch):
+    order = _order(client)
+    token = _token(client)
+
+    # Tokens are checked without bcrypt
+    def no_bcrypt(*args):
+        raise AssertionError("bcrypt called")
+    monkeypatch.setattr(security, "verify_password", no_bcrypt)
+
+    response = client.put(f"/orders/{order['id']}", json={"notes": "edited"}, headers={"X-Admin-Token": token})
+    assert response.status_code == 200
+    assert response.json()["notes"] == "edited"
+
+    response = client.put(f"/orders/{order['id']}", json={"notes": "x"}, headers={"X-Admin-Token": token + "x"})
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Invalid or expired admin token"
+
+    response = client.delete(f"/orders/{order['id']}", headers={"X-Admin-Token": token})
+    assert response.status_code == 200
+
+def test_admin_token_expires(client, db):
+    order = _order(client)
+    expired, _ = security.create_admin_token(security.get_admin_password_hash(db), ttl_seconds=-1)
+    response = client.delete(f"/orders/{order['id']}", headers={"X-Admin-Token": expired})
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Invalid or expired admin token"
+
+def test_password_change_revokes_tokens(client, db):
+    order = _order(client)
+    token = _token(client)
+    response = client.post("/admin/change-password", json={"current_password": "admin", "new_password": "s3cret"})
+    assert response.status_code == 200
+
+    response = client.delete(f"/orders/{order['id']}", headers={"X-Admin-Token": token})
+    assert response.status_code == 401
+    assert _token(client, "admin") is None
+    response = client.delete(f"/orders/{order['id']}", headers={"X-Admin-Token": _token(client, "s3cret")})
+    assert response.status_code == 200
+
+def test_token_cannot_be_minted_from_the_password_hash_alone(client, db):
+    order = _order(client)
+    password_hash = security.get_admin_password_hash(db)
+    expires = int(time.time()) + 60
+    # What anyone reading the database could sign without the server secret
+    key = hashlib.sha256(f":{password_hash}".encode("utf-8")).digest()
+    digest = hmac.new(key, str(expires).encode("ascii"), hashlib.sha256).digest()
+    forged = f"{expires}.{base64.urlsafe_b64encode(digest).decode('ascii').rstrip('=')}"
+    response = client.delete(f"/orders/{order['id']}", headers={"X-Admin-Token": forged})
+    assert response.status_code == 401
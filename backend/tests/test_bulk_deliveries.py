@@ -0,0 +1,97 @@
+import pytest
+from app import models
+from app.utils.dashboard_utils import rebuild_dashboard_rollups
+
+def _order(client, db, quantities=(5, 3, 2)):
+    products = client.get("/master-data/products").json()
+    sizes = products[0]["sizes"]
+    response = client.post("/orders/", json={
+        "tailor_id": db.query(models.Tailor).first().id,
+        "order_lines": [
+            {"product_id": products[0]["id"], "size_id": sizes[i % len(sizes)]["id"], "quantity": q}
+            for i, q in enumerate(quantities)
+        ],
+    })
+    assert response.status_code == 200
+    return response.json()
+
+def _dashboard(client):
+    return client.get("/dashboard/stats").json()
+
+def test_deliver_entries_in_one_request(client, db):
+    order = _order(client, db)
+    lines = order["order_lines"]
+    before = _dashboard(client)
+    response = client.post(f"/orders/{order['id']}/deliveries", json={"entries": [
+        {"line_id": lines[0]["id"], "quantity": 2},
+        {"line_id": lines[0]["id"], "quantity": 1},
+        {"line_id": lines[1]["id"], "quantity": 3},
+    ]})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] == "In Progress"
+    delivered = {l["id"]: (l["delivered_qty"], len(l["deliveries"])) for l in body["order_lines"]}
+    assert delivered == {lines[0]["id"]: (3, 1), lines[1]["id"]: (3, 1), lines[2]["id"]: (0, 0)}
+
+    work_done = 3 * lines[0]["material_req_per_unit"] + 3 * lines[1]["material_req_per_unit"]
+    assert _dashboard(client)["material_work_done"] == pytest.approx(before["material_work_done"] + work_done)
+
+def test_deliver_all_pending_completes_the_order(client, db, query_counter):
+    order = _order(client, db, quantities=tuple(range(1, 51)))
+    client.post(f"/orders/{order['id']}/deliveries", json={"entries": [{"line_id": order["order_lines"][0]["id"], "quantity": 1}]})
+
+    with query_counter() as queries:
+        response = client.post(f"/orders/{order['id']}/deliveries", json={"deliver_all_pending": True})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] == "Completed"
+    assert all(l["pending_qty"] == 0 for l in body["order_lines"])
+    # One delivery per line that still had pieces pending, in one INSERT
+    assert sum(len(l["deliveries"]) for l in body["order_lines"]) == 50
+    assert len([q for q in queries if q.startswith("INSERT INTO deliveries")]) == 1
+    fifty_lines = len(queries)
+
+    small = _order(client, db, quantities=(1, 2))
+    with query_counter() as queries:
+        client.post(f"/orders/{small['id']}/deliveries", json={"deliver_all_pending": True})
+    assert len(queries) == fifty_lines
+
+def test_bulk_delivery_is_validated_before_writing(client, db):
+    order = _order(client, db)
+    other = _order(client, db)
+    lines = order["order_lines"]
+    cases = [
+        ({"entries": [{"line_id": lines[0]["id"], "quantity": 4}, {"line_id": lines[0]["id"], "quantity": 2}]}, 400),
+        ({"entries": [{"line_id": other["order_lines"][0]["id"], "quantity": 1}]}, 400),
+        ({"entries": [{"line_id": lines[0]["id"], "quantity": 0}]}, 422),
+        ({}, 400),
+        ({"entries": [{"line_id": lines[0]["id"], "quantity": 1}], "deliver_all_pending": True}, 400),
+    ]
+    for payload, status in cases:
+        assert client.post(f"/orders/{order['id']}/deliveries", json=payload).status_code == status
+    assert client.post("/orders/999999/deliveries", json={"deliver_all_pending": True}).status_code == 404
+
+    body = client.get(f"/orders/{order['id']}").json()
+    assert body["status"] == "Pending"
+    assert all(l["delivered_qty"] == 0 for l in body["order_lines"])
+
+def test_bulk_delivery_rollups_match_rebuild(client, db):
+    order = _order(client, db)
+    lines = order["order_lines"]
+    client.post(f"/orders/{order['id']}/deliveries", json={
+        "entries": [{"line_id": lines[0]["id"], "quantity": 5}], "date_delivered": "2026-02-01T10:00:00"
+    })
+    client.post(f"/orders/{order['id']}/deliveries", json={"deliver_all_pending": True, "date_delivered": "2026-02-03T10:00:00"})
+
+    def snapshot():
+        db.expire_all()
+        daily = {
+            (r.day, r.tailor_id, r.school_id, r.product_id): (r.pieces_delivered, round(r.material_work_done, 6), r.orders_active)
+            for r in db.query(models.DashboardDaily)
+            if r.pieces_delivered or r.material_work_done or r.orders_active
+        }
+        return daily, client.get("/dashboard/stats").json()
+
+    incremental = snapshot()
+    rebuild_dashboard_rollups(db)
+    assert snapshot() == incremental
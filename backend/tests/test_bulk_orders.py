@@ -0,0 +1,121 @@
+import io
+import json
+import pandas as pd
+import pytest
+from app import models
+from app.utils.import_utils import process_order_json
+from app.utils.rule_utils import get_rule_index
+
+
+def _rows():
+    return [
+        {"tailor": "Ramesh", "school": "Oxford School", "product": "Blazer", "size": "24",
+         "fabric_width_inches": 36, "quantity": 10, "slip_no": "S-1"},
+        {"tailor": "ramesh", "school": "Oxford School", "product": "blazer", "size": "26",
+         "fabric_width_inches": 60, "quantity": 5, "slip_no": "S-1"},
+        {"tailor": "Suresh", "product": "Neckar", "size": 12, "quantity": 3, "slip_no": "S-2"},
+    ]
+
+
+def test_bulk_create_groups_rows_into_orders(client, db):
+    response = client.post("/orders/bulk", json=_rows())
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert result == {"orders_created": 2, "lines_created": 3, "rows_skipped": 0, "errors": []}
+
+    order = db.query(models.Order).filter(models.Order.slip_no == "S-1").one()
+    assert order.tailor.name == "Ramesh"
+    assert len(order.order_lines) == 2
+    line = next(l for l in order.order_lines if l.size.label == "24")
+    rule = next(r for r in line.size.material_rules if r.fabric_width_inches == 36)
+    assert line.school.name == "Oxford School"
+    assert line.total_material_req == rule.length_required * 10
+    assert line.delivered_qty == 0
+
+
+def test_bulk_create_reports_bad_rows_and_skips_their_order(client, db):
+    rows = _rows()
+    rows[1]["size"] = "999"
+    rows.append({"tailor": "Nobody", "product": "Blazer", "size": "24", "quantity": 1})
+
+    orders_before = db.query(models.Order).count()
+    result = client.post("/orders/bulk", json=rows).json()
+
+    assert result["orders_created"] == 1 # Only Suresh's order is clean
+    assert result["rows_skipped"] == 3
+    errors = {e["row"]: e["error"] for e in result["errors"]}
+    assert "Skipped" in errors[1]
+    assert "Unknown size '999'" in errors[2]
+    assert "Unknown tailor 'Nobody'" in errors[4]
+    assert db.query(models.Order).count() == orders_before + 1
+
+
+def test_bulk_upload_csv(client, db):
+    # Title row above the header, like the master data sheets
+    csv = (
+        "Season orders,,,,,\n"
+        "Tailor,School,Product,Size,Quantity,Slip No\n"
+        "Ganesh,Loyola School,Pant,34 L / 26 W,4,U-1\n"
+        "Ganesh,Loyola School,Pant,34 L / 28 W,0,U-1\n"
+        ",,,,,\n"
+        "Mahesh,,Full Shirt,22,2,U-2\n"
+    )
+    files = {"file": ("orders.csv", csv.encode(), "text/csv")}
+    result = client.post("/orders/bulk/upload", files=files).json()
+
+    # Row 4 has quantity 0, so the whole U-1 order (rows 3 and 4) is skipped
+    assert result["orders_created"] == 1
+    assert result["lines_created"] == 1
+    assert result["rows_skipped"] == 2
+    errors = {e["row"]: e["error"] for e in result["errors"]}
+    assert sorted(errors) == [3, 4]
+    assert "quantity" in errors[4]
+
+
+def test_bulk_upload_excel_numeric_sizes(client, db):
+    buffer = io.BytesIO()
+    pd.DataFrame([
+        {"Tailor": "Ramesh", "Product": "Neckar", "Size": 11, "Quantity": 7},
+        {"Tailor": "Ramesh", "Product": "Neckar", "Size": 12, "Quantity": 3},
+    ]).to_excel(buffer, index=False)
+    files = {"file": ("orders.xlsx", buffer.getvalue(), "application/octet-stream")}
+    result = client.post("/orders/bulk/upload", files=files).json()
+
+    assert result["errors"] == []
+    assert result["orders_created"] == 1
+    assert result["lines_created"] == 2
+
+
+def test_bulk_upload_missing_columns(client):
+    files = {"file": ("orders.csv", b"Tailor,Product\nRamesh,Blazer\n", "text/csv")}
+    response = client.post("/orders/bulk/upload", files=files)
+    assert response.status_code == 400
+    assert "Missing columns" in response.json()["detail"]
+
+
+def test_bulk_create_query_count_is_constant(client, db, query_counter):
+    get_rule_index(db) # loaded once, then shared by every import
+    with query_counter() as small_queries:
+        client.post("/orders/bulk", json=_rows())
+    with query_counter() as large_queries:
+        rows = [dict(r, slip_no=f"{r['slip_no']}-{i}") for i in range(50) for r in _rows()]
+        result = client.post("/orders/bulk", json=rows).json()
+    assert result["orders_created"] == 100
+    assert len(large_queries) == len(small_queries)
+
+
+def test_json_file_import(db):
+    rows = _rows()
+    rows[2]["quantity"] = 0
+    rows.append("not a row")
+    result = process_order_json(io.BytesIO(json.dumps(rows).encode()), db)
+
+    assert result["orders_created"] == 1
+    assert result["lines_created"] == 2
+    errors = {e["row"]: e["error"] for e in result["errors"]}
+    assert "quantity" in errors[3]
+    assert errors[4] == "Expected an object"
+    assert db.query(models.Order).filter(models.Order.slip_no == "S-1").count() == 1
+
+    with pytest.raises(ValueError, match="JSON array"):
+        process_order_json(io.BytesIO(b'{"tailor": "Ramesh"}'), db)
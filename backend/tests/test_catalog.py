@@ -0,0 +1,126 @@
+from app import models
+from app.utils.catalog_utils import bump_catalog_version, get_catalog_version
+
+
+def _catalog(client, etag=None):
+    headers = {"If-None-Match": etag} if etag else {}
+    return client.get("/master-data/catalog", headers=headers)
+
+
+def test_catalog_matches_products_with_sorted_sizes(client, db):
+    response = _catalog(client)
+    assert response.status_code == 200
+    assert response.headers["ETag"]
+    catalog = response.json()
+
+    products = db.query(models.Product).order_by(models.Product.name).all()
+    assert [p["name"] for p in catalog] == [p.name for p in products]
+    blazer = next(p for p in catalog if p["name"] == "Blazer")
+    assert [s["order_index"] for s in blazer["sizes"]] == sorted(s["order_index"] for s in blazer["sizes"])
+    assert {r["fabric_width_inches"] for r in blazer["sizes"][0]["material_rules"]} == {36, 60}
+
+
+def test_unchanged_catalog_is_not_modified(client, db, query_counter):
+    etag = _catalog(client).headers["ETag"]
+
+    with query_counter() as queries:
+        response = _catalog(client, etag)
+    assert response.status_code == 304
+    assert response.content == b""
+    assert len(queries) == 1 # the version lookup only
+
+    assert _catalog(client, f'W/{etag}, "other"').status_code == 304
+    assert _catalog(client, '"stale"').status_code == 200
+
+
+def test_catalog_mutations_bump_version(client, db):
+    etag = _catalog(client).headers["ETag"]
+    version = get_catalog_version(db)
+
+    product = client.post("/master-data/products", json={"name": "Catalog Product"}).json()
+    assert get_catalog_version(db) == version + 1
+    response = _catalog(client, etag)
+    assert response.status_code == 200
+    assert "Catalog Product" in [p["name"] for p in response.json()]
+    etag = response.headers["ETag"]
+
+    size = client.post(f"/master-data/products/{product['id']}/sizes", json={"label": "XL"}).json()
+    rule = client.post(f"/master-data/sizes/{size['id']}/rules", json={"length_required": 2.0}).json()
+    client.put(f"/master-data/rules/{rule['id']}", json={"length_required": 2.5})
+    client.delete(f"/master-data/rules/{rule['id']}")
+    client.delete(f"/master-data/sizes/{size['id']}")
+    client.delete(f"/master-data/products/{product['id']}")
+    assert get_catalog_version(db) == version + 7
+    assert _catalog(client, etag).status_code == 200
+
+
+def test_import_bumps_version_only_when_something_changed(client, db):
+    from app.utils.import_jobs import wait_for_import_job
+
+    def upload(content):
+        files = {"file": ("master.csv", content.encode(), "text/csv")}
+        job_id = client.post("/master-data/upload", files=files).json()["job_id"]
+        assert wait_for_import_job(job_id, timeout=30)["status"] == "completed"
+
+    header = "Product Name,Category,Size Label,Size Order Index,Fabric Width (Inches),Length Required,Unit\n"
+    version = get_catalog_version(db)
+    upload(header + "Neckar,General,11,0,36,2.5,meters\n")
+    assert get_catalog_version(db) == version + 1
+    upload(header + "Neckar,General,11,0,36,2.5,meters\n")
+    assert get_catalog_version(db) == version + 1
+
+
+def test_confirm_rejects_preview_after_catalog_edit(client, db):
+    header = "Product Name,Category,Size Label,Size Order Index,Fabric Width (Inches),Length Required,Unit\n"
+    preview = client.post(
+        "/master-data/upload?dry_run=true",
+        files={"file": ("master.csv", (header + "Neckar,General,11,0,36,2.5,meters\n").encode(), "text/csv")}
+    ).json()
+    neckar = db.query(models.Product).filter(models.Product.name == "Neckar").one()
+    client.put(f"/master-data/products/{neckar.id}", json={"name": "Neckar", "category": "Ties"})
+
+    assert client.post(f"/master-data/upload/confirm/{preview['preview_id']}").status_code == 409
+
+
+def _add_products(db, count, sizes=6):
+    for p in range(count):
+        product = models.Product(name=f"Bench Product {db.query(models.Product).count()}-{p}")
+        for s in range(sizes):
+            size = models.Size(label=str(s), order_index=sizes - s)
+            size.material_rules = [
+                models.MaterialRule(fabric_width_inches=36, length_required=1.0, unit="meters"),
+                models.MaterialRule(fabric_width_inches=60, length_required=0.8, unit="meters"),
+            ]
+            product.sizes.append(size)
+        db.add(product)
+    bump_catalog_version(db)
+    db.commit()
+
+
+def test_read_products_query_count_is_flat(client, db, query_counter):
+    with query_counter() as small_queries:
+        small = client.get("/master-data/products").json()
+    _add_products(db, 120)
+    db.expire_all()
+    with query_counter() as large_queries:
+        large = client.get("/master-data/products").json()
+
+    # No silent cap: the whole catalog comes back
+    assert len(large) == len(small) + 120 == db.query(models.Product).count()
+    # Data version check + products, sizes, rules
+    assert len(large_queries) == len(small_queries) <= 4
+
+    bench = next(p for p in large if p["name"].startswith("Bench Product"))
+    assert [s["order_index"] for s in bench["sizes"]] == [1, 2, 3, 4, 5, 6]
+    assert all(len(s["material_rules"]) == 2 for s in bench["sizes"])
+
+
+def test_read_products_paging(client, db):
+    total = db.query(models.Product).count()
+    first = client.get("/master-data/products?limit=10")
+    assert first.headers["X-Total-Count"] == str(total)
+    second = client.get("/master-data/products?skip=10&limit=10").json()
+    names = [p["name"] for p in first.json() + second]
+    assert len(set(names)) == 20
+    assert names == sorted(names)
+    assert client.get("/master-data/products?limit=0").status_code == 422
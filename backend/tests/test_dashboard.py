@@ -0,0 +1,224 @@
+import pytest
+
+from app import models
+from app.utils.dashboard_utils import rebuild_dashboard_rollups
+
+ADMIN = {"X-Admin-Password": "admin"}
+
+
+def _stats(client):
+    response = client.get("/dashboard/stats")
+    assert response.status_code == 200
+    return response.json()
+
+
+def _full_scan_stats(db):
+    """The figures as the dashboard used to compute them, straight from the raw tables."""
+    from sqlalchemy import func
+    issued = db.query(func.sum(models.OrderLine.total_material_req)).scalar() or 0.0
+    done = db.query(
+        func.sum(models.Delivery.quantity_delivered * models.OrderLine.material_req_per_unit)
+    ).join(models.OrderLine).scalar() or 0.0
+    return {
+        "active_orders": db.query(models.Order).filter(models.Order.status.in_(["Pending", "In Progress"])).count(),
+        "material_issued": round(issued, 2),
+        "material_work_done": round(done, 2),
+        "material_work_pending": round(issued - done, 2),
+    }
+
+
+def _sizes(db, count):
+    return db.query(models.Size).filter(models.Size.material_rules.any()).limit(count).all()
+
+
+def _create_order(client, db, tailor, sizes, quantity=4):
+    response = client.post("/orders/", json={
+        "tailor_id": tailor.id,
+        "order_lines": [{"product_id": s.product_id, "size_id": s.id, "quantity": quantity} for s in sizes],
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _check(client, db):
+    stats = _stats(client)
+    assert {k: stats[k] for k in _full_scan_stats(db)} == _full_scan_stats(db)
+    return stats
+
+
+def test_rollups_follow_every_write_path(client, db):
+    tailors = db.query(models.Tailor).order_by(models.Tailor.id).limit(2).all()
+    sizes = _sizes(db, 4)
+    first = _create_order(client, db, tailors[0], sizes[:3])
+    second = _create_order(client, db, tailors[1], sizes[2:], quantity=2)
+    stats = _check(client, db)
+    assert stats["active_orders"] == 2
+
+    # Deliveries, including one that completes a line, then undo one
+    line = first["order_lines"][0]
+    client.post(f"/orders/lines/{line['id']}/deliveries", json={"quantity_delivered": 4})
+    other = first["order_lines"][1]
+    delivery = client.post(f"/orders/lines/{other['id']}/deliveries", json={"quantity_delivered": 1}).json()
+    _check(client, db)
+    client.delete(f"/orders/deliveries/{delivery['id']}", headers=ADMIN)
+    _check(client, db)
+
+    # Complete the second order: it drops out of the active count
+    for line in second["order_lines"]:
+        client.post(f"/orders/lines/{line['id']}/deliveries", json={"quantity_delivered": 2})
+    assert _check(client, db)["active_orders"] == 1
+
+    # Line edits, repricing, tailor moves and deletes
+    client.put(f"/orders/lines/{first['order_lines'][0]['id']}", json={"quantity": 9}, headers=ADMIN)
+    client.put(f"/orders/lines/{first['order_lines'][2]['id']}", json={"fabric_width_inches": 60}, headers=ADMIN)
+    _check(client, db)
+    client.put(f"/orders/{first['id']}", json={"tailor_id": tailors[1].id}, headers=ADMIN)
+    stats = _check(client, db)
+    assert stats["top_tailors"] == [{"name": tailors[1].name, "order_count": 2}]
+    client.delete(f"/orders/lines/{first['order_lines'][0]['id']}", headers=ADMIN)
+    _check(client, db)
+    client.delete(f"/orders/{second['id']}", headers=ADMIN)
+    stats = _check(client, db)
+    assert stats["active_orders"] == 1
+
+    # The incremental totals match a full rebuild
+    db.expire_all()
+    before = _stats(client)
+    rebuild_dashboard_rollups(db)
+    assert _stats(client) == before
+
+
+def test_bulk_import_updates_rollups(client, db):
+    size = _sizes(db, 1)[0]
+    product = db.query(models.Product).get(size.product_id)
+    tailor = db.query(models.Tailor).first()
+    rows = [
+        {"tailor": tailor.name, "product": product.name, "size": size.label, "quantity": 3, "slip_no": f"S{i}"}
+        for i in range(5)
+    ]
+    assert client.post("/orders/bulk", json=rows).json()["orders_created"] == 5
+    stats = _check(client, db)
+    assert stats["active_orders"] == 5
+    assert stats["top_products"] == [{"name": product.name, "quantity": 15}]
+
+
+def test_stats_query_count_does_not_grow_with_orders(client, db, query_counter):
+    tailor = db.query(models.Tailor).first()
+    sizes = _sizes(db, 5)
+    _create_order(client, db, tailor, sizes)
+    with query_counter() as small_queries:
+        _stats(client)
+    for _ in range(20):
+        _create_order(client, db, tailor, sizes)
+    with query_counter() as large_queries:
+        _stats(client)
+    # Data version check + totals, top products, top tailors
+    assert len(large_queries) == len(small_queries) == 4
+    assert not any("order_lines" in q or "deliveries" in q for q in large_queries)
+
+
+def _daily_rows(db):
+    daily = models.DashboardDaily
+    columns = ["quantity_ordered", "material_issued", "pieces_delivered", "material_work_done",
+               "orders_created", "orders_active"]
+    rows = {}
+    for row in db.query(daily):
+        values = tuple(round(getattr(row, c), 6) for c in columns)
+        if any(values):
+            rows[(row.day, row.tailor_id, row.school_id, row.product_id)] = values
+    return rows
+
+
+def _windowed_setup(client, db):
+    tailors = db.query(models.Tailor).order_by(models.Tailor.id).limit(2).all()
+    schools = [models.School(name="Window School A"), models.School(name="Window School B")]
+    db.add_all(schools)
+    db.flush()
+    sizes = _sizes(db, 2)
+
+    orders = []
+    for created_at, tailor, school in [
+        ("2026-01-05T10:00:00", tailors[0], schools[0]),   # Monday of week 2
+        ("2026-01-07T10:00:00", tailors[1], schools[1]),
+        ("2026-02-02T10:00:00", tailors[0], schools[1]),
+    ]:
+        response = client.post("/orders/", json={
+            "tailor_id": tailor.id,
+            "created_at": created_at,
+            "order_lines": [
+                {"product_id": s.product_id, "size_id": s.id, "school_id": school.id, "quantity": 3} for s in sizes
+            ],
+        })
+        assert response.status_code == 200, response.text
+        orders.append(response.json())
+
+    line = orders[0]["order_lines"][0]
+    client.post(f"/orders/lines/{line['id']}/deliveries", json={"quantity_delivered": 2, "date_delivered": "2026-01-20T09:00:00"})
+    client.post(f"/orders/lines/{line['id']}/deliveries", json={"quantity_delivered": 1, "date_delivered": "2026-02-03T09:00:00"})
+    return tailors, schools, sizes, orders
+
+
+# Serializing the series must not fall back with a PydanticSerializationUnexpectedValue warning
+@pytest.mark.filterwarnings("error::UserWarning")
+def test_windowed_stats_and_series(client, db):
+    tailors, schools, sizes, orders = _windowed_setup(client, db)
+    per_order = sum(line["total_material_req"] for line in orders[0]["order_lines"])
+    per_unit = orders[0]["order_lines"][0]["material_req_per_unit"]
+
+    january = client.get("/dashboard/stats", params={"from": "2026-01-01", "to": "2026-01-31"}).json()
+    assert january["material_issued"] == round(2 * per_order, 2)
+    assert january["material_work_done"] == round(2 * per_unit, 2)
+    assert january["active_orders"] == 2
+    assert sorted(t["order_count"] for t in january["top_tailors"]) == [1, 1]
+
+    by_tailor = client.get("/dashboard/stats", params={"from": "2026-01-01", "tailor_id": tailors[0].id}).json()
+    assert by_tailor["material_issued"] == round(2 * per_order, 2)
+    assert by_tailor["top_tailors"] == [{"name": tailors[0].name, "order_count": 2}]
+
+    by_school = client.get("/dashboard/stats", params={"from": "2026-01-01", "school_id": schools[1].id}).json()
+    assert by_school["material_issued"] == round(2 * per_order, 2)
+    assert by_school["material_work_done"] == 0
+
+    monthly = client.get("/dashboard/series", params={"granularity": "month", "from": "2026-01-01"}).json()
+    assert [p["period"] for p in monthly] == ["2026-01-01", "2026-02-01"]
+    assert [p["pieces_delivered"] for p in monthly] == [2, 1]
+    assert monthly[1]["material_issued"] == round(per_order, 2)
+
+    weekly = client.get("/dashboard/series", params={"granularity": "week", "from": "2026-01-01", "to": "2026-01-31"}).json()
+    assert [p["period"] for p in weekly] == ["2026-01-05", "2026-01-19"]
+
+    daily = client.get("/dashboard/series", params={"from": "2026-02-01", "tailor_id": tailors[0].id}).json()
+    assert [p["period"] for p in daily] == ["2026-02-02", "2026-02-03"]
+
+    assert client.get("/dashboard/series", params={"granularity": "year"}).status_code == 400
+
+
+def test_daily_rollups_follow_edits(client, db):
+    tailors, schools, sizes, orders = _windowed_setup(client, db)
+
+    # Edits that move figures between days, tailors, schools and products
+    client.put(f"/orders/{orders[0]['id']}", json={"tailor_id": tailors[1].id, "created_at": "2026-01-10T08:00:00"}, headers=ADMIN)
+    client.put(f"/orders/lines/{orders[0]['order_lines'][0]['id']}", json={"quantity": 5, "school_id": schools[1].id}, headers=ADMIN)
+    client.delete(f"/orders/lines/{orders[1]['order_lines'][1]['id']}", headers=ADMIN)
+    client.delete(f"/orders/{orders[2]['id']}", headers=ADMIN)
+    for line in orders[1]["order_lines"][:1]:
+        client.post(f"/orders/lines/{line['id']}/deliveries", json={"quantity_delivered": 3, "date_delivered": "2026-01-25T09:00:00"})
+    rule = db.query(models.MaterialRule).filter(models.MaterialRule.size_id == sizes[0].id).first()
+    assert client.put(f"/master-data/rules/{rule.id}", json={
+        "fabric_width_inches": rule.fabric_width_inches, "length_required": rule.length_required + 1, "unit": rule.unit
+    }, headers=ADMIN).status_code == 200
+    assert client.post("/orders/reprice", json={"scope": "all"}, headers=ADMIN).json()["lines_updated"] > 0
+
+    incremental = _daily_rows(db)
+    rebuild_dashboard_rollups(db)
+    assert _daily_rows(db) == incremental
+
+
+def test_windowed_queries_read_only_daily_rollups(client, db, query_counter):
+    _windowed_setup(client, db)
+    params = {"from": "2026-01-01", "to": "2026-12-31"}
+    with query_counter() as queries:
+        client.get("/dashboard/stats", params=params)
+        client.get("/dashboard/series", params={**params, "granularity": "week"})
+    assert len(queries) == 7
+    assert not any("order_lines" in q or "deliveries" in q for q in queries)
@@ -0,0 +1,62 @@
+import os
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from app.database import create_db_engine
+
+
+def _pragma(connection, name):
+    return connection.execute(text(f"PRAGMA {name}")).scalar()
+
+
+def test_engine_applies_tuning_pragmas(db):
+    connection = db.connection()
+    assert _pragma(connection, "journal_mode") == "wal"
+    assert _pragma(connection, "synchronous") == 1  # NORMAL
+    assert _pragma(connection, "busy_timeout") == 5000
+    assert _pragma(connection, "foreign_keys") == 1
+    assert _pragma(connection, "cache_size") == -20000
+
+
+def test_engine_settings_can_be_overridden(tmp_path):
+    engine = create_db_engine(
+        f"sqlite:///{tmp_path / 'override.db'}", pool_size=2, journal_mode="DELETE",
+        synchronous="FULL", busy_timeout_ms=100
+    )
+    with engine.connect() as connection:
+        assert _pragma(connection, "journal_mode") == "delete"
+        assert _pragma(connection, "synchronous") == 2
+        assert _pragma(connection, "busy_timeout") == 100
+    assert engine.pool.size() == 2
+    engine.dispose()
+
+    memory = create_db_engine("sqlite://")
+    with memory.connect() as connection:
+        assert _pragma(connection, "foreign_keys") == 1
+
+
+@pytest.mark.parametrize("journal_mode, reader_blocked", [("DELETE", True), ("WAL", False)])
+def test_readers_do_not_wait_for_writers_in_wal(tmp_path, journal_mode, reader_blocked):
+    engine = create_db_engine(
+        f"sqlite:///{tmp_path / 'locks.db'}", journal_mode=journal_mode, busy_timeout_ms=0
+    )
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE t (x INTEGER)"))
+        connection.execute(text("INSERT INTO t VALUES (1)"))
+
+    reader = engine.connect()
+    # A writer holding the database lock, as while a delivery commits
+    writer = engine.raw_connection()
+    writer.execute("BEGIN EXCLUSIVE")
+    writer.execute("INSERT INTO t VALUES (2)")
+    try:
+        with reader:
+            if reader_blocked:
+                with pytest.raises(OperationalError, match="locked"):
+                    reader.execute(text("SELECT count(*) FROM t")).scalar()
+            else:
+                assert reader.execute(text("SELECT count(*) FROM t")).scalar() == 1
+    finally:
+        writer.rollback()
+        writer.close()
+        engine.dispose()
@@ -0,0 +1,150 @@
+from datetime import datetime, timedelta
+import smtplib
+import socket
+import time
+import pytest
+from aiosmtpd.controller import Controller
+from app import models
+from app.utils import email_utils
+from app.utils.email_utils import OutboxWorker, deliver_outbox_batch
+
+def _create_order(client, db, email="tailor@example.com", send_email=True, digest=False, tailor=None):
+    tailor = tailor or db.query(models.Tailor).first()
+    tailor.email = email
+    tailor.email_digest = digest
+    db.commit()
+    products = client.get("/master-data/products").json()
+    response = client.post("/orders/", json={
+        "tailor_id": tailor.id,
+        "send_email": send_email,
+        "notes": "outbox",
+        "order_lines": [{"product_id": products[0]["id"], "size_id": products[0]["sizes"][0]["id"], "quantity": 3}],
+    })
+    assert response.status_code == 200
+    return response.json()
+
+def _outbox(db):
+    db.expire_all()
+    return db.query(models.EmailOutbox).order_by(models.EmailOutbox.id).all()
+
+@pytest.fixture
+def smtp_server():
+    """Local SMTP server collecting what it receives; refuses recipients starting with "refused"."""
+    class Handler:
+        def __init__(self):
+            self.messages = []
+            self.sessions = set()
+
+        async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+            if address.startswith("refused"):
+                return "550 mailbox unavailable"
+            envelope.rcpt_tos.append(address)
+            return "250 OK"
+
+        async def handle_DATA(self, server, session, envelope):
+            self.sessions.add(id(session))
+            self.messages.append((envelope.rcpt_tos, envelope.content.decode("utf-8")))
+            return "250 Message accepted"
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    handler = Handler()
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    handler.connect = lambda: smtplib.SMTP(controller.hostname, controller.port, timeout=5)
+    yield handler
+    controller.stop()
+
+def test_order_queues_email_in_its_transaction(client, db):
+    order = _create_order(client, db)
+    _create_order(client, db, send_email=False)
+    emails = _outbox(db)
+    assert [(e.kind, e.order_id, e.recipient, e.status) for e in emails] == [
+        ("order", order["id"], "tailor@example.com", "pending")
+    ]
+
+def test_outbox_batch_shares_one_smtp_connection(client, db, smtp_server):
+    orders = [_create_order(client, db) for _ in range(3)]
+    assert deliver_outbox_batch(db, smtp_server.connect) == 3
+    assert len(smtp_server.messages) == 3 and len(smtp_server.sessions) == 1
+    assert f"New Order Received: #{orders[0]['id']}" in smtp_server.messages[0][1]
+
+    emails = _outbox(db)
+    assert all(e.status == "sent" and e.sent_at for e in emails)
+    assert "units. Material:" in emails[0].body
+    # Nothing left to send
+    assert deliver_outbox_batch(db, smtp_server.connect) == 0
+
+def test_outbox_retries_with_backoff(client, db, smtp_server):
+    _create_order(client, db, email="refused@example.com")
+    now = datetime.utcnow()
+
+    def unreachable():
+        raise ConnectionRefusedError("relay down")
+    assert deliver_outbox_batch(db, unreachable, now=now) == 0
+    email = _outbox(db)[0]
+    assert (email.status, email.attempts) == ("pending", 1)
+    assert email.next_attempt_at == now + timedelta(seconds=email_utils.OUTBOX_RETRY_BASE_SECONDS)
+
+    # Not due yet
+    assert deliver_outbox_batch(db, smtp_server.connect, now=now) == 0
+    # The relay is back but refuses the recipient: the wait doubles
+    later = email.next_attempt_at
+    assert deliver_outbox_batch(db, smtp_server.connect, now=later) == 0
+    email = _outbox(db)[0]
+    assert email.attempts == 2 and "550" in email.last_error
+    assert email.next_attempt_at == later + timedelta(seconds=2 * email_utils.OUTBOX_RETRY_BASE_SECONDS)
+
+    email.attempts = email_utils.OUTBOX_MAX_ATTEMPTS - 1
+    db.commit()
+    deliver_outbox_batch(db, smtp_server.connect, now=email.next_attempt_at)
+    assert _outbox(db)[0].status == "failed"
+
+def test_outbox_drops_email_of_deleted_order(client, db, smtp_server):
+    order = _create_order(client, db)
+    response = client.delete(f"/orders/{order['id']}", headers={"X-Admin-Password": "admin"})
+    assert response.status_code == 200
+    assert deliver_outbox_batch(db, smtp_server.connect) == 0
+    email = _outbox(db)[0]
+    assert (email.status, email.last_error) == ("failed", "Order no longer exists")
+    assert smtp_server.messages == []
+
+def test_outbox_worker_sends_in_background(client, db, smtp_server):
+    _create_order(client, db)
+    worker = OutboxWorker(lambda: db, smtp_server.connect, poll_seconds=0.05)
+    # The test session is shared with the worker thread, so it must not be closed
+    db.close = lambda: None
+    worker.start()
+    try:
+        for _ in range(100):
+            if smtp_server.messages:
+                break
+            time.sleep(0.05)
+    finally:
+        worker.stop()
+    assert len(smtp_server.messages) == 1
+
+def test_digest_tailor_gets_one_email_per_day(client, db, smtp_server, query_counter):
+    tailors = db.query(models.Tailor).order_by(models.Tailor.id).limit(2).all()
+    orders = [_create_order(client, db, email="digest@example.com", digest=True, tailor=tailors[0]) for _ in range(3)]
+    other = _create_order(client, db, email="other@example.com", digest=True, tailor=tailors[1])
+    single = _create_order(client, db, tailor=tailors[1])
+
+    # Only the per-order email is due before the digest hour
+    assert deliver_outbox_batch(db, smtp_server.connect) == 1
+    assert f"#{single['id']}" in smtp_server.messages[0][1]
+
+    send_at = email_utils.next_digest_time(datetime.utcnow())
+    assert send_at.hour == email_utils.EMAIL_DIGEST_HOUR_UTC
+    with query_counter() as queries:
+        assert deliver_outbox_batch(db, smtp_server.connect, now=send_at) == 2
+    # Both digests are rendered from one query over the orders and their lines
+    assert len([q for q in queries if "order_lines" in q]) == 1
+
+    digests = {rcpt[0]: content for rcpt, content in smtp_server.messages[1:]}
+    assert "You have received 3 new orders:" in digests["digest@example.com"]
+    for order in orders:
+        assert f"Order #{order['id']} (" in digests["digest@example.com"]
+    assert f"Order #{other['id']} (" in digests["other@example.com"]
+    assert all(e.status == "sent" for e in _outbox(db))
@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+from app import models
+from app.utils.idempotency_utils import IDEMPOTENCY_KEY_TTL_HOURS
+
+def _order_payload(client, db, quantity=4):
+    products = client.get("/master-data/products").json()
+    return {
+        "tailor_id": db.query(models.Tailor).first().id,
+        "notes": "idempotent",
+        "order_lines": [{"product_id": products[0]["id"], "size_id": products[0]["sizes"][0]["id"], "quantity": quantity}],
+    }
+
+def test_replayed_order_is_created_once(client, db, query_counter):
+    payload = _order_payload(client, db)
+    before = db.query(models.Order).count()
+    first = client.post("/orders/", json=payload, headers={"Idempotency-Key": "order-1"})
+    assert first.status_code == 200
+
+    with query_counter() as queries:
+        second = client.post("/orders/", json=payload, headers={"Idempotency-Key": "order-1"})
+    assert second.status_code == 200
+    assert second.json() == first.json()
+    assert second.headers["Idempotent-Replayed"] == "true"
+    # Answered from the key lookup alone
+    assert len(queries) == 1
+    assert db.query(models.Order).count() == before + 1
+
+    # Another key is another order
+    third = client.post("/orders/", json=payload, headers={"Idempotency-Key": "order-2"})
+    assert third.json()["id"] != first.json()["id"]
+
+def test_key_reused_for_another_request_is_rejected(client, db):
+    client.post("/orders/", json=_order_payload(client, db), headers={"Idempotency-Key": "order-3"})
+    response = client.post("/orders/", json=_order_payload(client, db, quantity=9), headers={"Idempotency-Key": "order-3"})
+    assert response.status_code == 422
+
+def test_failed_request_does_not_keep_its_key(client, db):
+    payload = _order_payload(client, db)
+    bad = dict(payload, tailor_id=999999)
+    assert client.post("/orders/", json=bad, headers={"Idempotency-Key": "order-4"}).status_code == 400
+    assert db.get(models.IdempotencyKey, "order-4") is None
+    assert client.post("/orders/", json=payload, headers={"Idempotency-Key": "order-4"}).status_code == 200
+
+def test_replayed_delivery_is_counted_once(client, db):
+    order = client.post("/orders/", json=_order_payload(client, db)).json()
+    line_id = order["order_lines"][0]["id"]
+    headers = {"Idempotency-Key": "delivery-1"}
+    first = client.post(f"/orders/lines/{line_id}/deliveries", json={"quantity_delivered": 4}, headers=headers)
+    second = client.post(f"/orders/lines/{line_id}/deliveries", json={"quantity_delivered": 4}, headers=headers)
+    assert first.status_code == second.status_code == 200
+    assert second.json() == first.json()
+
+    order = client.get(f"/orders/{order['id']}").json()
+    assert order["order_lines"][0]["delivered_qty"] == 4
+    assert order["status"] == "Completed"
+    assert len(order["order_lines"][0]["deliveries"]) == 1
+
+def test_expired_keys_are_purged(client, db):
+    payload = _order_payload(client, db)
+    first = client.post("/orders/", json=payload, headers={"Idempotency-Key": "order-5"}).json()
+    db.get(models.IdempotencyKey, "order-5").created_at = datetime.utcnow() - timedelta(hours=IDEMPOTENCY_KEY_TTL_HOURS + 1)
+    db.commit()
+
+    # An expired key runs the request again and replaces the old entry
+    second = client.post("/orders/", json=payload, headers={"Idempotency-Key": "order-5"}).json()
+    assert second["id"] != first["id"]
+    db.expire_all()
+    assert db.query(models.IdempotencyKey).filter(models.IdempotencyKey.key == "order-5").count() == 1
@@ -0,0 +1,356 @@
+import io
+import json
+import threading
+import tracemalloc
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import models
+from app.utils import import_jobs
+from app.utils.catalog_utils import bump_catalog_version
+from app.utils.import_jobs import wait_for_import_job
+from app.utils.import_utils import (
+    MASTER_DATA_COLUMNS, PREVIEW_TTL_SECONDS, iter_tabular_file, preview_master_data_file, process_master_data_file
+)
+
+HEADER = "Product Name,Category,Size Label,Size Order Index,Fabric Width (Inches),Length Required,Unit\n"
+
+# Stats below were checked against the original row-by-row importer
+MIXED_FILE = HEADER + (
+    "Blazer,Uniform,24,0,36,1.5,meters\n"        # category change, rule unchanged
+    "Blazer,General,24,5,36,1.7,Meters\n"        # category back, rule updated
+    "Blazer,Uniform,99,2,,2.0,\n"                # category change, new size + width-less rule
+    "New Thing,Cat A,S,1,60,1.1,meters\n"        # new product, size, rule
+    "New Thing,Cat A,S,1,60,1.1,meters\n"        # duplicate row: nothing
+    "New Thing,Cat B,M,x,60,1.2,meters\n"        # category change, new size (index 0), new rule
+    "New Thing,Cat B,M,3,60,bad,meters\n"        # invalid length: skipped
+    "Neckar,General,11,0,36,9.9,meters\n"        # rule updated
+    "Neckar,,12,0,60,1.0,grams\n"                # rule updated (unit)
+)
+
+
+def _upload(client, content, filename="master.csv"):
+    """Starts an import job and waits for it; returns the finished job."""
+    files = {"file": (filename, content.encode(), "text/csv")}
+    response = client.post("/master-data/upload", files=files)
+    assert response.status_code == 202, response.text
+    return wait_for_import_job(response.json()["job_id"], timeout=30)
+
+
+def test_upload_stats_match_row_by_row_semantics(client, db):
+    job = _upload(client, MIXED_FILE)
+    assert job["status"] == "completed", job
+    assert job["stats"] == {
+        "products_created": 1,
+        "products_updated": 4,
+        "sizes_created": 3,
+        "rules_created": 3,
+        "rules_updated": 3,
+    }
+
+    blazer = db.query(models.Product).filter(models.Product.name == "Blazer").one()
+    assert blazer.category == "Uniform"
+    size_24 = next(s for s in blazer.sizes if s.label == "24")
+    assert size_24.order_index == 5
+    rule = next(r for r in size_24.material_rules if r.fabric_width_inches == 36)
+    assert (rule.length_required, rule.unit) == (1.7, "meters")
+    size_99 = next(s for s in blazer.sizes if s.label == "99")
+    assert [(r.fabric_width_inches, r.unit) for r in size_99.material_rules] == [(None, "meters")]
+
+    new_thing = db.query(models.Product).filter(models.Product.name == "New Thing").one()
+    assert new_thing.category == "Cat B"
+    assert sorted((s.label, s.order_index) for s in new_thing.sizes) == [("M", 0), ("S", 1)]
+
+    # Re-importing still counts the in-file flip-flops, as the row-by-row import did
+    again = _upload(client, MIXED_FILE)["stats"]
+    assert again == {
+        "products_created": 0,
+        "products_updated": 4,
+        "sizes_created": 0,
+        "rules_created": 0,
+        "rules_updated": 2,
+    }
+
+
+def test_upload_query_count_is_constant(client, db, query_counter):
+    small = HEADER + "Neckar,General,11,0,36,2.5,meters\n"
+    large = HEADER + "".join(
+        f"Bulk Product {p},General,{s},{s},{w},1.{s},meters\n"
+        for p in range(20) for s in range(10) for w in (36, 60)
+    )
+
+    with query_counter() as small_queries:
+        assert _upload(client, small)["status"] == "completed"
+    with query_counter() as large_queries:
+        job = _upload(client, large)
+    assert job["status"] == "completed"
+    assert job["stats"]["rules_created"] == 400
+    assert len(large_queries) <= len(small_queries) + 3 # only the inserts for new products/sizes differ
+
+
+def test_upload_invalid_width_is_rejected_without_changes(client, db):
+    rules_before = db.query(models.MaterialRule).count()
+    job = _upload(client, HEADER + "Neckar,General,11,0,wide,2.5,meters\n")
+    assert job["status"] == "failed"
+    assert "Fabric Width" in job["error"]
+    assert db.query(models.MaterialRule).count() == rules_before
+
+
+def test_dry_run_previews_without_writing(client, db):
+    rules_before = db.query(models.MaterialRule).count()
+    response = client.post(
+        "/master-data/upload?dry_run=true",
+        files={"file": ("master.csv", MIXED_FILE.encode(), "text/csv")}
+    )
+    assert response.status_code == 200, response.text
+    preview = response.json()
+    assert db.query(models.MaterialRule).count() == rules_before
+    assert db.query(models.Product).filter(models.Product.name == "New Thing").count() == 0
+
+    # Same counts the real import reports
+    assert preview["stats"]["rules_updated"] == 3
+    summary = preview["summary"]
+    assert summary["products_created"] == 1
+    assert summary["sizes_created"] == 3
+    assert summary["rules_created"] == 3
+    assert summary["rules_length_changed"] == 3
+    neckar = summary["products"]["Neckar"]
+    assert neckar["rules_updated"] == 2
+    assert neckar["length_changes"] == [
+        {"size": "11", "fabric_width_inches": 36, "old": 1.5, "new": 9.9},
+        {"size": "12", "fabric_width_inches": 60, "old": 1.05, "new": 1.0},
+    ]
+    assert summary["products"]["New Thing"]["created"] is True
+
+    # Confirm applies exactly the previewed changes, once
+    confirm = client.post(f"/master-data/upload/confirm/{preview['preview_id']}")
+    assert confirm.status_code == 200
+    assert confirm.json()["stats"] == preview["stats"]
+    assert db.query(models.MaterialRule).count() == rules_before + 3
+    assert client.post(f"/master-data/upload/confirm/{preview['preview_id']}").status_code == 404
+
+
+def test_confirm_rejects_stale_preview(client, db):
+    preview = client.post(
+        "/master-data/upload?dry_run=true",
+        files={"file": ("master.csv", (HEADER + "Fresh Product,General,S,0,36,1.0,meters\n").encode(), "text/csv")}
+    ).json()
+    # Someone creates the same product before the confirm
+    client.post("/master-data/products", json={"name": "Fresh Product"})
+
+    response = client.post(f"/master-data/upload/confirm/{preview['preview_id']}")
+    assert response.status_code == 409
+
+
+def test_previews_are_stored_in_the_database(client, db):
+    def dry_run():
+        return client.post(
+            "/master-data/upload?dry_run=true",
+            files={"file": ("master.csv", MIXED_FILE.encode(), "text/csv")}
+        ).json()["preview_id"]
+
+    # Any server worker can confirm a preview, not only the one that computed it
+    preview_id = dry_run()
+    assert json.loads(db.get(models.MasterDataPreview, preview_id).changes)["stats"]["rules_created"] == 3
+
+    expired_id = dry_run()
+    db.get(models.MasterDataPreview, expired_id).created_at = datetime.utcnow() - timedelta(
+        seconds=PREVIEW_TTL_SECONDS + 1
+    )
+    db.flush()
+    assert client.post(f"/master-data/upload/confirm/{expired_id}").status_code == 404
+
+    assert client.post(f"/master-data/upload/confirm/{preview_id}").status_code == 200
+    assert db.get(models.MasterDataPreview, preview_id) is None
+
+
+def _xlsx(rows):
+    from openpyxl import Workbook
+    workbook = Workbook()
+    for row in rows:
+        workbook.active.append(row)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def test_batched_import_matches_single_batch(db):
+    # A title row above the header, and batches smaller than the header search window
+    content = "Master Data,,,,,,\n" + MIXED_FILE
+    stats = process_master_data_file(io.BytesIO(content.encode()), db, "master.csv", chunk_size=2)
+    assert stats == {
+        "products_created": 1,
+        "products_updated": 4,
+        "sizes_created": 3,
+        "rules_created": 3,
+        "rules_updated": 3,
+    }
+    new_thing = db.query(models.Product).filter(models.Product.name == "New Thing").one()
+    assert new_thing.category == "Cat B"
+
+
+def test_import_does_not_hold_the_write_lock_while_reading(db):
+    writes = []
+
+    def on_batch(rows_read, stats, skipped_rows):
+        # Another connection can write (and would fail at once if the import held the lock)
+        with db.get_bind().engine.connect() as other:
+            other.exec_driver_sql("PRAGMA busy_timeout=0")
+            other.exec_driver_sql("INSERT INTO settings (key, value) VALUES ('lock_probe', '1')")
+            other.rollback()
+        writes.append(rows_read)
+
+    content = HEADER + "".join(f"Lock Probe {i},General,S,1,36,1.5,meters\n" for i in range(20))
+    stats = process_master_data_file(io.BytesIO(content.encode()), db, "master.csv", chunk_size=5, on_batch=on_batch)
+    assert writes == [9, 14, 19, 20]
+    assert stats["products_created"] == 20
+
+
+def test_import_fails_if_catalog_changes_while_reading(db):
+    def on_batch(rows_read, stats, skipped_rows):
+        if rows_read == 9:
+            db.query(models.Product).filter(models.Product.name == "Neckar").update({"category": "Edited"})
+            bump_catalog_version(db)
+
+    content = HEADER + "".join(f"Lock Probe {i},General,S,1,36,1.5,meters\n" for i in range(20))
+    with pytest.raises(ValueError, match="catalog changed"):
+        process_master_data_file(io.BytesIO(content.encode()), db, "master.csv", chunk_size=5, on_batch=on_batch)
+    assert db.query(models.Product).filter(models.Product.name == "Lock Probe 0").count() == 0
+
+
+def test_batched_preview_matches_single_batch(db):
+    whole = preview_master_data_file(io.BytesIO(MIXED_FILE.encode()), db, "master.csv")
+    batched = preview_master_data_file(io.BytesIO(MIXED_FILE.encode()), db, "master.csv", chunk_size=3)
+    assert batched["stats"] == whole["stats"]
+    assert batched["summary"] == whole["summary"]
+
+
+def test_xlsx_upload_is_streamed(client, db):
+    content = _xlsx([
+        ["Catalog export"],
+        ["Product Name", "Category", "Size Label", "Size Order Index", "Fabric Width (Inches)", "Length Required", "Unit"],
+        ["Neckar", "General", 11, 0, 36, 2.5, "meters"],
+        ["Neckar", "General", 19, 8, None, 3.0, None],
+    ])
+    files = {"file": ("master.xlsx", content, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")}
+    response = client.post("/master-data/upload", files=files)
+    assert response.status_code == 202, response.text
+    job = wait_for_import_job(response.json()["job_id"], timeout=30)
+    assert job["stats"] == {
+        "products_created": 0,
+        "products_updated": 0,
+        "sizes_created": 1,
+        "rules_created": 1,
+        "rules_updated": 1,
+    }
+    size = db.query(models.Size).join(models.Product).filter(
+        models.Product.name == "Neckar", models.Size.label == "19"
+    ).one()
+    assert [(r.fabric_width_inches, r.length_required, r.unit) for r in size.material_rules] == [(None, 3.0, "meters")]
+
+
+def test_reading_memory_does_not_grow_with_file_size(tmp_path):
+    def peak(rows):
+        path = tmp_path / f"{rows}.csv"
+        with open(path, "w") as f:
+            f.write(HEADER)
+            for i in range(rows):
+                f.write(f"Product {i % 50},General,{i},{i},36,1.5,meters\n")
+        tracemalloc.start()
+        with open(path, "rb") as f:
+            seen = sum(len(df) for df in iter_tabular_file(f, "big.csv", MASTER_DATA_COLUMNS, chunk_size=1000))
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert seen == rows
+        return peak_bytes
+
+    assert peak(80_000) < 2 * peak(20_000)
+
+
+def test_upload_job_reports_progress(client, db):
+    job = _upload(client, MIXED_FILE)
+    response = client.get(f"/master-data/upload/{job['job_id']}")
+    assert response.status_code == 200
+    progress = response.json()
+    assert progress["status"] == "completed"
+    assert progress["rows_processed"] == 9
+    assert progress["stats"]["rules_created"] == 3
+    assert progress["errors"] == ["Row 8: Invalid length required. Skipped."]
+    assert progress["finished_at"] is not None
+
+    assert client.get("/master-data/upload/unknown").status_code == 404
+    # Finished jobs can no longer be cancelled
+    assert client.delete(f"/master-data/upload/{job['job_id']}").status_code == 409
+
+
+def test_cancelled_job_writes_nothing(client, db):
+    # Keep the import worker busy so the job stays queued
+    release = threading.Event()
+    blocker = import_jobs._executor.submit(release.wait)
+    try:
+        files = {"file": ("master.csv", MIXED_FILE.encode(), "text/csv")}
+        job_id = client.post("/master-data/upload", files=files).json()["job_id"]
+        assert client.get(f"/master-data/upload/{job_id}").json()["status"] == "queued"
+        assert client.delete(f"/master-data/upload/{job_id}").status_code == 200
+    finally:
+        release.set()
+        blocker.result()
+
+    assert wait_for_import_job(job_id, timeout=30)["status"] == "cancelled"
+    assert db.query(models.Product).filter(models.Product.name == "New Thing").count() == 0
+
+
+def test_job_state_is_stored_in_the_database(client, db):
+    # Any server worker can report a job, not only the one running it
+    job = _upload(client, MIXED_FILE)
+    stored = db.get(models.ImportJob, job["job_id"])
+    assert stored.status == "completed"
+    assert stored.rows_processed == 9
+    assert json.loads(stored.stats)["rules_created"] == 3
+
+    stored.status = "running"
+    db.flush()
+    assert client.get(f"/master-data/upload/{job['job_id']}").json()["status"] == "running"
+    assert client.delete(f"/master-data/upload/{job['job_id']}").status_code == 200
+    db.refresh(stored)
+    assert stored.cancel_requested
+
+
+def _job(db, status, **fields):
+    now = datetime.utcnow()
+    job = models.ImportJob(id=f"{status}-{now.timestamp()}", filename="master.csv", status=status,
+                           created_at=now, updated_at=now, **fields)
+    db.add(job)
+    db.flush()
+    return job
+
+
+def test_interrupted_jobs_fail_on_startup(db):
+    queued, running, completed = _job(db, "queued"), _job(db, "running"), _job(db, "completed")
+    assert import_jobs.fail_interrupted_import_jobs(db) == 2
+    for job in (queued, running, completed):
+        db.refresh(job)
+    assert queued.status == running.status == "failed"
+    assert running.error == import_jobs.INTERRUPTED_ERROR and running.finished_at is not None
+    assert completed.status == "completed"
+
+
+def test_stale_job_reads_as_failed(client, db):
+    stale = datetime.utcnow() - timedelta(seconds=import_jobs.JOB_STALE_SECONDS + 1)
+    job = _job(db, "running")
+    job.updated_at = stale
+    db.flush()
+    progress = client.get(f"/master-data/upload/{job.id}").json()
+    assert progress["status"] == "failed"
+    assert progress["error"] == import_jobs.STALE_ERROR
+    assert client.delete(f"/master-data/upload/{job.id}").status_code == 409
+
+    job.updated_at = datetime.utcnow()
+    db.flush()
+    assert client.get(f"/master-data/upload/{job.id}").json()["status"] == "running"
+
+
+def test_upload_rejects_unsupported_format(client):
+    files = {"file": ("master.txt", b"hello", "text/plain")}
+    assert client.post("/master-data/upload", files=files).status_code == 400
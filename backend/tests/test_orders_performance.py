@@ -0,0 +1,249 @@
+import pytest
+from app import models
+from app.utils.order_utils import rebuild_delivery_counters, recompute_statuses
+from app.utils.rule_utils import MaterialRuleIndex, RuleEntry, get_rule_index
+
+
+def _make_orders(db, count, lines_per_order=3):
+    """Creates `count` orders, each with a few lines and a delivery on every line."""
+    tailor = db.query(models.Tailor).first()
+    school = models.School(name=f"Perf School {count}x{lines_per_order}")
+    db.add(school)
+    sizes = db.query(models.Size).limit(lines_per_order).all()
+
+    for i in range(count):
+        order = models.Order(tailor_id=tailor.id, slip_no=f"PERF-{count}-{i}")
+        for size in sizes:
+            line = models.OrderLine(
+                product_id=size.product_id,
+                size_id=size.id,
+                school=school,
+                material_req_per_unit=1.5,
+                unit="meters",
+                quantity=4,
+                total_material_req=6.0,
+                delivered_qty=1,
+            )
+            line.deliveries.append(models.Delivery(quantity_delivered=1))
+            order.order_lines.append(line)
+        order.delivered_qty = len(sizes)
+        db.add(order)
+    db.commit()
+    db.expire_all()
+    return school
+
+
+def _count_list_queries(client, db, query_counter, params=""):
+    db.expire_all()
+    with query_counter() as queries:
+        response = client.get(f"/orders/{params}")
+    assert response.status_code == 200
+    return len(queries), response.json()
+
+
+def test_list_orders_query_count_is_constant(client, db, query_counter):
+    _make_orders(db, 2)
+    small_count, small_data = _count_list_queries(client, db, query_counter)
+
+    _make_orders(db, 40)
+    large_count, large_data = _count_list_queries(client, db, query_counter)
+
+    assert len(large_data) > len(small_data)
+    assert large_count == small_count, f"Query count grew from {small_count} to {large_count}"
+    # One delivery per line was recorded
+    line = large_data[0]["order_lines"][0]
+    assert line["delivered_qty"] == 1
+    assert line["pending_qty"] == 3
+    assert line["school_name"].startswith("Perf School")
+
+
+def test_list_orders_school_filter_does_not_duplicate(client, db):
+    school = _make_orders(db, 3)
+
+    data = client.get(f"/orders/?school_id={school.id}").json()
+    ids = [o["id"] for o in data]
+    assert len(ids) == 3
+    assert len(set(ids)) == len(ids)
+
+
+def test_get_order_query_count_is_constant(client, db, query_counter):
+    _make_orders(db, 1, lines_per_order=1)
+    small_id = db.query(models.Order).order_by(models.Order.id.desc()).first().id
+    _make_orders(db, 1, lines_per_order=10)
+    large_id = db.query(models.Order).order_by(models.Order.id.desc()).first().id
+
+    db.expire_all()
+    with query_counter() as small_queries:
+        assert client.get(f"/orders/{small_id}").status_code == 200
+    db.expire_all()
+    with query_counter() as large_queries:
+        assert client.get(f"/orders/{large_id}").status_code == 200
+
+    assert len(large_queries) == len(small_queries)
+
+
+def test_list_orders_does_not_load_deliveries(client, db, query_counter):
+    _make_orders(db, 2)
+    _, data = _count_list_queries(client, db, query_counter)
+    with query_counter() as queries:
+        client.get("/orders/")
+    assert not any("FROM deliveries" in q for q in queries)
+    assert data[0]["delivered_qty"] == len(data[0]["order_lines"])
+    assert data[0]["order_lines"][0]["delivered_qty"] == 1
+
+
+def test_delivery_counters_follow_record_and_delete(client, db):
+    _make_orders(db, 1, lines_per_order=2)
+    order = db.query(models.Order).order_by(models.Order.id.desc()).first()
+    line_id = order.order_lines[0].id
+
+    delivery = client.post(f"/orders/lines/{line_id}/deliveries", json={"quantity_delivered": 3}).json()
+    data = client.get(f"/orders/{order.id}").json()
+    line = next(l for l in data["order_lines"] if l["id"] == line_id)
+    assert line["delivered_qty"] == 4
+    assert line["pending_qty"] == 0
+    assert data["delivered_qty"] == 5
+    assert data["status"] == "In Progress"
+
+    resp = client.delete(f"/orders/deliveries/{delivery['id']}", headers={"X-Admin-Password": "admin"})
+    assert resp.status_code == 200
+    data = client.get(f"/orders/{order.id}").json()
+    assert data["delivered_qty"] == 2
+
+
+def test_rebuild_delivery_counters(db):
+    _make_orders(db, 2)
+    # Corrupt the counters the way a manual edit would
+    db.query(models.OrderLine).update({models.OrderLine.delivered_qty: 0})
+    db.query(models.Order).update({models.Order.delivered_qty: 99})
+    db.commit()
+
+    stats = rebuild_delivery_counters(db)
+    assert stats["lines_fixed"] >= 6
+    assert stats["orders_fixed"] >= 2
+
+    db.expire_all()
+    for line in db.query(models.OrderLine).all():
+        assert line.delivered_qty == sum(d.quantity_delivered for d in line.deliveries)
+    assert rebuild_delivery_counters(db) == {"lines_fixed": 0, "orders_fixed": 0}
+
+
+def test_recompute_statuses(db):
+    _make_orders(db, 3, lines_per_order=1)
+    orders = db.query(models.Order).order_by(models.Order.id.desc()).limit(3).all()
+    # One fully delivered, one untouched, one partially delivered (the _make_orders default)
+    full, empty, partial = orders
+    full.order_lines[0].delivered_qty = full.order_lines[0].quantity
+    empty.order_lines[0].delivered_qty = 0
+    for order in orders:
+        order.status = "Bogus"
+    db.commit()
+
+    assert recompute_statuses(db) >= 3
+    db.expire_all()
+    assert full.status == "Completed"
+    assert empty.status == "Pending"
+    assert partial.status == "In Progress"
+    assert recompute_statuses(db) == 0
+
+
+def test_record_delivery_status_in_fixed_queries(client, db, query_counter):
+    _make_orders(db, 1, lines_per_order=1)
+    small_line = db.query(models.OrderLine).order_by(models.OrderLine.id.desc()).first().id
+    _make_orders(db, 1, lines_per_order=10)
+    large_line = db.query(models.OrderLine).order_by(models.OrderLine.id.desc()).first().id
+
+    db.expire_all()
+    with query_counter() as small_queries:
+        client.post(f"/orders/lines/{small_line}/deliveries", json={"quantity_delivered": 1})
+    db.expire_all()
+    with query_counter() as large_queries:
+        client.post(f"/orders/lines/{large_line}/deliveries", json={"quantity_delivered": 1})
+    assert len(large_queries) == len(small_queries)
+
+
+def _order_payload(db, line_count):
+    tailor = db.query(models.Tailor).first()
+    sizes = db.query(models.Size).filter(models.Size.material_rules.any()).limit(line_count).all()
+    return {
+        "tailor_id": tailor.id,
+        "order_lines": [
+            {"product_id": size.product_id, "size_id": size.id, "quantity": 2}
+            for size in sizes
+        ],
+    }
+
+
+def test_create_order_query_count_is_constant(client, db, query_counter):
+    small_payload = _order_payload(db, 1)
+    large_payload = _order_payload(db, 30)
+    assert len(large_payload["order_lines"]) == 30
+    get_rule_index(db)
+
+    db.expire_all()
+    with query_counter() as small_queries:
+        assert client.post("/orders/", json=small_payload).status_code == 200
+    db.expire_all()
+    with query_counter() as large_queries:
+        response = client.post("/orders/", json=large_payload)
+    assert response.status_code == 200
+    assert len(response.json()["order_lines"]) == 30
+    assert len(large_queries) == len(small_queries)
+    # Rules come from the shared index, not the database
+    assert not any("FROM material_rules" in q for q in large_queries)
+
+
+def test_create_order_is_all_or_nothing(client, db):
+    payload = _order_payload(db, 5)
+    # A size without any rule in the middle of the order
+    product = db.query(models.Product).first()
+    bare_size = models.Size(product_id=product.id, label="No Rule")
+    db.add(bare_size)
+    db.commit()
+    payload["order_lines"].insert(2, {"product_id": product.id, "size_id": bare_size.id, "quantity": 1})
+
+    orders_before = db.query(models.Order).count()
+    lines_before = db.query(models.OrderLine).count()
+    response = client.post("/orders/", json=payload)
+    assert response.status_code == 400
+    assert db.query(models.Order).count() == orders_before
+    assert db.query(models.OrderLine).count() == lines_before
+
+
+def test_rule_index_policy():
+    index = MaterialRuleIndex([
+        RuleEntry(5, 1, 60, 1.0, "meters"),
+        RuleEntry(3, 1, 36, 1.5, "meters"),
+        RuleEntry(4, 1, 36, 9.0, "meters"),
+        RuleEntry(7, 2, None, 0.0, "pairs"),
+    ])
+    assert index.resolve(1).id == 3 # default: lowest id
+    assert index.resolve(1, 36).id == 3 # duplicate widths: lowest id
+    assert index.resolve(1, 60).id == 5
+    assert index.resolve(1, 48) is None
+    assert index.resolve(1, 60, rule_id=7).id == 7 # explicit rule wins
+    assert index.resolve(3) is None
+    assert [r.id if r else None for r in index.resolve_many([(2, None, None), (1, 60, None), (9, None, None)])] == [7, 5, None]
+
+
+def test_rule_index_follows_rule_updates(client, db):
+    payload = _order_payload(db, 1)
+    line = payload["order_lines"][0]
+    rule = get_rule_index(db).resolve(line["size_id"])
+
+    response = client.put(f"/master-data/rules/{rule.id}", json={
+        "fabric_width_inches": rule.fabric_width_inches, "length_required": 4.25, "unit": rule.unit
+    })
+    assert response.status_code == 200
+    order = client.post("/orders/", json=payload).json()
+    assert order["order_lines"][0]["material_req_per_unit"] == 4.25
+    assert order["order_lines"][0]["total_material_req"] == 8.5
+
+    # Line edits resolve through the same index
+    other_width = 60 if rule.fabric_width_inches == 36 else 36
+    expected = get_rule_index(db).resolve(line["size_id"], other_width)
+    updated = client.put(
+        f"/orders/lines/{order['order_lines'][0]['id']}", json={"fabric_width_inches": other_width},
+        headers={"X-Admin-Password": "admin"}
+    ).json()
+    assert updated["material_req_per_unit"] == expected.length_required
@@ -1,6 +1,9 @@
 import pytest
 from app import models, schemas
 from datetime import datetime, timedelta
+from sqlalchemy import text
+from app.utils import search_utils
+from app.utils.search_utils import rebuild_order_search
 
 @pytest.fixture(scope="function")
 def search_data(db):
@@ -73,3 +76,153 @@ def test_list_orders_combined(client, search_data):
     t1 = datetime.fromisoformat(data[0]['created_at'])
     t2 = datetime.fromisoformat(data[1]['created_at'])
     assert t1 < t2
+
+def _collect_pages(client, params):
+    ids, cursor, pages = [], None, 0
+    while True:
+        url = f"/orders/?{params}" + (f"&cursor={cursor}" if cursor else "")
+        response = client.get(url)
+        assert response.status_code == 200
+        ids.extend(o['id'] for o in response.json())
+        pages += 1
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return ids, pages
+
+def test_list_orders_paginates_newest(client, search_data):
+    full = [o['id'] for o in client.get("/orders/").json()]
+    ids, pages = _collect_pages(client, "limit=2")
+    assert ids == full
+    assert pages == 2
+
+def test_list_orders_paginates_oldest(client, search_data):
+    full = [o['id'] for o in client.get("/orders/?sort_by=oldest").json()]
+    ids, pages = _collect_pages(client, "sort_by=oldest&limit=1")
+    assert ids == full
+    assert pages == 3
+
+def test_list_orders_pagination_breaks_ties_by_id(client, db, search_data):
+    # Several orders sharing one timestamp must not be skipped or repeated across pages
+    same_time = datetime.utcnow() - timedelta(days=5)
+    db.add_all([models.Order(tailor_id=search_data["tailor2"].id, created_at=same_time) for _ in range(4)])
+    db.commit()
+
+    ids, _ = _collect_pages(client, "limit=2")
+    assert len(ids) == 7
+    assert len(set(ids)) == 7
+
+def test_list_orders_total_count(client, search_data):
+    response = client.get("/orders/?search=Alice&limit=1&include_total=true")
+    assert response.status_code == 200
+    assert len(response.json()) == 1
+    assert response.headers["X-Total-Count"] == "2"
+    assert "X-Next-Cursor" in response.headers
+
+    # Total is only computed on request
+    assert "X-Total-Count" not in client.get("/orders/").headers
+
+def test_list_orders_invalid_cursor(client, search_data):
+    response = client.get("/orders/?cursor=not-a-cursor")
+    assert response.status_code == 400
+
+@pytest.fixture(scope="function")
+def text_data(db, search_data):
+    school = models.School(name="Greenwood High")
+    product = models.Product(name="Pleated Skirt")
+    size = models.Size(label="28")
+    product.sizes.append(size)
+    db.add_all([school, product])
+    db.flush()
+    tailor = search_data["tailor2"]
+    orders = {
+        "school": models.Order(tailor_id=tailor.id, slip_no="A-102", notes="rush job"),
+        "product": models.Order(tailor_id=tailor.id, notes="Pleated pleated, extra pleats"),
+    }
+    line = dict(product_id=product.id, size_id=size.id, quantity=1, material_req_per_unit=1.0,
+                unit="meters", total_material_req=1.0)
+    orders["school"].order_lines = [models.OrderLine(school_id=school.id, **line)]
+    orders["product"].order_lines = [models.OrderLine(**line)]
+    db.add_all(orders.values())
+    db.commit()
+    return dict(search_data, school=school, product=product, size=size, orders=orders)
+
+def _search(client, text, **params):
+    response = client.get("/orders/", params={"search": text, **params})
+    assert response.status_code == 200
+    return [o["id"] for o in response.json()]
+
+def test_search_covers_notes_schools_products_and_slips(client, text_data):
+    orders = text_data["orders"]
+    assert _search(client, "greenwood") == [orders["school"].id]
+    assert _search(client, "Rush") == [orders["school"].id]
+    assert _search(client, "A-102") == [orders["school"].id]
+    assert set(_search(client, "pleated skirt")) == {orders["school"].id, orders["product"].id}
+    # Every word must match, each as a prefix
+    assert _search(client, "bob green") == [orders["school"].id]
+    assert _search(client, "alice greenwood") == []
+    assert _search(client, "ice") == []
+    # ...except single characters, which must be whole words
+    assert _search(client, "g") == []
+    assert _search(client, "%-!") == _search(client, "")
+
+def test_search_ranks_by_relevance(client, text_data):
+    orders = text_data["orders"]
+    # "pleat" appears three times in one order's notes, once (product name) in the other
+    assert _search(client, "pleat") == [orders["product"].id, orders["school"].id]
+    newest = _search(client, "pleat", sort_by="oldest")
+    assert newest == [orders["school"].id, orders["product"].id]
+
+    ids, cursor = [], None
+    while True:
+        response = client.get("/orders/", params={"search": "tailor", "limit": 2, **({"cursor": cursor} if cursor else {})})
+        ids.extend(o["id"] for o in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert sorted(ids) == sorted(set(ids)) and len(ids) == 5
+
+def test_search_ranks_only_newest_candidates(client, monkeypatch, text_data):
+    monkeypatch.setattr(search_utils, "RELEVANCE_CANDIDATES", 2)
+    orders = text_data["orders"]
+    # The two newest matches are ranked; the other three follow, newest first
+    ids = _search(client, "tailor")
+    assert ids[:2] == [orders["product"].id, orders["school"].id]
+    ids, cursor = [], None
+    while True:
+        response = client.get("/orders/", params={"search": "tailor", "limit": 2, **({"cursor": cursor} if cursor else {})})
+        ids.extend(o["id"] for o in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert ids == _search(client, "tailor") and len(set(ids)) == 5
+
+def test_search_index_follows_writes(client, db, text_data):
+    orders, school = text_data["orders"], text_data["school"]
+    school.name = "Riverside Academy"
+    db.commit()
+    assert _search(client, "greenwood") == []
+    assert _search(client, "riverside") == [orders["school"].id]
+
+    text_data["tailor1"].name = "Carol Tailor"
+    db.commit()
+    assert len(_search(client, "carol")) == 2
+
+    line = orders["product"].order_lines[0]
+    line.school_id = school.id
+    db.commit()
+    assert set(_search(client, "riverside")) == {orders["school"].id, orders["product"].id}
+
+    db.delete(line)
+    db.commit()
+    assert _search(client, "riverside") == [orders["school"].id]
+
+    db.delete(orders["school"])
+    db.commit()
+    assert _search(client, "riverside") == []
+
+def test_rebuild_order_search(client, db, text_data):
+    db.execute(text("DELETE FROM order_search"))
+    db.commit()
+    assert _search(client, "greenwood") == []
+    assert rebuild_order_search(db) == db.query(models.Order).count()
+    assert _search(client, "greenwood") == [text_data["orders"]["school"].id]
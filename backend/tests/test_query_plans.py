@@ -0,0 +1,70 @@
+import importlib.util
+import os
+from datetime import datetime
+import pytest
+from sqlalchemy import bindparam, select
+from app import models
+from app.database import Base
+from app.utils.order_utils import _open_lines_filter, order_status_expression
+
+Order, OrderLine = models.Order, models.OrderLine
+NEWEST = (Order.created_at.desc(), Order.id.desc())
+CURSOR_AT = datetime(2026, 1, 1)
+
+# The hot lookups of the order, delivery, dashboard and pricing paths
+HOT_QUERIES = {
+    "lines of an order": select(OrderLine).where(OrderLine.order_id == 1),
+    "lines of a school": select(OrderLine).where(OrderLine.school_id == 1),
+    "lines of a product": select(OrderLine.id).where(OrderLine.product_id == 1),
+    "deliveries of a line": select(models.Delivery).where(models.Delivery.order_line_id == 1),
+    "order list page": select(Order).order_by(*NEWEST).limit(50),
+    "order list next page": select(Order).where(
+        (Order.created_at < CURSOR_AT) | ((Order.created_at == CURSOR_AT) & (Order.id < 10))
+    ).order_by(*NEWEST).limit(50),
+    "order list by status": select(Order).where(Order.status == "Pending").order_by(*NEWEST).limit(50),
+    "order list by school": select(Order).where(
+        Order.order_lines.any(OrderLine.school_id == 1)
+    ).order_by(*NEWEST).limit(50),
+    "orders of a tailor": select(Order).where(Order.tailor_id == 1).order_by(*NEWEST),
+    "order status recompute": select(Order.status, order_status_expression()).where(Order.id == 1),
+    "rule for size and width": select(models.MaterialRule).where(
+        models.MaterialRule.size_id == 1, models.MaterialRule.fabric_width_inches == 36
+    ),
+    "sizes of a product": select(models.Size).where(models.Size.product_id == 1),
+    "reprice update": OrderLine.__table__.update().where(
+        OrderLine.__table__.c.size_id == bindparam("b_size_id", 1),
+        OrderLine.__table__.c.fabric_width_inches.is_not_distinct_from(bindparam("b_width", 36)),
+        _open_lines_filter(),
+    ).values(material_req_per_unit=1.0),
+}
+
+
+def _plan(db, statement):
+    compiled = statement.compile(dialect=db.get_bind().dialect, compile_kwargs={"render_postcompile": True})
+    positional = tuple(compiled.params[name] for name in compiled.positiontup)
+    rows = db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", positional).all()
+    return [row[3] for row in rows]
+
+
+@pytest.mark.parametrize("name", HOT_QUERIES)
+def test_hot_queries_use_indexes(db, name):
+    plan = _plan(db, HOT_QUERIES[name])
+    full_scans = [step for step in plan if step.startswith("SCAN ") and " USING " not in step]
+    assert not full_scans, f"{name} scans a whole table: {plan}"
+
+
+def test_update_schema_creates_every_model_index():
+    path = os.path.join(os.path.dirname(__file__), "..", "scripts", "update_schema.py")
+    spec = importlib.util.spec_from_file_location("update_schema", path)
+    update_schema = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(update_schema)
+
+    declared = {
+        (index.name, table.name, ", ".join(column.name for column in index.columns))
+        for table in Base.metadata.tables.values()
+        for index in table.indexes
+        if not (len(index.columns) == 1 and next(iter(index.columns)).primary_key)
+        and not index.unique
+        and table.name not in ("settings",)
+    }
+    assert declared == set(update_schema.INDEXES)
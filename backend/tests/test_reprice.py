@@ -0,0 +1,143 @@
+from app import models
+from app.utils.rule_utils import get_rule_index
+from app.utils.security import get_admin_password_hash
+
+ADMIN = {"X-Admin-Password": "admin"}
+
+
+def _size(db, product_name, label):
+    return db.query(models.Size).join(models.Product).filter(
+        models.Product.name == product_name, models.Size.label == label
+    ).one()
+
+
+def _order(client, db, size, width, quantity=2):
+    tailor = db.query(models.Tailor).first()
+    response = client.post("/orders/", json={
+        "tailor_id": tailor.id,
+        "order_lines": [{"product_id": size.product_id, "size_id": size.id, "fabric_width_inches": width, "quantity": quantity}],
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _set_length(client, db, size, width, length):
+    rule = get_rule_index(db).resolve(size.id, width)
+    response = client.put(f"/master-data/rules/{rule.id}", json={
+        "fabric_width_inches": width, "length_required": length, "unit": rule.unit
+    })
+    assert response.status_code == 200
+    return rule
+
+
+def _line(db, order):
+    db.expire_all()
+    return db.query(models.OrderLine).filter(models.OrderLine.order_id == order["id"]).one()
+
+
+def test_reprice_requires_admin(client):
+    assert client.post("/orders/reprice", json={"scope": "all"}).status_code == 401
+    assert client.post("/orders/reprice", json={"scope": "all"}, headers={"X-Admin-Password": "nope"}).status_code == 401
+    assert client.post("/orders/reprice", json={"scope": "rule"}, headers=ADMIN).status_code == 400
+    assert client.post("/orders/reprice", json={"scope": "rule", "rule_id": 10**9}, headers=ADMIN).status_code == 404
+
+
+def test_preview_then_reprice_open_orders(client, db):
+    size = _size(db, "Blazer", "24")
+    open_order = _order(client, db, size, 36, quantity=3)
+    done_order = _order(client, db, size, 36, quantity=5)
+    db.query(models.Order).filter(models.Order.id == done_order["id"]).update({"status": "Completed"})
+    db.commit()
+    old = _line(db, open_order).material_req_per_unit
+    _set_length(client, db, size, 36, 2.0)
+
+    preview = client.post("/orders/reprice?dry_run=true", json={"scope": "all"}, headers=ADMIN).json()
+    assert preview["dry_run"] is True
+    assert preview["lines_changed"] == 1
+    assert preview["lines_updated"] == 0
+    assert preview["totals"] == [{
+        "unit": "meters", "lines_changed": 1,
+        "old_total": round(3 * old, 4), "new_total": 6.0, "delta": round(6.0 - 3 * old, 4)
+    }]
+    assert preview["products"][0]["product_name"] == "Blazer"
+    assert _line(db, open_order).material_req_per_unit == old
+
+    result = client.post("/orders/reprice", json={"scope": "all"}, headers=ADMIN).json()
+    assert result["lines_updated"] == 1
+    line = _line(db, open_order)
+    assert (line.material_req_per_unit, line.total_material_req) == (2.0, 6.0)
+    # Completed orders keep the figures they were made with
+    assert _line(db, done_order).material_req_per_unit == old
+
+    again = client.post("/orders/reprice", json={"scope": "all"}, headers=ADMIN).json()
+    assert again["lines_changed"] == again["lines_updated"] == 0
+
+
+def test_reprice_scopes(client, db):
+    blazer, neckar = _size(db, "Blazer", "26"), _size(db, "Neckar", "12")
+    blazer_36, blazer_60 = _order(client, db, blazer, 36), _order(client, db, blazer, 60)
+    neckar_36 = _order(client, db, neckar, 36)
+    rule = _set_length(client, db, blazer, 36, 3.0)
+    _set_length(client, db, blazer, 60, 2.5)
+    _set_length(client, db, neckar, 36, 1.25)
+
+    by_rule = client.post("/orders/reprice", json={"scope": "rule", "rule_id": rule.id}, headers=ADMIN).json()
+    assert by_rule["lines_updated"] == 1
+    assert _line(db, blazer_36).material_req_per_unit == 3.0
+    assert _line(db, blazer_60).material_req_per_unit != 2.5
+
+    by_product = client.post(
+        "/orders/reprice", json={"scope": "product", "product_id": blazer.product_id}, headers=ADMIN
+    ).json()
+    assert by_product["lines_updated"] == 1
+    assert _line(db, blazer_60).material_req_per_unit == 2.5
+    assert _line(db, neckar_36).material_req_per_unit != 1.25
+
+
+def test_reprice_statement_count_does_not_grow_with_lines(client, db, query_counter):
+    size = _size(db, "Blazer", "28")
+    tailor = db.query(models.Tailor).first()
+    client.post("/orders/", json={
+        "tailor_id": tailor.id,
+        "order_lines": [{"product_id": size.product_id, "size_id": size.id, "fabric_width_inches": 36, "quantity": 1}],
+    })
+    _set_length(client, db, size, 36, 5.0)
+    # Both runs read the admin password hash from the in-memory cache
+    get_admin_password_hash(db)
+    with query_counter() as small_queries:
+        client.post("/orders/reprice", json={"scope": "all"}, headers=ADMIN)
+
+    client.post("/orders/", json={
+        "tailor_id": tailor.id,
+        "order_lines": [
+            {"product_id": size.product_id, "size_id": size.id, "fabric_width_inches": 36, "quantity": q}
+            for q in range(1, 301)
+        ],
+    })
+    _set_length(client, db, size, 36, 6.0)
+    with query_counter() as large_queries:
+        result = client.post("/orders/reprice", json={"scope": "all"}, headers=ADMIN).json()
+    assert result["lines_updated"] == 301
+    assert len(large_queries) == len(small_queries)
+
+
+def test_unit_change_keeps_old_totals_under_the_old_unit(client, db):
+    size = _size(db, "Blazer", "24")
+    order = _order(client, db, size, 36, quantity=3)
+    old = _line(db, order)
+    assert old.unit == "meters"
+    rule = get_rule_index(db).resolve(size.id, 36)
+    response = client.put(f"/master-data/rules/{rule.id}", json={
+        "fabric_width_inches": 36, "length_required": 40.0, "unit": "inches"
+    })
+    assert response.status_code == 200
+
+    preview = client.post("/orders/reprice?dry_run=true", json={"scope": "rule", "rule_id": rule.id}, headers=ADMIN).json()
+    assert preview["totals"] == [
+        {"unit": "inches", "lines_changed": 1, "old_total": 0.0, "new_total": 120.0, "delta": 120.0},
+        {"unit": "meters", "lines_changed": 0, "old_total": round(old.total_material_req, 4), "new_total": 0.0,
+         "delta": round(-old.total_material_req, 4)},
+    ]
+    assert [(p["product_name"], p["unit"], p["lines_changed"]) for p in preview["products"]] == [
+        ("Blazer", "inches", 1), ("Blazer", "meters", 0)
+    ]
@@ -0,0 +1,72 @@
+from app import models
+from app.utils.cache_utils import ResponseCache, SCHOOLS_VERSION_KEY, bump_data_version
+
+ADMIN = {"X-Admin-Password": "admin"}
+
+
+def test_repeated_reads_are_served_from_cache(client, db, query_counter):
+    for url in ["/schools/", "/master-data/tailors", "/master-data/products", "/dashboard/stats"]:
+        first = client.get(url)
+        with query_counter() as queries:
+            second = client.get(url)
+        assert second.json() == first.json()
+        # Only the data version check reaches the database
+        assert len(queries) == 1 and "FROM settings" in queries[0]
+
+
+def test_writes_invalidate_cached_responses(client, db):
+    client.get("/schools/")
+    assert client.post("/schools/", json={"name": "Cache School"}).status_code == 200
+    assert "Cache School" in [s["name"] for s in client.get("/schools/").json()]
+
+    tailor = client.post("/master-data/tailors", json={"name": "Cache Tailor"}).json()
+    assert "Cache Tailor" in [t["name"] for t in client.get("/master-data/tailors").json()]
+    client.put(f"/master-data/tailors/{tailor['id']}", json={"name": "Renamed Tailor"})
+    names = [t["name"] for t in client.get("/master-data/tailors").json()]
+    assert "Renamed Tailor" in names and "Cache Tailor" not in names
+
+    before = client.get("/dashboard/stats").json()
+    size = db.query(models.Size).filter(models.Size.material_rules.any()).first()
+    client.post("/orders/", json={
+        "tailor_id": tailor["id"], "order_lines": [{"product_id": size.product_id, "size_id": size.id, "quantity": 2}]
+    })
+    assert client.get("/dashboard/stats").json()["active_orders"] == before["active_orders"] + 1
+
+    client.post("/master-data/products", json={"name": "Cache Product"})
+    assert "Cache Product" in [p["name"] for p in client.get("/master-data/products").json()]
+
+
+def test_version_bump_from_another_worker_invalidates(client, db):
+    client.get("/schools/")
+    # Another process writing straight to the database bumps the shared marker
+    db.add(models.School(name="Other Worker School"))
+    bump_data_version(db, SCHOOLS_VERSION_KEY)
+    db.commit()
+    assert "Other Worker School" in [s["name"] for s in client.get("/schools/").json()]
+
+
+def test_response_cache_lru_and_ttl():
+    cache = ResponseCache(max_entries=2, ttl_seconds=60)
+    builds = []
+
+    def build(value):
+        def inner():
+            builds.append(value)
+            return value
+        return inner
+
+    cache.get_or_build("a", (1,), build("a"))
+    cache.get_or_build("b", (1,), build("b"))
+    cache.get_or_build("a", (1,), build("a"))     # hit, "a" becomes most recent
+    cache.get_or_build("c", (1,), build("c"))     # evicts "b"
+    cache.get_or_build("b", (1,), build("b"))
+    assert builds == ["a", "b", "c", "b"]
+    assert len(cache) == 2
+
+    cache.get_or_build("b", (2,), build("b2"))    # new version: rebuilt
+    assert builds[-1] == "b2"
+
+    expired = ResponseCache(ttl_seconds=0)
+    expired.get_or_build("a", (1,), build("x"))
+    expired.get_or_build("a", (1,), build("y"))
+    assert builds[-2:] == ["x", "y"]
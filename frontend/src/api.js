@@ -1,6 +1,6 @@
 const API_BASE_URL = "http://localhost:8000";
 
-export async function fetchAPI(endpoint, options = {}) {
+async function request(endpoint, options = {}) {
     const response = await fetch(`${API_BASE_URL}${endpoint}`, {
         ...options,
         headers: {
@@ -16,5 +16,34 @@ export async function fetchAPI(endpoint, options = {}) {
         throw new Error(errorMessage || `API Error: ${response.statusText}`);
     }
 
+    return response;
+}
+
+export async function fetchAPI(endpoint, options = {}) {
+    const response = await request(endpoint, options);
     return response.json();
 }
+
+// For paginated list endpoints: returns the page plus the cursor/total headers
+export async function fetchAPIPage(endpoint, options = {}) {
+    const response = await request(endpoint, options);
+    const total = response.headers.get("X-Total-Count");
+    return {
+        data: await response.json(),
+        nextCursor: response.headers.get("X-Next-Cursor"),
+        total: total !== null ? parseInt(total, 10) : null,
+    };
+}
+
+// Idempotency-Key for a write, held in a ref: kept while the same body is sent again
+// (double click, resubmit after a network error), replaced when the body changes
+export function idempotencyKey(submission, body) {
+    if (!submission.current || submission.current.body !== body) {
+        // randomUUID needs a secure context; the LAN http origin falls back to a random string
+        const key = window.crypto?.randomUUID
+            ? window.crypto.randomUUID()
+            : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+        submission.current = { body, key };
+    }
+    return submission.current.key;
+}
@@ -1,6 +1,6 @@
 import React, { useEffect, useState, useMemo, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { fetchAPI } from '../api';
+import { fetchAPI, idempotencyKey } from '../api';
 import Combobox from '../components/Combobox';
 
 export default function CreateOrder() {
@@ -11,6 +11,7 @@ export default function CreateOrder() {
   
   const [selectedTailor, setSelectedTailor] = useState("");
   const [tailorEmail, setTailorEmail] = useState(""); // State for email
+  const [tailorDigest, setTailorDigest] = useState(false); // One daily email instead of one per order
   const [selectedSchool, setSelectedSchool] = useState("");
   const [orderDate, setOrderDate] = useState(new Date().toISOString().split('T')[0]);
   const [slipNo, setSlipNo] = useState("");
@@ -28,8 +29,10 @@ export default function CreateOrder() {
     if (selectedTailor) {
         const t = tailors.find(t => t.id == selectedTailor);
         setTailorEmail(t?.email || "");
+        setTailorDigest(!!t?.email_digest);
     } else {
         setTailorEmail("");
+        setTailorDigest(false);
     }
   }, [selectedTailor, tailors]);
 
@@ -38,7 +41,7 @@ export default function CreateOrder() {
       const [tData, sData, pData] = await Promise.all([
         fetchAPI('/master-data/tailors'),
         fetchAPI('/schools/'),
-        fetchAPI('/master-data/products')
+        fetchAPI('/master-data/catalog')
       ]);
       setTailors(tData);
       setSchools(sData);
@@ -50,6 +53,7 @@ export default function CreateOrder() {
   }
 
   const prevProductEntriesLength = useRef(0);
+  const submission = useRef(null); // Idempotency-Key of the order being submitted
 
   useEffect(() => {
     if (productEntries.length > prevProductEntriesLength.current) {
@@ -139,12 +143,12 @@ export default function CreateOrder() {
 
       // Check if email updated
       const currentTailor = tailors.find(t => t.id == selectedTailor);
-      if (currentTailor && currentTailor.email !== tailorEmail) {
+      if (currentTailor && (currentTailor.email !== tailorEmail || !!currentTailor.email_digest !== tailorDigest)) {
           try {
              // Update tailor first
              const updated = await fetchAPI(`/master-data/tailors/${selectedTailor}`, {
                  method: 'PUT',
-                 body: JSON.stringify({ ...currentTailor, email: tailorEmail })
+                 body: JSON.stringify({ ...currentTailor, email: tailorEmail, email_digest: tailorDigest })
              });
              // Update local list
              setTailors(tailors.map(t => t.id === selectedTailor ? updated : t));
@@ -193,9 +197,11 @@ export default function CreateOrder() {
       };
 
       try {
+          const body = JSON.stringify(payload);
           await fetchAPI('/orders/', {
               method: 'POST',
-              body: JSON.stringify(payload)
+              body,
+              headers: { 'Idempotency-Key': idempotencyKey(submission, body) }
           });
           navigate('/');
       } catch (e) {
@@ -247,6 +253,14 @@ export default function CreateOrder() {
                         }
                     }}
                  />
+                 <label style={{ fontSize: '0.85rem', display: 'flex', alignItems: 'center', gap: '0.4rem', marginTop: '0.25rem' }}>
+                    <input
+                        type="checkbox"
+                        checked={tailorDigest}
+                        onChange={e => setTailorDigest(e.target.checked)}
+                    />
+                    Daily digest instead of one email per order
+                 </label>
               </div>
 
               <div className="form-group" style={{ marginBottom: 0 }}>
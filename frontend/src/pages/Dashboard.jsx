@@ -6,9 +6,14 @@ const COLORS = ['#8884d8', '#82ca9d', '#ffc658', '#0088fe', '#00C49F', '#FFBB28'
 export default function Dashboard() {
   const [stats, setStats] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [dateFrom, setDateFrom] = useState('');
+  const [dateTo, setDateTo] = useState('');
 
   useEffect(() => {
-    fetch('http://localhost:8000/dashboard/stats')
+    const params = new URLSearchParams();
+    if (dateFrom) params.append('from', dateFrom);
+    if (dateTo) params.append('to', dateTo);
+    fetch(`http://localhost:8000/dashboard/stats?${params.toString()}`)
       .then(res => res.json())
       .then(data => {
         setStats(data);
@@ -18,14 +23,20 @@ export default function Dashboard() {
         console.error('Failed to fetch stats:', err);
         setLoading(false);
       });
-  }, []);
+  }, [dateFrom, dateTo]);
 
   if (loading) return <div style={{ padding: '2rem', textAlign: 'center' }}>Loading dashboard insights...</div>;
   if (!stats) return <div style={{ padding: '2rem', textAlign: 'center' }}>Error loading data.</div>;
 
   return (
     <div style={{ padding: '2rem', maxWidth: '1200px', margin: '0 auto' }}>
-      <h1 style={{ marginBottom: '2rem', color: '#333' }}>Dashboard Overview</h1>
+      <h1 style={{ marginBottom: '1rem', color: '#333' }}>Dashboard Overview</h1>
+
+      {/* Date Range (empty = all time) */}
+      <div style={{ display: 'flex', gap: '1rem', alignItems: 'center', marginBottom: '2rem' }}>
+        <label>From <input type="date" value={dateFrom} onChange={e => setDateFrom(e.target.value)} /></label>
+        <label>To <input type="date" value={dateTo} onChange={e => setDateTo(e.target.value)} /></label>
+      </div>
       
       {/* Top Stat Cards */}
       <div style={{ display: 'grid', gridTemplateColumns: 'repeat(auto-fit, minmax(200px, 1fr))', gap: '1.5rem', marginBottom: '3rem' }}>
@@ -66,7 +66,8 @@ export default function MasterData() {
     
     setLoading(true);
     try {
-      const response = await fetch('http://localhost:8000/master-data/upload', {
+      // Dry run first: nothing is written until the preview is confirmed
+      const response = await fetch('http://localhost:8000/master-data/upload?dry_run=true', {
         method: 'POST',
         body: formData,
       });
@@ -76,8 +77,13 @@ export default function MasterData() {
           throw new Error(error.detail || "Upload failed");
       }
       
-      showToast('Upload successful!', 'success');
-      loadProducts();
+      const preview = await response.json();
+      const s = preview.summary;
+      const message = `Products: ${s.products_created} new, ${s.products_updated} updated. ` +
+        `Sizes: ${s.sizes_created} new, ${s.sizes_updated} updated. ` +
+        `Rules: ${s.rules_created} new, ${s.rules_updated} updated ` +
+        `(${s.rules_length_changed} with a new length).`;
+      showConfirm("Apply this import?", message, () => confirmUpload(preview.preview_id));
     } catch (err) {
       console.error(err);
       showToast(err.message || 'Upload failed', 'error');
@@ -88,6 +94,19 @@ export default function MasterData() {
     }
   }
 
+  async function confirmUpload(previewId) {
+    setLoading(true);
+    try {
+      await fetchAPI(`/master-data/upload/confirm/${previewId}`, { method: 'POST' });
+      showToast('Upload successful!', 'success');
+      loadProducts();
+    } catch (err) {
+      console.error(err);
+      showToast(err.message || 'Upload failed', 'error');
+      setLoading(false);
+    }
+  }
+
   const filteredProducts = products.filter(p => 
     p.name.toLowerCase().includes(searchQuery.toLowerCase())
   );
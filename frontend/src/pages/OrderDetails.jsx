@@ -1,6 +1,6 @@
-import React, { useEffect, useState, useMemo } from 'react';
+import React, { useEffect, useState, useMemo, useRef } from 'react';
 import { useParams, Link } from 'react-router-dom';
-import { fetchAPI } from '../api';
+import { fetchAPI, idempotencyKey } from '../api';
 import { formatDate } from '../utils';
 import { useNotification } from '../components/Notification';
 
@@ -39,7 +39,7 @@ export default function OrderDetails() {
   async function loadMasterData() {
       try {
           const [products, schools] = await Promise.all([
-             fetchAPI('/master-data/products').catch(() => []), 
+             fetchAPI('/master-data/catalog').catch(() => []), 
              fetchAPI('/schools').catch(() => [])
           ]);
           setMasterData({ products, schools });
@@ -52,7 +52,29 @@ export default function OrderDetails() {
     window.print();
   };
 
-  const [authorizedPasswordForMeta, setAuthorizedPasswordForMeta] = useState(null);
+  const deliverAllSubmission = useRef(null); // Idempotency-Key of the "deliver all" request
+
+  async function handleDeliverAllPending() {
+    if (!window.confirm("Record delivery of every pending piece on this order?")) {
+      return;
+    }
+    try {
+      // The date keeps a resend after a network error identical to the first attempt
+      const body = JSON.stringify({ deliver_all_pending: true, date_delivered: new Date().toISOString().split('T')[0] });
+      const updated = await fetchAPI(`/orders/${id}/deliveries`, {
+        method: 'POST',
+        body,
+        headers: { 'Idempotency-Key': idempotencyKey(deliverAllSubmission, body) }
+      });
+      deliverAllSubmission.current = null;
+      setOrder(updated);
+      showToast("All pending pieces delivered", "success");
+    } catch (e) {
+      showToast("Failed to record deliveries: " + e.message, "error");
+    }
+  }
+
+  const [adminTokenForMeta, setAdminTokenForMeta] = useState(null);
 
   async function handleVerifyMetaEditPassword() {
     if (!metaEditPassword) {
@@ -60,12 +82,12 @@ export default function OrderDetails() {
       return;
     }
     try {
-      const isVerified = await fetchAPI('/admin/verify-password', {
+      const result = await fetchAPI('/admin/verify-password', {
         method: 'POST',
         body: JSON.stringify({ password: metaEditPassword })
       });
-      if (isVerified) {
-        setAuthorizedPasswordForMeta(metaEditPassword);
+      if (result.valid) {
+        setAdminTokenForMeta(result.token);
         setIsEditingMeta(true);
         setMetaEditData({ slip_no: order.slip_no || "", notes: order.notes || "" });
         setShowMetaEditConfirm(false);
@@ -83,10 +105,10 @@ export default function OrderDetails() {
       await fetchAPI(`/orders/${id}`, {
         method: 'PUT',
         body: JSON.stringify(metaEditData),
-        headers: { 'X-Admin-Password': authorizedPasswordForMeta }
+        headers: { 'X-Admin-Token': adminTokenForMeta }
       });
       setIsEditingMeta(false);
-      setAuthorizedPasswordForMeta(null);
+      setAdminTokenForMeta(null);
       showToast("Order updated successfully", "success");
       loadOrder();
     } catch (e) {
@@ -208,6 +230,9 @@ export default function OrderDetails() {
             </div>
         </div>
         <div className="flex gap-2">
+            {order.status !== 'Completed' && (
+              <button className="btn success" onClick={handleDeliverAllPending}>Deliver All Pending</button>
+            )}
             <button className="btn" onClick={handlePrint}>Print / Save PDF</button>
         </div>
       </div>
@@ -235,7 +260,7 @@ export default function OrderDetails() {
             </div>
             <div className="flex gap-2">
               <button className="btn success" onClick={handleSaveMeta}>Save</button>
-              <button className="btn secondary" onClick={() => { setIsEditingMeta(false); setAuthorizedPasswordForMeta(null); }}>Cancel</button>
+              <button className="btn secondary" onClick={() => { setIsEditingMeta(false); setAdminTokenForMeta(null); }}>Cancel</button>
             </div>
           </div>
         </div>
@@ -308,6 +333,7 @@ function OrderLineRow({ line, onUpdate, masterData }) {
     const [deliveryQty, setDeliveryQty] = useState("");
     const [deliveryDate, setDeliveryDate] = useState(new Date().toISOString().split('T')[0]);
     const [recording, setRecording] = useState(false);
+    const deliverySubmission = useRef(null); // Idempotency-Key of the delivery being recorded
     const [showHistory, setShowHistory] = useState(false);
     const [showMenu, setShowMenu] = useState(false);
     const [showConfirmDelete, setShowConfirmDelete] = useState(false);
@@ -317,7 +343,7 @@ function OrderLineRow({ line, onUpdate, masterData }) {
     const [isEditing, setIsEditing] = useState(false);
     const [showEditConfirm, setShowEditConfirm] = useState(false);
     const [editPassword, setEditPassword] = useState("");
-    const [authorizedPassword, setAuthorizedPassword] = useState(null); // Store verified password
+    const [adminToken, setAdminToken] = useState(null); // Admin token from the verified password
     const [editData, setEditData] = useState({});
 
     // Material In Hand Calculation (Fallback if no stats)
@@ -353,13 +379,13 @@ function OrderLineRow({ line, onUpdate, masterData }) {
         
         try {
             // Verify Password
-            const isVerified = await fetchAPI('/admin/verify-password', {
+            const result = await fetchAPI('/admin/verify-password', {
                 method: 'POST',
                 body: JSON.stringify({ password: editPassword })
             });
 
-            if (isVerified) {
-                setAuthorizedPassword(editPassword); // Store for Save action
+            if (result.valid) {
+                setAdminToken(result.token); // Store for Save action
                 setShowEditConfirm(false);
                 setEditPassword("");
                 setIsEditing(true);
@@ -377,11 +403,11 @@ function OrderLineRow({ line, onUpdate, masterData }) {
                 method: 'PUT',
                 body: JSON.stringify(editData),
                 headers: {
-                    'X-Admin-Password': authorizedPassword
+                    'X-Admin-Token': adminToken
                 }
             });
             setIsEditing(false);
-            setAuthorizedPassword(null); // Clear password after save for security (optional)
+            setAdminToken(null); // Clear token after save for security (optional)
             onUpdate();
         } catch (e) {
             console.error("Update failed", e);
@@ -420,7 +446,7 @@ function OrderLineRow({ line, onUpdate, masterData }) {
             await fetchAPI(`/orders/deliveries/${deliveryId}`, {
                 method: 'DELETE',
                 headers: {
-                    'X-Admin-Password': authorizedPassword
+                    'X-Admin-Token': adminToken
                 }
             });
             showToast("Delivery deleted", "success");
@@ -433,13 +459,17 @@ function OrderLineRow({ line, onUpdate, masterData }) {
     async function handleDelivery() {
         if (!deliveryQty || parseInt(deliveryQty) <= 0) return;
         try {
+            const body = JSON.stringify({ 
+                quantity_delivered: parseInt(deliveryQty),
+                date_delivered: new Date(deliveryDate).toISOString() 
+            });
             await fetchAPI(`/orders/lines/${line.id}/deliveries`, {
                 method: 'POST',
-                body: JSON.stringify({ 
-                    quantity_delivered: parseInt(deliveryQty),
-                    date_delivered: new Date(deliveryDate).toISOString() 
-                })
+                body,
+                headers: { 'Idempotency-Key': idempotencyKey(deliverySubmission, body) }
             });
+            // The next delivery is a new one, even with the same quantity and date
+            deliverySubmission.current = null;
             setRecording(false);
             setDeliveryQty("");
             onUpdate();
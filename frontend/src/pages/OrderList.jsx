@@ -1,6 +1,6 @@
 import React, { useEffect, useState } from 'react';
 import { Link, useNavigate } from 'react-router-dom';
-import { fetchAPI } from '../api';
+import { fetchAPI, fetchAPIPage } from '../api';
 import { useNotification } from '../components/Notification';
 
 export default function OrderList() {
@@ -16,11 +16,18 @@ export default function OrderList() {
   
   // Search state
   const [search, setSearch] = useState("");
-  const [sortBy, setSortBy] = useState("newest");
+  // Unset until the user picks one: the API then sorts searches by relevance, the rest by newest
+  const [sortBy, setSortBy] = useState("");
   const [statusFilter, setStatusFilter] = useState("All");
   const [schoolFilter, setSchoolFilter] = useState("All");
   const [schools, setSchools] = useState([]);
 
+  // Pagination state: cursors[i] is the cursor that loads page i (null for the first page)
+  const [cursors, setCursors] = useState([null]);
+  const [pageIndex, setPageIndex] = useState(0);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [totalOrders, setTotalOrders] = useState(null);
+
   useEffect(() => {
     fetchSchools();
   }, []);
@@ -36,8 +43,11 @@ export default function OrderList() {
 
   useEffect(() => {
     // Debounce search slightly to avoid too many requests
+    // Filters changed: start again from the first page
     const timer = setTimeout(() => {
-      fetchOrders();
+      setCursors([null]);
+      setPageIndex(0);
+      fetchOrders(null, true);
     }, 300);
     return () => clearTimeout(timer);
   }, [search, sortBy, statusFilter, schoolFilter]);
@@ -49,7 +59,7 @@ export default function OrderList() {
     return () => document.removeEventListener('click', handleClickOutside);
   }, []);
 
-  async function fetchOrders() {
+  async function fetchOrders(cursor = cursors[pageIndex], withTotal = false) {
     try {
       setLoading(true);
       // Construct query params
@@ -58,10 +68,15 @@ export default function OrderList() {
       if (sortBy) params.append("sort_by", sortBy);
       if (statusFilter && statusFilter !== "All") params.append("status", statusFilter);
       if (schoolFilter && schoolFilter !== "All") params.append("school_id", schoolFilter);
+      if (cursor) params.append("cursor", cursor);
+      // The total only changes with the filters, so only ask for it on the first page
+      if (withTotal) params.append("include_total", "true");
 
       const queryString = params.toString() ? `?${params.toString()}` : "";
-      const data = await fetchAPI(`/orders${queryString}`);
-      setOrders(data);
+      const page = await fetchAPIPage(`/orders${queryString}`);
+      setOrders(page.data);
+      setNextCursor(page.nextCursor);
+      if (page.total !== null) setTotalOrders(page.total);
     } catch (error) {
         console.error("Failed to load orders");
     } finally {
@@ -69,6 +84,21 @@ export default function OrderList() {
     }
   }
 
+  function goToNextPage() {
+    if (!nextCursor) return;
+    const nextIndex = pageIndex + 1;
+    setCursors([...cursors.slice(0, nextIndex), nextCursor]);
+    setPageIndex(nextIndex);
+    fetchOrders(nextCursor);
+  }
+
+  function goToPreviousPage() {
+    if (pageIndex === 0) return;
+    const prevIndex = pageIndex - 1;
+    setPageIndex(prevIndex);
+    fetchOrders(cursors[prevIndex]);
+  }
+
   function confirmDeleteOrder(e, orderId) {
       // e.stopPropagation() handled in calling button
       setDeleteModal({ show: true, orderId });
@@ -89,7 +119,7 @@ export default function OrderList() {
           setDeleteModal({ show: false, orderId: null });
           setDeletePassword("");
           showToast("Order deleted successfully", "success");
-          fetchOrders();
+          fetchOrders(cursors[pageIndex], true);
       } catch (err) {
           showToast("Failed to delete order: " + err.message, "error");
       }
@@ -112,6 +142,7 @@ export default function OrderList() {
             <input 
               type="text" 
               placeholder="Search by Order # or Tailor..." 
+              title="Matches the start of words: 'ali' finds Alice, 'ice' does not"
               value={search}
               onChange={(e) => setSearch(e.target.value)}
               className="styled-input"
@@ -164,12 +195,13 @@ export default function OrderList() {
            <label className="control-label">Sort By</label>
            <div className="input-wrapper">
              <select 
-               value={sortBy}
+               value={sortBy || (search ? "relevance" : "newest")}
                onChange={(e) => setSortBy(e.target.value)}
                className="styled-select"
              >
                <option value="newest">Newest First</option>
                <option value="oldest">Oldest First</option>
+               <option value="relevance">Best Match</option>
              </select>
              <svg className="select-icon" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 20 20" fill="currentColor">
                <path fillRule="evenodd" d="M5.293 7.293a1 1 0 011.414 0L10 10.586l3.293-3.293a1 1 0 111.414 1.414l-4 4a1 1 0 01-1.414 0l-4-4a1 1 0 010-1.414z" clipRule="evenodd" />
@@ -281,6 +313,18 @@ export default function OrderList() {
           </tbody>
         </table>
       )}
+      {/* Pagination */}
+      {!loading && (pageIndex > 0 || nextCursor) && (
+        <div className="flex justify-between items-center mt-4">
+          <span className="text-sm">
+            Page {pageIndex + 1}{totalOrders !== null ? ` · ${totalOrders} orders` : ''}
+          </span>
+          <div className="flex gap-2">
+            <button className="btn secondary" onClick={goToPreviousPage} disabled={pageIndex === 0}>Previous</button>
+            <button className="btn secondary" onClick={goToNextPage} disabled={!nextCursor}>Next</button>
+          </div>
+        </div>
+      )}
       {/* Delete Modal */}
       {deleteModal.show && (
             <div className="modal-overlay" style={{ zIndex: 200 }}>